@@ -5,6 +5,8 @@ import logging
 import secrets
 import typing
 
+from pymongo.errors import DuplicateKeyError
+
 from src.dto import AccountLink, LinkAttempt, LinkCode
 
 logger = logging.getLogger(__name__)
@@ -13,16 +15,28 @@ LINK_CODE_LENGTH = 6
 LINK_CODE_TTL_SECONDS = 300  # 5 minutes
 LINK_MAX_ATTEMPTS = 5
 LINK_LOCKOUT_SECONDS = 300  # 5 minutes
+_LINK_UPSERT_ATTEMPTS = 3
 
 LinkResult = typing.Literal["success", "invalid", "rate_limited"]
 
 
 async def generate_link_code(telegram_user_id: str) -> str:
-    """Generate a one-time code for linking WhatsApp account."""
+    """
+    Generate a one-time code for linking WhatsApp account.
+
+    Codes are unique: a code another user holds is rejected by the index and redrawn.
+    """
     await LinkCode.find(LinkCode.telegram_user_id == telegram_user_id).delete()
 
-    code = "".join(secrets.choice("0123456789") for _ in range(LINK_CODE_LENGTH))
-    await LinkCode(code=code, telegram_user_id=telegram_user_id).insert()
+    for attempt in range(_LINK_UPSERT_ATTEMPTS):
+        code = "".join(secrets.choice("0123456789") for _ in range(LINK_CODE_LENGTH))
+        try:
+            await LinkCode(code=code, telegram_user_id=telegram_user_id).insert()
+        except DuplicateKeyError:
+            if attempt == _LINK_UPSERT_ATTEMPTS - 1:
+                raise
+        else:
+            break
 
     return code
 
@@ -41,8 +55,12 @@ async def _check_rate_limit(whatsapp_phone: str) -> LinkAttempt | None:
 
     if not attempt:
         attempt = LinkAttempt(whatsapp_phone=whatsapp_phone)
-        await attempt.insert()
-        return attempt
+        try:
+            await attempt.insert()
+            return attempt
+        except DuplicateKeyError:
+            # A concurrent first attempt from the same phone created the record: use it
+            return await _check_rate_limit(whatsapp_phone)
 
     if attempt.locked_until:
         locked_until = _to_aware(attempt.locked_until)
@@ -76,6 +94,32 @@ async def _record_failed_attempt(attempt: LinkAttempt) -> None:
     await attempt.save()
 
 
+async def _upsert_link(telegram_user_id: str, whatsapp_phone: str) -> None:
+    """
+    Link both sides 1:1, replacing their previous links; the latest confirmation wins.
+
+    The phone's link to another account is removed, then this account's link is upserted.
+    A concurrent confirmation may take the phone in between: the unique index rejects the
+    upsert and it is retried.
+    """
+    links = AccountLink.get_motor_collection()
+    for attempt in range(_LINK_UPSERT_ATTEMPTS):
+        await links.delete_many(
+            {"whatsapp_phone": whatsapp_phone, "telegram_user_id": {"$ne": telegram_user_id}}
+        )
+        try:
+            await links.update_one(
+                {"telegram_user_id": telegram_user_id},
+                {"$set": {"whatsapp_phone": whatsapp_phone}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            if attempt == _LINK_UPSERT_ATTEMPTS - 1:
+                raise
+        else:
+            return
+
+
 async def confirm_link(code: str, whatsapp_phone: str) -> LinkResult:
     """Confirm link using one-time code. Returns result status."""
     attempt = await _check_rate_limit(whatsapp_phone)
@@ -97,14 +141,7 @@ async def confirm_link(code: str, whatsapp_phone: str) -> LinkResult:
     telegram_user_id = record.telegram_user_id
     await record.delete()
 
-    # Remove existing links for both sides (1:1 constraint)
-    await AccountLink.find(AccountLink.telegram_user_id == telegram_user_id).delete()
-    await AccountLink.find(AccountLink.whatsapp_phone == whatsapp_phone).delete()
-
-    await AccountLink(
-        telegram_user_id=telegram_user_id,
-        whatsapp_phone=whatsapp_phone,
-    ).insert()
+    await _upsert_link(telegram_user_id, whatsapp_phone)
 
     # Clear rate limit on success
     await attempt.delete()
@@ -9,6 +9,7 @@ import httpx
 
 from src import const
 from src.config import settings
+from src.governor import STAGE_LLM, governor
 from src.mongo import get_bot_config
 
 logger = logging.getLogger(__name__)
@@ -392,7 +393,8 @@ async def _ai_complete(
         try:
             await rate_limiter.acquire(provider)
             logger.debug("Using provider %s", provider)
-            raw = await _call_with_retry(provider, handler, prompt, max_tokens, temperature)
+            async with governor.stage(STAGE_LLM):
+                raw = await _call_with_retry(provider, handler, prompt, max_tokens, temperature)
         except RateLimitError:
             logger.warning("Provider %s exhausted, falling back to next", provider)
             continue
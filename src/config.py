@@ -1,3 +1,5 @@
+import functools
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,11 +14,15 @@ LANGUAGES = (
     GERMAN,
 )
 
+# getFile download limits: cloud Bot API vs a self-hosted telegram-bot-api server
+BOT_API_MAX_FILE_BYTES = 20 * 1024 * 1024
+LOCAL_BOT_API_MAX_FILE_BYTES = 2000 * 1024 * 1024
+
 
-def _parse_comma_separated_ids(value: str) -> set[str]:
-    if not value.strip():
-        return set()
-    return {x.strip() for x in value.split(",") if x.strip()}
+@functools.cache
+def _parse_comma_separated_ids(value: str) -> frozenset[str]:
+    # Cached per raw string: the id lists are checked on every message
+    return frozenset(x.strip() for x in value.split(",") if x.strip())
 
 
 class Settings(BaseSettings):
@@ -30,6 +36,9 @@ class Settings(BaseSettings):
     default_language: str = RUSSIAN
     telegram_bot_command: str = "евлампий"
     telegram_bot_token: str = ""
+    # Self-hosted telegram-bot-api server, e.g. "http://telegram-bot-api:8081". Enables local
+    # mode: voice files are read from the server's disk (shared volume) instead of downloaded
+    telegram_api_base_url: str = ""
 
     mongo_uri: str = "mongodb://mongodb:27017/"
 
@@ -56,6 +65,11 @@ class Settings(BaseSettings):
     admin_user_ids_raw: str = Field(default="", validation_alias="ADMIN_USER_IDS")
     free_monthly_tokens: int = 10
     seconds_per_token: int = 20
+    # Voice admission, checked from Telegram metadata before download (0 = no limit)
+    max_voice_seconds_free: int = 600
+    max_voice_seconds_paid: int = 3600
+    max_voice_file_bytes: int = 0  # 0 = Bot API limit: 20 MB cloud, 2000 MB local server
+    voice_over_limit_action: str = "truncate"  # "truncate" or "reject"
 
     # Groq
     groq_api_key: str = ""
@@ -93,6 +107,55 @@ class Settings(BaseSettings):
 
     # Wit.ai monthly free limit
     wit_free_monthly_limit: int = 500
+    # Max concurrent Wit.ai chunk requests per language app
+    wit_max_concurrent_chunks: int = 4
+
+    # Audio CPU work pool: "thread" or "process"
+    audio_executor_kind: str = "thread"
+    audio_executor_workers: int = 0  # 0 = one per CPU core
+    audio_executor_max_queue: int = 32
+    # Inputs at least this large are decoded as a stream with bounded memory (Wit.ai and Groq)
+    streaming_decode_min_bytes: int = 1_000_000
+    # In-process LRU in front of the shared Mongo cache (7-day TTL); 0 disables both tiers
+    transcription_cache_size: int = 1024
+    # In-process cache of chat settings and bot config (invalidated on write); 0 disables
+    settings_cache_size: int = 10_000
+    settings_cache_ttl_seconds: float = 60.0
+    # Role assignments are held in memory; other instances' changes show up within this
+    role_index_refresh_seconds: float = 300.0
+    # Chats whose recent-transcription context is kept in memory (for settings_cache_ttl_seconds)
+    recent_transcriptions_cache_size: int = 10_000
+    # Usage statistics are buffered and written in one bulk upsert this often; 0 = immediately
+    counter_flush_interval_seconds: float = 5.0
+    # Documents each monthly system/Wit.ai counter is spread over, so instances do not
+    # serialize on one document; readers sum them
+    stats_counter_shards: int = 8
+
+    # Durable voice job queue in Mongo; 0 workers = process inline in the handler
+    job_workers: int = 4
+    job_max_attempts: int = 3
+    job_visibility_timeout_seconds: int = 300  # lease, extended while the job runs
+    job_retry_delay_seconds: int = 10  # doubled after every failed attempt
+    job_poll_interval_seconds: float = 1.0
+    # Scheduling delay per job, divided by the tier weight: how far paid tiers jump ahead
+    # of free ones and how far apart one chat's queued messages are spaced
+    job_schedule_quantum_seconds: float = 10.0
+
+    # Concurrency limit per pipeline stage and event loop (Telegram, WhatsApp); 0 = unlimited
+    max_concurrent_audio: int = 8  # transcriptions (decode + provider calls)
+    max_concurrent_provider_calls: int = 16  # Wit.ai / Groq requests
+    max_concurrent_llm_calls: int = 4  # transcript cleanup and categorization
+    max_concurrent_github_writes: int = 4
+    # Voice messages of one user processed at once (inline or by job workers); the rest wait
+    max_voice_in_flight_per_user: int = 1
+    # Free-tier voice is refused with a "busy" reply when the expected wait exceeds this; 0 = never
+    shed_free_tier_wait_seconds: float = 120.0
+
+    # Silence trimming before upload and billing
+    silence_trim_enabled: bool = True
+    silence_threshold_dbfs: float = -45.0
+    silence_min_pause_ms: int = 1000  # shorter pauses are left untouched
+    silence_keep_ms: int = 400  # silence kept around speech (half on each side)
 
     # Self-test
     selftest_sample_path: str = "./data/e2e_deploy_ru.ogg"
@@ -102,11 +165,21 @@ class Settings(BaseSettings):
     fastapi_port: int = 8000
 
     @property
-    def vip_user_ids(self) -> set[str]:
+    def telegram_local_mode(self) -> bool:
+        return bool(self.telegram_api_base_url)
+
+    @property
+    def voice_file_size_limit(self) -> int:
+        if self.max_voice_file_bytes:
+            return self.max_voice_file_bytes
+        return LOCAL_BOT_API_MAX_FILE_BYTES if self.telegram_local_mode else BOT_API_MAX_FILE_BYTES
+
+    @property
+    def vip_user_ids(self) -> frozenset[str]:
         return _parse_comma_separated_ids(self.vip_user_ids_raw)
 
     @property
-    def admin_user_ids(self) -> set[str]:
+    def admin_user_ids(self) -> frozenset[str]:
         return _parse_comma_separated_ids(self.admin_user_ids_raw)
 
 
@@ -0,0 +1,190 @@
+"""Usage counters buffered in memory and written to Mongo as periodic bulk $inc upserts."""
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import random
+import threading
+import typing
+
+from beanie import Document
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (document model, equality filter identifying the counter document)
+_CounterKey = tuple[type[Document], tuple[tuple[str, str], ...]]
+
+
+def _counter_key(model: type[Document], key: dict[str, str]) -> _CounterKey:
+    return model, tuple(sorted(key.items()))
+
+
+def _shard_filter(key: dict[str, str], shards: int) -> dict[str, typing.Any]:
+    if shards <= 1:
+        return key
+    return {**key, "shard": random.randrange(shards)}  # noqa: S311 - spreads load only
+
+
+async def increment_now(
+    model: type[Document], key: dict[str, str], shards: int = 1, **increments: int
+) -> None:
+    """Unbuffered CounterBuffer.add: one $inc upsert of one shard, written before returning."""
+    await model.get_motor_collection().update_one(
+        _shard_filter(key, shards), {"$inc": increments}, upsert=True
+    )
+
+
+@dataclasses.dataclass
+class CounterStats:
+    pending: int  # counter documents with increments not yet written
+    flushes: int
+    writes: int  # upserts sent
+    failures: int  # upserts that failed and were put back for the next flush
+
+
+class CounterBuffer:
+    """
+    Accumulates counter increments and writes them every interval_seconds.
+
+    Statistics bookkeeping then costs one bulk_write per collection every few seconds
+    instead of a find-then-save per counter per message. Until start() (and with interval 0)
+    add() writes through immediately. Increments may come from any thread; pending() lets
+    readers that act on a counter see this instance's unflushed part.
+
+    Counters written by every instance can be spread over shards: each write goes to the
+    document {**key, "shard": n} for a random n, and readers sum the shards.
+    """
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self._pending: dict[_CounterKey, collections.Counter[str]] = {}
+        self._shards: dict[_CounterKey, int] = {}
+        self._lock = threading.Lock()  # add() runs on the Telegram and WhatsApp loops
+        self._task: asyncio.Task | None = None
+        self._flushes = 0
+        self._writes = 0
+        self._failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def add(
+        self, model: type[Document], key: dict[str, str], shards: int = 1, **increments: int
+    ) -> None:
+        """Increment fields of the document matching key (one of its shards), upserting it."""
+        increments = {field: amount for field, amount in increments.items() if amount}
+        if not increments:
+            return
+        if not self.running:
+            await increment_now(model, key, shards, **increments)
+            return
+        counter_key = _counter_key(model, key)
+        self._merge({counter_key: collections.Counter(increments)}, {counter_key: shards})
+
+    def pending(self, model: type[Document], key: dict[str, str]) -> dict[str, int]:
+        """Increments to the document matching key that are not written yet."""
+        with self._lock:
+            return dict(self._pending.get(_counter_key(model, key), {}))
+
+    def pending_for(self, model: type[Document]) -> list[tuple[dict[str, str], dict[str, int]]]:
+        """(key, unwritten increments) of every pending document of one model."""
+        with self._lock:
+            return [
+                (dict(key), dict(increments))
+                for (pending_model, key), increments in self._pending.items()
+                if pending_model is model
+            ]
+
+    def _merge(
+        self, batch: dict[_CounterKey, collections.Counter[str]], shards: dict[_CounterKey, int]
+    ) -> None:
+        with self._lock:
+            for counter_key, increments in batch.items():
+                self._pending.setdefault(counter_key, collections.Counter()).update(increments)
+                self._shards[counter_key] = shards.get(counter_key, 1)
+
+    async def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            shards, self._shards = self._shards, {}
+        if batch:
+            self._flushes += 1
+            await self._write(batch, shards)
+
+    async def _write(
+        self, batch: dict[_CounterKey, collections.Counter[str]], shards: dict[_CounterKey, int]
+    ) -> None:
+        by_model: dict[type[Document], list[_CounterKey]] = collections.defaultdict(list)
+        for counter_key in batch:
+            by_model[counter_key[0]].append(counter_key)
+        for model, keys in by_model.items():
+            requests = [
+                UpdateOne(
+                    _shard_filter(dict(key), shards.get((model, key), 1)),
+                    {"$inc": dict(batch[(model, key)])},
+                    upsert=True,
+                )
+                for _, key in keys
+            ]
+            self._writes += len(requests)
+            try:
+                await model.get_motor_collection().bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+                self._requeue(batch, shards, failed, e)
+            except Exception as e:
+                self._requeue(batch, shards, keys, e)
+
+    def _requeue(
+        self,
+        batch: dict[_CounterKey, collections.Counter[str]],
+        shards: dict[_CounterKey, int],
+        keys: list[_CounterKey],
+        error: Exception,
+    ) -> None:
+        logger.warning("Counter flush failed for %d documents, retrying: %s", len(keys), error)
+        self._failures += len(keys)
+        self._merge({counter_key: batch[counter_key] for counter_key in keys}, shards)
+
+    async def start(self) -> None:
+        if self.running or self.interval_seconds <= 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="counter-flush")
+
+    async def stop(self) -> None:
+        """Stop the periodic flush and write whatever is still pending."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Counter flush failed")
+
+    def stats(self) -> CounterStats:
+        with self._lock:
+            pending = len(self._pending)
+        return CounterStats(
+            pending=pending, flushes=self._flushes, writes=self._writes, failures=self._failures
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._shards.clear()
+
+
+# Module-level singleton — started in the Telegram post_init hook
+usage_counters = CounterBuffer(settings.counter_flush_interval_seconds)
@@ -1,14 +1,20 @@
 """Credit system for monetization."""
 
+import asyncio
+import contextlib
 import dataclasses
 import datetime
 import hashlib
 import math
+import typing
+
+from pymongo import ReturnDocument
 
 from src import const
 from src.config import settings
+from src.counters import increment_now, usage_counters
 from src.dto import MonthlyStats, UsedTrial, UserCredits, UserMonthlyUsage, UserTier
-from src.mongo import has_role
+from src.mongo import get_user_roles, has_role
 
 
 @dataclasses.dataclass
@@ -18,6 +24,91 @@ class DeductResult:
     overdraft: bool  # True = balance was insufficient, deducted what was available
 
 
+@dataclasses.dataclass
+class CreditReservation:
+    """Tokens taken from the balance ahead of billing, by the bucket they came from."""
+
+    user_id: str
+    free: int
+    purchased: int
+    settled: bool = False
+
+    @property
+    def tokens(self) -> int:
+        return self.free + self.purchased
+
+
+@dataclasses.dataclass
+class VoiceAdmission:
+    allowed: bool
+    max_seconds: int | None = None  # transcribe at most this much audio; None = whole file
+    reason: str = ""  # translates key explaining a rejection or truncation
+    reserved_tokens: int = 0  # taken from the balance until the message is billed
+    reservation: CreditReservation | None = dataclasses.field(
+        default=None, compare=False, repr=False
+    )
+
+
+VOICE_OVER_LIMIT_TRUNCATE = "truncate"
+
+
+@dataclasses.dataclass
+class _UserVoiceState:
+    slots: asyncio.Semaphore
+    lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock)
+    refs: int = 0  # holders and waiters of slots or lock
+
+
+class UserVoiceGate:
+    """
+    Per-user in-flight voice limit and admission lock (this process).
+
+    Inline messages beyond settings.max_voice_in_flight_per_user wait for a slot in
+    arrival order; queued ones are held back at claim time instead (see jobs.claim_job),
+    so no worker blocks here. Admission runs under a per-user lock, so a burst is admitted
+    in order, each message seeing the balance the previous reservation left.
+    """
+
+    def __init__(self) -> None:
+        self._users: dict[str, _UserVoiceState] = {}
+
+    @contextlib.asynccontextmanager
+    async def _hold(self, user_id: str) -> typing.AsyncIterator[_UserVoiceState]:
+        state = self._users.get(user_id)
+        if state is None:
+            slots = asyncio.Semaphore(max(1, settings.max_voice_in_flight_per_user))
+            state = self._users[user_id] = _UserVoiceState(slots)
+        state.refs += 1
+        try:
+            yield state
+        finally:
+            state.refs -= 1
+            if not state.refs:
+                self._users.pop(user_id, None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user_id: str) -> typing.AsyncIterator[None]:
+        """Occupy one of the user's in-flight places for the whole pipeline."""
+        async with self._hold(user_id) as state, state.slots:
+            yield
+
+    @contextlib.asynccontextmanager
+    async def accounting(self, user_id: str) -> typing.AsyncIterator[None]:
+        """Serialize balance checks and reservations of one user."""
+        async with self._hold(user_id) as state, state.lock:
+            yield
+
+    def in_flight_users(self) -> int:
+        return len(self._users)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+
+# Module-level singleton — one gate per process
+voice_gate = UserVoiceGate()
+
+
 def hash_user_id(user_id: str) -> str:
     return hashlib.sha256(user_id.encode()).hexdigest()
 
@@ -59,44 +150,208 @@ async def has_unlimited_voice_access(user_id: str) -> bool:
     return await is_tester_user(user_id)
 
 
-async def get_user_tier(user_id: str) -> UserTier:
-    if await is_vip_user(user_id) or is_admin_user(user_id):
+def resolve_tier(
+    user_id: str, roles: typing.Collection[str], credits: UserCredits | None
+) -> UserTier:
+    """Tier from already loaded roles and credits record, without queries."""
+    if const.ROLE_VIP in roles or user_id in settings.vip_user_ids or is_admin_user(user_id):
         return UserTier.VIP
-    if await is_tester_user(user_id):
+    if const.ROLE_TESTER in roles:
         return UserTier.TESTER
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if record and record.tier == UserTier.PAID:
+    if credits and credits.tier == UserTier.PAID:
         return UserTier.PAID
     return UserTier.FREE
 
 
+def has_unlimited_voice(tier: UserTier) -> bool:
+    """VIP (admins included) and testers are not billed for voice."""
+    return tier in (UserTier.VIP, UserTier.TESTER)
+
+
+async def get_user_tier(user_id: str) -> UserTier:
+    roles, record = await asyncio.gather(
+        get_user_roles(user_id), UserCredits.find_one(UserCredits.user_id == user_id)
+    )
+    return resolve_tier(user_id, roles, record)
+
+
+def max_voice_seconds(tier: UserTier) -> int:
+    """Per-tier voice length limit in seconds; 0 = no limit."""
+    if tier == UserTier.FREE:
+        return settings.max_voice_seconds_free
+    if tier == UserTier.PAID:
+        return settings.max_voice_seconds_paid
+    return 0
+
+
+async def _voice_limit(user_id: str, tier: UserTier) -> tuple[int | None, str]:
+    """Seconds the user may transcribe now (None = no limit) and the reason key if it binds."""
+    limit = max_voice_seconds(tier) or None
+    if has_unlimited_voice(tier):
+        return limit, "voice_too_long"
+    # Messages still in flight have already taken their reservations from the balance
+    affordable = await get_total_credits(user_id) * const.SECONDS_PER_TOKEN
+    if limit is None or affordable < limit:
+        return affordable, "insufficient_credits"
+    return limit, "voice_too_long"
+
+
+async def admit_voice(
+    user_id: str, tier: UserTier, duration_seconds: int | None, file_size: int | None
+) -> VoiceAdmission:
+    """
+    Decide from message metadata alone whether a voice message is worth downloading.
+
+    Enforces the file size cap, the tier length limit and the token balance (estimated
+    from the raw duration, which never undercharges since billing uses speech time).
+    Over-limit audio is truncated to what is allowed or rejected,
+    per settings.voice_over_limit_action.
+
+    An admitted message reserves its estimated cost in the ledger; the caller must
+    settle_credits() or release_credits() admission.reservation.
+    """
+    async with voice_gate.accounting(user_id):
+        admission = await _admit_voice(user_id, tier, duration_seconds, file_size)
+        if admission.allowed and not has_unlimited_voice(tier):
+            billable_seconds = admission.max_seconds or duration_seconds or 0
+            reservation = await reserve_credits(user_id, calculate_token_cost(billable_seconds))
+            admission.reservation = reservation
+            admission.reserved_tokens = reservation.tokens
+    return admission
+
+
+@contextlib.asynccontextmanager
+async def voice_admission(
+    user_id: str, tier: UserTier, duration_seconds: int | None, file_size: int | None
+) -> typing.AsyncIterator[VoiceAdmission]:
+    """
+    admit_voice for the block: transcribe and settle_credits() within it.
+
+    A reservation left unsettled when it exits (dropped message, error) is returned to
+    the balance.
+    """
+    admission = await admit_voice(user_id, tier, duration_seconds, file_size)
+    try:
+        yield admission
+    finally:
+        if admission.reservation:
+            await release_credits(admission.reservation)
+
+
+async def _admit_voice(
+    user_id: str, tier: UserTier, duration_seconds: int | None, file_size: int | None
+) -> VoiceAdmission:
+    if file_size and file_size > settings.voice_file_size_limit:
+        return VoiceAdmission(allowed=False, reason="voice_file_too_large")
+
+    limit, limit_reason = await _voice_limit(user_id, tier)
+    if limit == 0:
+        return VoiceAdmission(allowed=False, reason=limit_reason)
+    if limit is None or (duration_seconds and duration_seconds <= limit):
+        return VoiceAdmission(allowed=True)
+    if not duration_seconds:
+        # No metadata to estimate from — cap the decode instead
+        return VoiceAdmission(allowed=True, max_seconds=limit)
+    if settings.voice_over_limit_action == VOICE_OVER_LIMIT_TRUNCATE:
+        return VoiceAdmission(allowed=True, max_seconds=limit, reason="voice_truncated")
+    return VoiceAdmission(allowed=False, max_seconds=limit, reason=limit_reason)
+
+
 def current_month_key() -> str:
     return datetime.datetime.now(datetime.UTC).strftime("%Y-%m")
 
 
-# --- Lazy reset ---
+# --- Ledger ---
+#
+# Every balance change is a single find_one_and_update: creating the record (upsert), the
+# lazy monthly reset of free credits and the arithmetic all run server-side in one update
+# pipeline, so payments, admin top-ups and transcriptions never overwrite each other.
 
+_LEDGER_COUNTERS = (
+    "purchased_credits",
+    "total_transcriptions",
+    "total_audio_seconds",
+    "total_tokens_used",
+    "total_credits_spent",
+    "total_credits_purchased",
+)
 
-async def _ensure_fresh_free_credits(record: UserCredits) -> UserCredits:
-    """Lazy reset: if month is not current, refresh free_credits."""
-    current = current_month_key()
-    if record.free_credits_month != current:
-        record.free_credits = settings.free_monthly_tokens
-        record.free_credits_month = current
-        await record.save()
-    return record
 
+def _fresh_stage() -> dict:
+    """Pipeline stage: defaults for a new record and the lazy monthly reset of free credits."""
+    month = current_month_key()
+    return {
+        "$set": {
+            "free_credits": {
+                "$cond": [
+                    {"$eq": ["$free_credits_month", month]},
+                    "$free_credits",
+                    settings.free_monthly_tokens,
+                ]
+            },
+            "free_credits_month": month,
+            "tier": {"$ifNull": ["$tier", UserTier.FREE.value]},
+            **{field: {"$ifNull": [f"${field}", 0]} for field in _LEDGER_COUNTERS},
+        }
+    }
+
+
+def _balance(raw: dict | None) -> tuple[int, int]:
+    """(free, purchased) of a raw record as of now, with the lazy reset applied."""
+    if raw is None:
+        return settings.free_monthly_tokens, 0
+    free = raw.get("free_credits", settings.free_monthly_tokens)
+    if raw.get("free_credits_month") != current_month_key():
+        free = settings.free_monthly_tokens
+    return free, raw.get("purchased_credits", 0)
+
+
+def _split(free: int, purchased: int, tokens: int) -> tuple[int, int]:
+    """What taking tokens uses from each bucket: free first, never below 0."""
+    taken = min(tokens, free + purchased)
+    free_used = min(free, taken)
+    return free_used, taken - free_used
+
+
+async def _update_ledger(
+    user_id: str, pipeline: list[dict], return_document: bool = ReturnDocument.BEFORE
+) -> dict | None:
+    return await UserCredits.get_motor_collection().find_one_and_update(
+        {"user_id": user_id},
+        [_fresh_stage(), *pipeline],
+        upsert=True,
+        return_document=return_document,
+    )
 
-async def _get_or_create_user_credits(user_id: str) -> UserCredits:
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        record = UserCredits(
-            user_id=user_id,
-            free_credits=settings.free_monthly_tokens,
-            free_credits_month=current_month_key(),
-        )
-        await record.insert()
-    return record
+
+async def _take(user_id: str, tokens: int, spent: int | None = None) -> tuple[int, int]:
+    """
+    Take up to tokens from the balance, free first; returns (free_used, purchased_used).
+
+    spent: tokens to add to the usage totals on top of what is taken now (None: count
+    nothing, the take is a reservation).
+    """
+    take = {"$min": [tokens, {"$add": ["$free_credits", "$purchased_credits"]}]}
+    debit = {
+        "free_credits": {"$subtract": ["$free_credits", "$_free"]},
+        "purchased_credits": {
+            "$subtract": ["$purchased_credits", {"$subtract": ["$_take", "$_free"]}]
+        },
+    }
+    if spent is not None:
+        charged = {"$add": [spent, "$_take"]}
+        debit["total_tokens_used"] = {"$add": ["$total_tokens_used", charged]}
+        debit["total_credits_spent"] = {"$add": ["$total_credits_spent", charged]}
+    before = await _update_ledger(
+        user_id,
+        [
+            {"$set": {"_take": take}},
+            {"$set": {"_free": {"$min": ["$free_credits", "$_take"]}}},
+            {"$set": debit},
+            {"$project": {"_take": False, "_free": False}},
+        ],
+    )
+    return _split(*_balance(before), tokens)
 
 
 # --- Credit queries ---
@@ -104,11 +359,11 @@ async def _get_or_create_user_credits(user_id: str) -> UserCredits:
 
 async def get_credits(user_id: str) -> tuple[int, int]:
     """Return (free_credits, purchased_credits) with lazy reset."""
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        return (settings.free_monthly_tokens, 0)
-    record = await _ensure_fresh_free_credits(record)
-    return (record.free_credits, record.purchased_credits)
+    raw = await UserCredits.get_motor_collection().find_one(
+        {"user_id": user_id},
+        projection={"free_credits": True, "free_credits_month": True, "purchased_credits": True},
+    )
+    return _balance(raw)
 
 
 async def get_total_credits(user_id: str) -> int:
@@ -117,83 +372,99 @@ async def get_total_credits(user_id: str) -> int:
     return free + purchased
 
 
-async def can_perform_operation(user_id: str, cost: int) -> tuple[bool, str]:
-    if await has_unlimited_access(user_id):
-        return True, ""
-    free, purchased = await get_credits(user_id)
-    if free + purchased >= cost:
-        return True, ""
-    return False, "insufficient_credits"
-
-
 # --- Credit mutations ---
 
 
 async def add_credits(user_id: str, amount: int) -> int:
     """Add purchased credits. Returns new purchased balance."""
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        record = UserCredits(
-            user_id=user_id,
-            purchased_credits=amount,
-            tier=UserTier.PAID,
-            total_credits_purchased=amount,
-            free_credits=settings.free_monthly_tokens,
-            free_credits_month=current_month_key(),
-        )
-        await record.insert()
-    else:
-        record.purchased_credits += amount
-        record.tier = UserTier.PAID
-        record.total_credits_purchased += amount
-        await record.save()
-    return record.purchased_credits
+    after = await _update_ledger(
+        user_id,
+        [
+            {
+                "$set": {
+                    "purchased_credits": {"$add": ["$purchased_credits", amount]},
+                    "total_credits_purchased": {"$add": ["$total_credits_purchased", amount]},
+                    "tier": UserTier.PAID.value,
+                }
+            }
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    return after["purchased_credits"]
 
 
 async def admin_add_credits(user_id: str, amount: int) -> int:
     """Add credits without changing tier (for admin top-ups)."""
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        record = UserCredits(
-            user_id=user_id,
-            purchased_credits=amount,
-            free_credits=settings.free_monthly_tokens,
-            free_credits_month=current_month_key(),
-        )
-        await record.insert()
-    else:
-        record.purchased_credits += amount
-        await record.save()
-    return record.purchased_credits
-
+    after = await _update_ledger(
+        user_id,
+        [{"$set": {"purchased_credits": {"$add": ["$purchased_credits", amount]}}}],
+        return_document=ReturnDocument.AFTER,
+    )
+    return after["purchased_credits"]
+
+
+async def reserve_credits(user_id: str, tokens: int) -> CreditReservation:
+    """Take up to tokens from the balance before the work they pay for; see settle_credits."""
+    free, purchased = await _take(user_id, tokens)
+    return CreditReservation(user_id=user_id, free=free, purchased=purchased)
+
+
+async def _refund(reservation: CreditReservation, free: int, purchased: int, spent: int) -> None:
+    # Free credits never exceed the monthly allowance, even if the month rolled over meanwhile
+    refunded_free = {"$add": ["$free_credits", free]}
+    await _update_ledger(
+        reservation.user_id,
+        [
+            {
+                "$set": {
+                    "free_credits": {"$min": [settings.free_monthly_tokens, refunded_free]},
+                    "purchased_credits": {"$add": ["$purchased_credits", purchased]},
+                    "total_tokens_used": {"$add": ["$total_tokens_used", spent]},
+                    "total_credits_spent": {"$add": ["$total_credits_spent", spent]},
+                }
+            }
+        ],
+    )
 
-async def deduct_credits(user_id: str, cost: int) -> DeductResult:
-    """Deduct tokens: free first, then purchased.
 
-    Never goes below 0. If not enough — deducts what's available (overdraft).
+async def settle_credits(reservation: CreditReservation, cost: int) -> DeductResult:
     """
-    record = await _get_or_create_user_credits(user_id)
-    record = await _ensure_fresh_free_credits(record)
-
-    total_available = record.free_credits + record.purchased_credits
-    actual_cost = min(cost, total_available)
-
-    free_used = min(record.free_credits, actual_cost)
-    purchased_used = actual_cost - free_used
-
-    record.free_credits -= free_used
-    record.purchased_credits -= purchased_used
-    record.total_tokens_used += actual_cost
-    record.total_credits_spent += actual_cost
-    await record.save()
+    Bill the actual cost against a reservation in one update.
 
+    The unused part is refunded, purchased tokens first (they were taken last); a cost
+    above the reservation takes the rest from the balance, free first, never below 0
+    (what it cannot cover is reported as overdraft).
+    """
+    reservation.settled = True
+    if cost > reservation.tokens:
+        free_used, purchased_used = await _take(
+            reservation.user_id, cost - reservation.tokens, spent=reservation.tokens
+        )
+        return DeductResult(
+            free_used=reservation.free + free_used,
+            purchased_used=reservation.purchased + purchased_used,
+            overdraft=free_used + purchased_used < cost - reservation.tokens,
+        )
+    refund_purchased = min(reservation.purchased, reservation.tokens - cost)
+    refund_free = reservation.tokens - cost - refund_purchased
+    if refund_free or refund_purchased or cost:
+        await _refund(reservation, refund_free, refund_purchased, spent=cost)
     return DeductResult(
-        free_used=free_used,
-        purchased_used=purchased_used,
-        overdraft=total_available < cost,
+        free_used=reservation.free - refund_free,
+        purchased_used=reservation.purchased - refund_purchased,
+        overdraft=False,
     )
 
 
+async def release_credits(reservation: CreditReservation) -> None:
+    """Return an unsettled reservation to the balance (the work was dropped or failed)."""
+    if reservation.settled:
+        return
+    reservation.settled = True
+    if reservation.tokens:
+        await _refund(reservation, reservation.free, reservation.purchased, spent=0)
+
+
 # --- Legacy (kept for backward compat, no longer called from handlers) ---
 
 
@@ -205,34 +476,24 @@ async def grant_initial_credits_if_eligible(user_id: str) -> bool:
 
     await UsedTrial(user_hash=user_hash).insert()
 
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        record = UserCredits(user_id=user_id, purchased_credits=3)
-        await record.insert()
-    else:
-        record.purchased_credits += 3
-        await record.save()
+    await _update_ledger(
+        user_id, [{"$set": {"purchased_credits": {"$add": ["$purchased_credits", 3]}}}]
+    )
     return True
 
 
 # --- Usage tracking ---
+#
+# Statistics are buffered by usage_counters and written in periodic bulk upserts.
 
 
 async def increment_user_stats(user_id: str, audio_seconds: int = 0):
-    record = await UserCredits.find_one(UserCredits.user_id == user_id)
-    if not record:
-        record = UserCredits(
-            user_id=user_id,
-            total_transcriptions=1,
-            total_audio_seconds=audio_seconds,
-            free_credits=settings.free_monthly_tokens,
-            free_credits_month=current_month_key(),
-        )
-        await record.insert()
-    else:
-        record.total_transcriptions += 1
-        record.total_audio_seconds += audio_seconds
-        await record.save()
+    await usage_counters.add(
+        UserCredits,
+        {"user_id": user_id},
+        total_transcriptions=1,
+        total_audio_seconds=audio_seconds,
+    )
 
 
 async def record_user_usage(
@@ -243,53 +504,63 @@ async def record_user_usage(
     purchased_used: int,
 ):
     """Record per-user monthly usage."""
-    month = current_month_key()
-    record = await UserMonthlyUsage.find_one(
-        UserMonthlyUsage.user_id == user_id,
-        UserMonthlyUsage.month_key == month,
+    await usage_counters.add(
+        UserMonthlyUsage,
+        {"user_id": user_id, "month_key": current_month_key()},
+        transcriptions=1,
+        audio_seconds=audio_seconds,
+        tokens_used=tokens,
+        free_tokens_used=free_used,
+        purchased_tokens_used=purchased_used,
     )
-    if not record:
-        record = UserMonthlyUsage(user_id=user_id, month_key=month)
-        await record.insert()
-
-    record.transcriptions += 1
-    record.audio_seconds += audio_seconds
-    record.tokens_used += tokens
-    record.free_tokens_used += free_used
-    record.purchased_tokens_used += purchased_used
-    await record.save()
 
 
 # --- System stats ---
 
 
-async def _get_or_create_monthly_stats() -> MonthlyStats:
-    month_key = current_month_key()
-    record = await MonthlyStats.find_one(MonthlyStats.month_key == month_key)
-    if not record:
-        record = MonthlyStats(month_key=month_key)
-        await record.insert()
-    return record
-
-
 async def increment_transcription_stats():
-    record = await _get_or_create_monthly_stats()
-    record.total_transcriptions += 1
-    await record.save()
+    await usage_counters.add(
+        MonthlyStats,
+        {"month_key": current_month_key()},
+        shards=settings.stats_counter_shards,
+        total_transcriptions=1,
+    )
 
 
 async def record_groq_usage(duration_seconds: int):
-    record = await _get_or_create_monthly_stats()
-    record.groq_audio_seconds += duration_seconds
-    await record.save()
+    await usage_counters.add(
+        MonthlyStats,
+        {"month_key": current_month_key()},
+        shards=settings.stats_counter_shards,
+        groq_audio_seconds=duration_seconds,
+    )
 
 
 async def increment_payment_stats(credits_sold: int):
-    record = await _get_or_create_monthly_stats()
-    record.total_payments += 1
-    record.total_credits_sold += credits_sold
-    await record.save()
+    # Written at once, not buffered: payment alerts read it right after
+    await increment_now(
+        MonthlyStats,
+        {"month_key": current_month_key()},
+        shards=settings.stats_counter_shards,
+        total_payments=1,
+        total_credits_sold=credits_sold,
+    )
+
+
+_MONTHLY_COUNTERS = (
+    "total_transcriptions",
+    "total_payments",
+    "total_credits_sold",
+    "groq_audio_seconds",
+)
 
 
 async def get_monthly_stats(month: str) -> MonthlyStats | None:
-    return await MonthlyStats.find_one(MonthlyStats.month_key == month)
+    """The month's counters summed over their shards; None if nothing was recorded."""
+    shards = await MonthlyStats.find(MonthlyStats.month_key == month).to_list()
+    if not shards:
+        return None
+    return MonthlyStats(
+        month_key=month,
+        **{field: sum(getattr(shard, field) for shard in shards) for field in _MONTHLY_COUNTERS},
+    )
@@ -3,7 +3,7 @@ import typing
 from enum import Enum
 
 from beanie import Document
-from pydantic import Field
+from pydantic import BaseModel, Field
 from pymongo import ASCENDING, IndexModel
 
 
@@ -23,6 +23,10 @@ class UserSettings(Document):
 
     class Settings:
         name = "users"
+        # Setters upsert on chat_id; migrate_user_settings_to_unique merges older duplicates
+        indexes: typing.ClassVar = [
+            IndexModel([("chat_id", ASCENDING)], unique=True),
+        ]
 
 
 class UserTier(str, Enum):
@@ -52,6 +56,9 @@ class UserCredits(Document):
 
     class Settings:
         name = "user_credits"
+        indexes: typing.ClassVar = [
+            IndexModel([("user_id", ASCENDING)], unique=True),
+        ]
 
 
 class UserMonthlyUsage(Document):
@@ -66,6 +73,9 @@ class UserMonthlyUsage(Document):
 
     class Settings:
         name = "user_monthly_usage"
+        indexes: typing.ClassVar = [
+            IndexModel([("user_id", ASCENDING), ("month_key", ASCENDING)], unique=True),
+        ]
 
 
 class UsedTrial(Document):
@@ -73,6 +83,9 @@ class UsedTrial(Document):
 
     class Settings:
         name = "used_trials"
+        indexes: typing.ClassVar = [
+            IndexModel([("user_hash", ASCENDING)]),
+        ]
 
 
 class BotConfig(Document):
@@ -83,19 +96,31 @@ class BotConfig(Document):
 
     class Settings:
         name = "bot_config"
+        indexes: typing.ClassVar = [
+            IndexModel([("key", ASCENDING)], unique=True),
+        ]
 
 
 class WitUsageStats(Document):
+    """One shard of a month's request counter per language; readers sum the shards."""
+
     month_key: str  # "2026-01"
     language: str = ""  # "en", "ru", "es", "de"; empty for legacy records
+    shard: int = 0  # unsharded legacy records have none
     request_count: int = 0
 
     class Settings:
         name = "wit_usage_stats"
+        indexes: typing.ClassVar = [
+            IndexModel([("month_key", ASCENDING), ("language", ASCENDING), ("shard", ASCENDING)]),
+        ]
 
 
 class MonthlyStats(Document):
+    """One shard of a month's system counters; get_monthly_stats sums the shards."""
+
     month_key: str  # "2026-01"
+    shard: int = 0  # unsharded legacy records have none
     total_transcriptions: int = 0
     total_payments: int = 0
     total_credits_sold: int = 0
@@ -103,6 +128,9 @@ class MonthlyStats(Document):
 
     class Settings:
         name = "monthly_stats"
+        indexes: typing.ClassVar = [
+            IndexModel([("month_key", ASCENDING), ("shard", ASCENDING)]),
+        ]
 
 
 def _utc_now():
@@ -116,6 +144,9 @@ class AlertState(Document):
 
     class Settings:
         name = "alert_state"
+        indexes: typing.ClassVar = [
+            IndexModel([("alert_type", ASCENDING), ("month_key", ASCENDING)]),
+        ]
 
 
 class UserRole(Document):
@@ -126,6 +157,10 @@ class UserRole(Document):
 
     class Settings:
         name = "user_roles"
+        indexes: typing.ClassVar = [
+            IndexModel([("user_id", ASCENDING), ("role", ASCENDING)], unique=True),
+            IndexModel([("role", ASCENDING)]),
+        ]
 
 
 class AccountLink(Document):
@@ -134,6 +169,10 @@ class AccountLink(Document):
 
     class Settings:
         name = "account_links"
+        indexes: typing.ClassVar = [
+            IndexModel([("telegram_user_id", ASCENDING)], unique=True),
+            IndexModel([("whatsapp_phone", ASCENDING)], unique=True),
+        ]
 
 
 class LinkCode(Document):
@@ -143,6 +182,10 @@ class LinkCode(Document):
 
     class Settings:
         name = "link_codes"
+        indexes: typing.ClassVar = [
+            IndexModel([("code", ASCENDING)], unique=True),
+            IndexModel([("telegram_user_id", ASCENDING)]),
+        ]
 
 
 class LinkAttempt(Document):
@@ -153,23 +196,111 @@ class LinkAttempt(Document):
 
     class Settings:
         name = "link_attempts"
+        indexes: typing.ClassVar = [
+            IndexModel([("whatsapp_phone", ASCENDING)], unique=True),
+        ]
 
 
-_RECENT_TRANSCRIPTION_TTL_SECONDS = 7200  # 2 hours
+RECENT_TRANSCRIPTION_TTL_SECONDS = 7200  # 2 hours
 
 
-class RecentTranscription(Document):
-    """Stores recent cleaned transcriptions per chat for cleanup context (TTL 2h)."""
+class RecentEntry(BaseModel):
+    text: str
+    created_at: datetime.datetime = Field(default_factory=_utc_now)
+
+
+class RecentTranscriptions(Document):
+    """
+    Last few cleaned transcriptions of a chat, oldest first, for cleanup context.
+
+    One document per chat, capped on write with $push/$slice. Entries older than
+    RECENT_TRANSCRIPTION_TTL_SECONDS are ignored on read; the document itself expires
+    that long after its last write.
+    """
 
     chat_id: str
+    entries: list[RecentEntry] = Field(default_factory=list)
+    updated_at: datetime.datetime = Field(default_factory=_utc_now)
+
+    class Settings:
+        name = "recent_transcription_rings"
+        indexes: typing.ClassVar = [
+            IndexModel([("chat_id", ASCENDING)], unique=True),
+            IndexModel(
+                [("updated_at", ASCENDING)],
+                expireAfterSeconds=RECENT_TRANSCRIPTION_TTL_SECONDS,
+            ),
+        ]
+
+
+_TRANSCRIPTION_CACHE_TTL_SECONDS = 7 * 24 * 3600  # 7 days
+
+
+class CachedTranscription(Document):
+    """Transcription result shared across chats, keyed by provider, language and audio id."""
+
+    key: str
     text: str
+    duration: int
+    speech_duration: int
     created_at: datetime.datetime = Field(default_factory=_utc_now)
 
     class Settings:
-        name = "recent_transcriptions"
+        name = "transcription_cache"
         indexes: typing.ClassVar = [
+            IndexModel([("key", ASCENDING)], unique=True),
             IndexModel(
                 [("created_at", ASCENDING)],
-                expireAfterSeconds=_RECENT_TRANSCRIPTION_TTL_SECONDS,
+                expireAfterSeconds=_TRANSCRIPTION_CACHE_TTL_SECONDS,
             ),
         ]
+
+
+_MESSAGE_PROGRESS_TTL_SECONDS = 24 * 3600  # job retries end within minutes
+
+
+class MessageProgress(Document):
+    """Pipeline steps a message has completed; a retried job skips them."""
+
+    key: str  # "<chat_id>:<message_id>"
+    steps: list[str] = Field(default_factory=list)
+    # Cleanup results, reused by a retry instead of a second LLM call
+    text: str | None = None
+    obsidian_text: str | None = None
+    created_at: datetime.datetime = Field(default_factory=_utc_now)
+
+    class Settings:
+        name = "message_progress"
+        indexes: typing.ClassVar = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel(
+                [("created_at", ASCENDING)],
+                expireAfterSeconds=_MESSAGE_PROGRESS_TTL_SECONDS,
+            ),
+        ]
+
+
+class QueuedJob(Document):
+    """Durable unit of background work; deleted on success, kept as a dead letter on failure."""
+
+    kind: str  # handler name, e.g. "telegram_voice"
+    payload: dict[str, typing.Any]
+    status: str = "queued"  # "queued", "running" or "dead"
+    attempts: int = 0
+    visible_at: datetime.datetime = Field(default_factory=_utc_now)  # claimable from
+    worker: str = ""
+    last_error: str = ""
+    created_at: datetime.datetime = Field(default_factory=_utc_now)
+    # Scheduling: jobs are claimed in ascending order (weighted fair queueing tag)
+    chat_id: str = ""  # fair-share key
+    tier: UserTier = UserTier.FREE
+    order: float = 0.0
+    user_id: str = ""  # in-flight limit key; "" = unlimited
+
+    class Settings:
+        name = "job_queue"
+        indexes: typing.ClassVar = [
+            IndexModel([("status", ASCENDING), ("order", ASCENDING)]),
+            IndexModel([("chat_id", ASCENDING), ("order", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("user_id", ASCENDING)]),
+        ]
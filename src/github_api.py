@@ -5,6 +5,8 @@ import logging
 
 import httpx
 
+from src.governor import STAGE_GITHUB, governor
+
 logger = logging.getLogger(__name__)
 
 GITHUB_API_BASE = "https://api.github.com"
@@ -87,7 +89,7 @@ async def put_github_file(
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            async with httpx.AsyncClient() as client:
+            async with governor.stage(STAGE_GITHUB), httpx.AsyncClient() as client:
                 response = await client.put(url, headers=_github_headers(token), json=payload)
             if response.status_code in (http.HTTPStatus.OK, http.HTTPStatus.CREATED):
                 return True
@@ -171,7 +173,7 @@ async def delete_github_file(
 ) -> bool:
     """Delete a file from GitHub repository."""
     url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/contents/{path}"
-    async with httpx.AsyncClient() as client:
+    async with governor.stage(STAGE_GITHUB), httpx.AsyncClient() as client:
         response = await client.request(
             "DELETE",
             url,
@@ -0,0 +1,144 @@
+"""Concurrency limits per pipeline stage and event loop, and free-tier load shedding."""
+
+import asyncio
+import contextlib
+import dataclasses
+import functools
+import logging
+import time
+import typing
+
+from src.config import settings
+from src.dto import UserTier
+from src.jobs import job_pool
+from src.loop_local import LoopLocal
+
+logger = logging.getLogger(__name__)
+
+STAGE_AUDIO = "audio"
+STAGE_PROVIDER = "provider"
+STAGE_LLM = "llm"
+STAGE_GITHUB = "github"
+
+_EWMA_ALPHA = 0.2  # weight of the latest sample in the average stage time
+
+
+@dataclasses.dataclass
+class StageStats:
+    name: str
+    limit: int  # 0 = unlimited
+    running: int
+    waiting: int
+    completed: int
+    avg_seconds: float
+    expected_wait_seconds: float
+
+
+class _Stage:
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.limit = limit
+        # Per event loop: the WhatsApp webhook runs its own loop beside the Telegram one
+        self._semaphores: LoopLocal[asyncio.Semaphore] | None = (
+            LoopLocal(functools.partial(asyncio.Semaphore, limit)) if limit > 0 else None
+        )
+        self._running = 0
+        self._waiting = 0
+        self._completed = 0
+        self._avg_seconds = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> typing.AsyncIterator[None]:
+        semaphore = self._semaphores.get() if self._semaphores is not None else None
+        if semaphore is not None:
+            self._waiting += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self._waiting -= 1
+        self._running += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._running -= 1
+            self._completed += 1
+            self._avg_seconds += _EWMA_ALPHA * (elapsed - self._avg_seconds)
+            if semaphore is not None:
+                semaphore.release()
+
+    def expected_wait_seconds(self) -> float:
+        """Time for the callers already waiting to get through, at the recent pace."""
+        if not self._waiting or not self.limit:
+            return 0.0
+        return self._waiting * self._avg_seconds / self.limit
+
+    def stats(self) -> StageStats:
+        return StageStats(
+            name=self.name,
+            limit=self.limit,
+            running=self._running,
+            waiting=self._waiting,
+            completed=self._completed,
+            avg_seconds=self._avg_seconds,
+            expected_wait_seconds=self.expected_wait_seconds(),
+        )
+
+
+class ConcurrencyGovernor:
+    """
+    Named concurrency limits shared by everything on an event loop of this process.
+
+    Each stage is a semaphore with counters; callers queue for a slot instead of
+    piling requests onto providers that answer overload with 429s.
+    """
+
+    def __init__(self, limits: dict[str, int]) -> None:
+        self._stages = {name: _Stage(name, limit) for name, limit in limits.items()}
+        self._shed = 0
+
+    def stage(self, name: str) -> typing.AsyncContextManager[None]:
+        return self._stages[name].slot()
+
+    def expected_wait_seconds(self) -> float:
+        """Wait at the most congested stage."""
+        return max((stage.expected_wait_seconds() for stage in self._stages.values()), default=0.0)
+
+    def count_shed(self) -> None:
+        self._shed += 1
+
+    @property
+    def shed(self) -> int:
+        return self._shed
+
+    def stats(self) -> list[StageStats]:
+        return [stage.stats() for stage in self._stages.values()]
+
+
+# Module-level singleton — one set of limits per event loop of this process
+governor = ConcurrencyGovernor(
+    {
+        STAGE_AUDIO: settings.max_concurrent_audio,
+        STAGE_PROVIDER: settings.max_concurrent_provider_calls,
+        STAGE_LLM: settings.max_concurrent_llm_calls,
+        STAGE_GITHUB: settings.max_concurrent_github_writes,
+    }
+)
+
+
+async def expected_wait_seconds() -> float:
+    """Expected wait for new voice work: the job backlog plus the most congested stage."""
+    return await job_pool.expected_wait_seconds() + governor.expected_wait_seconds()
+
+
+async def should_shed(tier: UserTier) -> bool:
+    """Refuse new free-tier voice work early when the expected wait is too long."""
+    if tier != UserTier.FREE or settings.shed_free_tier_wait_seconds <= 0:
+        return False
+    wait = await expected_wait_seconds()
+    if wait <= settings.shed_free_tier_wait_seconds:
+        return False
+    governor.count_shed()
+    logger.info("Shedding free-tier voice message, expected wait %.0fs", wait)
+    return True
@@ -0,0 +1,376 @@
+"""Durable Mongo-backed job queue and the worker pool that drains it."""
+
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import logging
+import os
+import socket
+import time
+import typing
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from src.config import settings
+from src.dto import QueuedJob, UserTier
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DEAD = "dead"
+
+_EWMA_ALPHA = 0.2  # weight of the latest job in the average job time
+_USER_BUSY_RETRY_SECONDS = 1.0  # a job deferred for its user's in-flight limit
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure a retry would only repeat: dead-letter the job now."""
+
+
+JobHandler = typing.Callable[[dict[str, typing.Any]], typing.Awaitable[None]]
+
+# Share of the workers per chat when every tier has backlog: a VIP chat gets four jobs
+# claimed for each one of a free chat, so paid latency holds up without starving free users
+TIER_WEIGHTS: dict[UserTier, int] = {
+    UserTier.VIP: 4,
+    UserTier.TESTER: 4,
+    UserTier.PAID: 2,
+    UserTier.FREE: 1,
+}
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
+
+
+def _lease_until() -> datetime.datetime:
+    return _utc_now() + datetime.timedelta(seconds=settings.job_visibility_timeout_seconds)
+
+
+def _age_seconds(since: datetime.datetime) -> float:
+    if since.tzinfo is None:  # Mongo returns naive UTC
+        since = since.replace(tzinfo=datetime.UTC)
+    return (_utc_now() - since).total_seconds()
+
+
+async def _schedule_order(chat_id: str, tier: UserTier) -> float:
+    """
+    Scheduling tag for a new job (claimed in ascending order): a virtual enqueue time.
+
+    Each job counts as enqueued job_schedule_quantum_seconds / weight after the later of
+    now and its chat's previous job. Higher tiers overtake recent free-tier work, a chat
+    flooding the queue only pushes back its own messages, and because the clock is real
+    time every job is reached eventually.
+    """
+    start = _utc_now().timestamp()
+    if chat_id:
+        previous = await QueuedJob.get_motor_collection().find_one(
+            {"status": {"$in": [JOB_QUEUED, JOB_RUNNING]}, "chat_id": chat_id},
+            sort=[("order", DESCENDING)],
+            projection={"order": True},
+        )
+        if previous:
+            start = max(start, previous["order"])
+    return start + settings.job_schedule_quantum_seconds / TIER_WEIGHTS.get(tier, 1)
+
+
+async def _busy_users() -> set[str]:
+    """Users with as many live (leased) jobs running as settings.max_voice_in_flight_per_user."""
+    limit = max(1, settings.max_voice_in_flight_per_user)
+    cursor = QueuedJob.get_motor_collection().aggregate(
+        [
+            {
+                "$match": {
+                    "status": JOB_RUNNING,
+                    "user_id": {"$ne": ""},
+                    "visible_at": {"$gt": _utc_now()},
+                }
+            },
+            {"$group": {"_id": "$user_id", "running": {"$sum": 1}}},
+            {"$match": {"running": {"$gte": limit}}},
+        ]
+    )
+    return {row["_id"] async for row in cursor}
+
+
+async def _over_user_limit(job: QueuedJob) -> bool:
+    """Counted after the claim: of jobs claimed at once, the last to count sees the others."""
+    running = await QueuedJob.get_motor_collection().count_documents(
+        {
+            "status": JOB_RUNNING,
+            "user_id": job.user_id,
+            "visible_at": {"$gt": _utc_now()},
+            "_id": {"$ne": job.id},
+        }
+    )
+    return running >= max(1, settings.max_voice_in_flight_per_user)
+
+
+async def claim_job(worker_id: str) -> QueuedJob | None:
+    """
+    Atomically take the first visible job in schedule order and lease it to worker_id.
+
+    Running jobs whose lease expired (worker crashed or was killed) are visible again.
+    Jobs of a user already running settings.max_voice_in_flight_per_user are skipped, so
+    a burst from one user occupies that many workers and the rest serve other users.
+    """
+    collection = QueuedJob.get_motor_collection()
+    busy = await _busy_users()
+    while True:
+        query: dict[str, typing.Any] = {
+            "status": {"$in": [JOB_QUEUED, JOB_RUNNING]},
+            "visible_at": {"$lte": _utc_now()},
+        }
+        if busy:
+            query["user_id"] = {"$nin": sorted(busy)}
+        raw = await collection.find_one_and_update(
+            query,
+            {
+                "$set": {"status": JOB_RUNNING, "worker": worker_id, "visible_at": _lease_until()},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("order", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if raw is None:
+            return None
+        job = QueuedJob.model_validate(raw)
+        if not job.user_id or not await _over_user_limit(job):
+            return job
+        # Another worker claimed a job of this user meanwhile: back off, try someone else
+        await release_job(job, worker_id, delay_seconds=_USER_BUSY_RETRY_SECONDS)
+        busy.add(job.user_id)
+
+
+async def _update_leased(job: QueuedJob, worker_id: str, update: dict[str, typing.Any]) -> None:
+    """Apply update only while worker_id still holds the job's lease."""
+    await QueuedJob.get_motor_collection().update_one(
+        {"_id": job.id, "worker": worker_id, "status": JOB_RUNNING}, update
+    )
+
+
+async def extend_lease(job: QueuedJob, worker_id: str) -> None:
+    await _update_leased(job, worker_id, {"$set": {"visible_at": _lease_until()}})
+
+
+async def release_job(job: QueuedJob, worker_id: str, delay_seconds: float = 0.0) -> None:
+    """Return an interrupted job to the queue, visible again after delay_seconds."""
+    visible_at = _utc_now() + datetime.timedelta(seconds=delay_seconds)
+    await _update_leased(
+        job,
+        worker_id,
+        {
+            "$set": {"status": JOB_QUEUED, "worker": "", "visible_at": visible_at},
+            "$inc": {"attempts": -1},  # interrupted, not failed
+        },
+    )
+
+
+async def fail_job(job: QueuedJob, worker_id: str, error: str, retry: bool = True) -> bool:
+    """Schedule a retry with exponential backoff, or dead-letter. Returns True if dead."""
+    if not retry or job.attempts >= settings.job_max_attempts:
+        await _update_leased(
+            job, worker_id, {"$set": {"status": JOB_DEAD, "worker": "", "last_error": error}}
+        )
+        return True
+    delay = settings.job_retry_delay_seconds * 2 ** (job.attempts - 1)
+    retry_at = _utc_now() + datetime.timedelta(seconds=delay)
+    await _update_leased(
+        job,
+        worker_id,
+        {"$set": {"status": JOB_QUEUED, "worker": "", "visible_at": retry_at, "last_error": error}},
+    )
+    return False
+
+
+async def count_jobs(status: str) -> int:
+    return await QueuedJob.find(QueuedJob.status == status).count()
+
+
+@dataclasses.dataclass
+class QueueWait:
+    """Time from enqueue to first claim, per tier."""
+
+    jobs: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def avg_seconds(self) -> float:
+        return self.total_seconds / self.jobs if self.jobs else 0.0
+
+    def add(self, seconds: float) -> None:
+        self.jobs += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+@dataclasses.dataclass
+class JobPoolStats:
+    workers: int
+    busy: int
+    completed: int
+    retried: int
+    dead: int
+    avg_job_seconds: float
+    wait_by_tier: dict[UserTier, QueueWait]
+
+
+class JobWorkerPool:
+    """
+    Fixed set of asyncio workers draining the Mongo job queue.
+
+    Any number of processes may run a pool against the same collection: claims are atomic
+    and leases expire, so work left by a crashed instance is picked up by another one.
+    Handlers must tolerate being re-run, since a job is retried after any failure.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._handlers: dict[str, JobHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._busy = 0
+        self._completed = 0
+        self._retried = 0
+        self._dead = 0
+        self._waits: dict[UserTier, QueueWait] = {}
+        self._avg_job_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        if self.running or self.workers <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        instance = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(self._work(f"{instance}:{index}"), name=f"job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info("Job worker pool started with %d workers", self.workers)
+
+    async def stop(self) -> None:
+        """Cancel workers; jobs in progress go back to the queue for the next instance."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self) -> None:
+        """Wake idle workers; safe to call from other threads (the WhatsApp webhook)."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _work(self, worker_id: str) -> None:
+        while True:
+            # Cleared before claiming so an enqueue during the claim is not missed
+            self._wakeup.clear()
+            try:
+                job = await claim_job(worker_id)
+            except Exception:
+                logger.exception("Job claim failed")
+                job = None
+            if job is None:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=settings.job_poll_interval_seconds
+                    )
+                continue
+            await self._run(job, worker_id)
+
+    async def _heartbeat(self, job: QueuedJob, worker_id: str) -> None:
+        while True:
+            await asyncio.sleep(settings.job_visibility_timeout_seconds / 3)
+            await extend_lease(job, worker_id)
+
+    async def _run(self, job: QueuedJob, worker_id: str) -> None:
+        if job.attempts > settings.job_max_attempts:
+            # Lease expired too often: the job keeps killing or hanging its worker
+            await fail_job(job, worker_id, job.last_error or "lease expired")
+            self._dead += 1
+            return
+        if job.attempts == 1:
+            self._waits.setdefault(job.tier, QueueWait()).add(_age_seconds(job.created_at))
+
+        self._busy += 1
+        started = time.monotonic()
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id))
+        try:
+            handler = self._handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {job.kind!r}")
+            await handler(job.payload)
+        except asyncio.CancelledError:
+            await asyncio.shield(release_job(job, worker_id))
+            raise
+        except Exception as exc:
+            logger.exception("Job %s (%s) attempt %d failed", job.id, job.kind, job.attempts)
+            retry = not isinstance(exc, PermanentJobError)
+            if await fail_job(job, worker_id, repr(exc), retry=retry):
+                logger.error("Job %s (%s) moved to dead letters", job.id, job.kind)
+                self._dead += 1
+            else:
+                self._retried += 1
+        else:
+            await job.delete()
+            self._completed += 1
+        finally:
+            heartbeat.cancel()
+            self._busy -= 1
+            if job.user_id:
+                self._wakeup.set()  # the user's held-back jobs are claimable again
+            self._avg_job_seconds += _EWMA_ALPHA * (
+                time.monotonic() - started - self._avg_job_seconds
+            )
+
+    async def expected_wait_seconds(self) -> float:
+        """Time until a job queued now is claimed: backlog over this pool's throughput."""
+        if not self.running or not self._avg_job_seconds:
+            return 0.0
+        return await count_jobs(JOB_QUEUED) * self._avg_job_seconds / self.workers
+
+    def stats(self) -> JobPoolStats:
+        return JobPoolStats(
+            workers=self.workers if self.running else 0,
+            busy=self._busy,
+            completed=self._completed,
+            retried=self._retried,
+            dead=self._dead,
+            avg_job_seconds=self._avg_job_seconds,
+            wait_by_tier={tier: dataclasses.replace(wait) for tier, wait in self._waits.items()},
+        )
+
+
+# Module-level singleton — started in the Telegram post_init hook
+job_pool = JobWorkerPool(workers=settings.job_workers)
+
+
+async def enqueue_job(
+    kind: str,
+    payload: dict[str, typing.Any],
+    chat_id: str = "",
+    tier: UserTier = UserTier.FREE,
+    user_id: str = "",
+) -> QueuedJob:
+    """
+    Persist a job and wake the local workers; survives restarts until processed.
+
+    Jobs with a user_id count against that user's in-flight limit when claimed.
+    """
+    order = await _schedule_order(chat_id, tier)
+    job = QueuedJob(
+        kind=kind, payload=payload, chat_id=chat_id, tier=tier, order=order, user_id=user_id
+    )
+    await job.insert()
+    job_pool.notify()
+    return job
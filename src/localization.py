@@ -127,6 +127,24 @@ translates = {
             "La transcripción se procesó de todos modos. Usa /buy para comprar más tokens."
         ),
     },
+    "voice_too_long": {
+        ENGLISH: "This voice message is too long. The limit for your plan is {max_seconds} seconds.",
+        GERMAN: "Diese Sprachnachricht ist zu lang. Das Limit für Ihren Tarif beträgt {max_seconds} Sekunden.",
+        RUSSIAN: "Голосовое сообщение слишком длинное. Лимит для вашего тарифа — {max_seconds} секунд.",
+        SPANISH: "Este mensaje de voz es demasiado largo. El límite de tu plan es de {max_seconds} segundos.",
+    },
+    "voice_file_too_large": {
+        ENGLISH: "This audio file is too large to process.",
+        GERMAN: "Diese Audiodatei ist zu groß für die Verarbeitung.",
+        RUSSIAN: "Аудиофайл слишком большой для обработки.",
+        SPANISH: "Este archivo de audio es demasiado grande para procesarlo.",
+    },
+    "voice_truncated": {
+        ENGLISH: "Only the first {max_seconds} seconds were transcribed.",
+        GERMAN: "Nur die ersten {max_seconds} Sekunden wurden transkribiert.",
+        RUSSIAN: "Расшифрованы только первые {max_seconds} секунд.",
+        SPANISH: "Solo se transcribieron los primeros {max_seconds} segundos.",
+    },
     "buy_packages_prompt": {
         ENGLISH: "Choose a token package:",
         GERMAN: "Wählen Sie ein Token-Paket:",
@@ -139,6 +157,12 @@ translates = {
         RUSSIAN: "Сервис транскрипции временно недоступен. Попробуйте позже.",
         SPANISH: "El servicio de transcripción no está disponible temporalmente. Inténtalo más tarde.",
     },
+    "server_busy": {
+        ENGLISH: "The bot is busy right now. Please send the voice message again in a few minutes.",
+        GERMAN: "Der Bot ist gerade ausgelastet. Bitte senden Sie die Sprachnachricht in ein paar Minuten erneut.",
+        RUSSIAN: "Бот сейчас перегружен. Отправьте голосовое сообщение ещё раз через несколько минут.",
+        SPANISH: "El bot está ocupado ahora mismo. Vuelve a enviar el mensaje de voz en unos minutos.",
+    },
     "categorize_enabled": {
         ENGLISH: "Auto-categorization enabled.",
         GERMAN: "Automatische Kategorisierung aktiviert.",
@@ -0,0 +1,35 @@
+"""Per-event-loop instances of objects bound to the loop that first uses them."""
+
+import asyncio
+import typing
+import weakref
+
+
+class LoopLocal[T]:
+    """
+    One value per running event loop, created by factory on first use in that loop.
+
+    Telegram runs on the main loop and the WhatsApp webhook on uvicorn's loop in another
+    thread: semaphores, locks and pooled HTTP clients must not be shared between them.
+    A value is dropped together with its loop.
+    """
+
+    def __init__(self, factory: typing.Callable[[], T]) -> None:
+        self._factory = factory
+        self._values: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None:
+            value = self._values[loop] = self._factory()
+        return value
+
+    def pop(self) -> T | None:
+        """Forget the running loop's value and return it, if it was created."""
+        return self._values.pop(asyncio.get_running_loop(), None)
+
+    def clear(self) -> None:
+        self._values.clear()
@@ -1,22 +1,38 @@
+import datetime
+import logging
+import math
+import time
+import typing
+
 from beanie import init_beanie
 from motor import motor_asyncio
+from pymongo import ReturnDocument
 
 from src.config import settings
 from src.dto import (
+    RECENT_TRANSCRIPTION_TTL_SECONDS,
     AccountLink,
     AlertState,
     BotConfig,
+    CachedTranscription,
     LinkAttempt,
     LinkCode,
+    MessageProgress,
     MonthlyStats,
-    RecentTranscription,
+    QueuedJob,
+    RecentEntry,
+    RecentTranscriptions,
     UsedTrial,
     UserCredits,
     UserMonthlyUsage,
     UserRole,
     UserSettings,
+    UserTier,
     WitUsageStats,
 )
+from src.ttl_cache import MISSING, TtlCache
+
+logger = logging.getLogger(__name__)
 
 ALL_DOCUMENT_MODELS = [
     UserSettings,
@@ -30,8 +46,11 @@ ALL_DOCUMENT_MODELS = [
     LinkCode,
     LinkAttempt,
     UserMonthlyUsage,
-    RecentTranscription,
+    RecentTranscriptions,
     BotConfig,
+    CachedTranscription,
+    MessageProgress,
+    QueuedJob,
 ]
 
 
@@ -40,56 +59,261 @@ async def init_beanie_models():
     to call only once
     """
     mongo_client = motor_asyncio.AsyncIOMotorClient(settings.mongo_uri)
-    await init_beanie(database=mongo_client["user_settings"], document_models=ALL_DOCUMENT_MODELS)
+    database = mongo_client["user_settings"]
+    await migrate_to_unique_indexes(database)
+    await init_beanie(database=database, document_models=ALL_DOCUMENT_MODELS)
+
+
+MergeDuplicates = typing.Callable[[dict, list[dict]], dict[str, typing.Any]]
+
+
+async def _merge_duplicates(
+    collection: motor_asyncio.AsyncIOMotorCollection, keys: tuple[str, ...], merge: MergeDuplicates
+) -> int:
+    """
+    Fold documents sharing the keys into the oldest one; return how many were removed.
+
+    merge(oldest, newer duplicates in insertion order) returns the fields to set on the
+    document that is kept.
+    """
+    groups = collection.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": {key: f"${key}" for key in keys},
+                    "ids": {"$push": "$_id"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+        ]
+    )
+    removed = 0
+    async for group in groups:
+        docs = await collection.find({"_id": {"$in": group["ids"]}}).sort("_id", 1).to_list(None)
+        keep, duplicates = docs[0], docs[1:]
+        merged = merge(keep, duplicates)
+        if merged:
+            await collection.update_one({"_id": keep["_id"]}, {"$set": merged})
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in duplicates]}})
+        removed += result.deleted_count
+    if removed:
+        logger.warning("Merged %d duplicate %s documents", removed, collection.name)
+    return removed
+
+
+async def _migrate_to_unique(
+    collection: motor_asyncio.AsyncIOMotorCollection, keys: tuple[str, ...], merge: MergeDuplicates
+) -> None:
+    """
+    Prepare a collection for a unique index on keys (created by init_beanie).
+
+    Merges duplicates left by non-atomic writers and drops the non-unique index of the
+    same name, which would otherwise conflict. A no-op once the index is unique.
+    """
+    name = "_".join(f"{key}_1" for key in keys)
+    index = (await collection.index_information()).get(name)
+    if index and index.get("unique"):
+        return
+    await _merge_duplicates(collection, keys, merge)
+    if index:
+        await collection.drop_index(name)
+
+
+def _fill_unset(keep: dict, duplicates: list[dict]) -> dict[str, typing.Any]:
+    # Reads have always returned the oldest document, so it is kept as is; fields it never
+    # set (None) are taken from its newest duplicate that did
+    return {
+        field: value
+        for duplicate in duplicates
+        for field, value in duplicate.items()
+        if value is not None and keep.get(field) is None
+    }
+
+
+def _keep_oldest(keep: dict, duplicates: list[dict]) -> dict[str, typing.Any]:
+    return {}
+
+
+def _newest_value(field: str) -> MergeDuplicates:
+    # Links: the latest confirmation wins
+    return lambda keep, duplicates: {field: duplicates[-1][field]}
+
+
+def _merge_attempts(keep: dict, duplicates: list[dict]) -> dict[str, typing.Any]:
+    # Racing first attempts each counted their own failures; a lock on any of them holds
+    docs = [keep, *duplicates]
+    merged: dict[str, typing.Any] = {
+        "attempt_count": sum(doc.get("attempt_count", 0) for doc in docs)
+    }
+    locks = [doc["locked_until"] for doc in docs if doc.get("locked_until")]
+    if locks:
+        merged["locked_until"] = max(locks)
+    return merged
+
+
+_USAGE_COUNTERS = (
+    "transcriptions",
+    "audio_seconds",
+    "tokens_used",
+    "free_tokens_used",
+    "purchased_tokens_used",
+)
+
+
+def _sum_usage(keep: dict, duplicates: list[dict]) -> dict[str, typing.Any]:
+    docs = [keep, *duplicates]
+    return {field: sum(doc.get(field, 0) for doc in docs) for field in _USAGE_COUNTERS}
+
+
+_CREDIT_COUNTERS = (
+    "purchased_credits",
+    "total_transcriptions",
+    "total_audio_seconds",
+    "total_tokens_used",
+    "total_credits_spent",
+    "total_credits_purchased",
+)
+
+
+def _merge_credits(keep: dict, duplicates: list[dict]) -> dict[str, typing.Any]:
+    # Each duplicate was credited and charged on its own: purchases and totals add up.
+    # Free credits are a monthly allowance, not a sum: the newest current-month balance wins
+    docs = [keep, *duplicates]
+    merged: dict[str, typing.Any] = {
+        field: sum(doc.get(field, 0) for doc in docs) for field in _CREDIT_COUNTERS
+    }
+    month = datetime.datetime.now(datetime.UTC).strftime("%Y-%m")
+    current = [doc for doc in docs if doc.get("free_credits_month") == month]
+    if current:
+        merged["free_credits"] = current[-1]["free_credits"]
+        merged["free_credits_month"] = month
+    if any(doc.get("tier") == UserTier.PAID.value for doc in docs):
+        merged["tier"] = UserTier.PAID.value
+    return merged
+
+
+async def migrate_user_settings_to_unique(database: motor_asyncio.AsyncIOMotorDatabase) -> None:
+    """Fold settings duplicated by the old find-then-insert setters into one per chat."""
+    await _migrate_to_unique(database[UserSettings.Settings.name], ("chat_id",), _fill_unset)
+
+
+async def migrate_to_unique_indexes(database: motor_asyncio.AsyncIOMotorDatabase) -> None:
+    """Dedupe every collection whose unique index init_beanie is about to create."""
+    await migrate_user_settings_to_unique(database)
+    await _migrate_to_unique(database[UserCredits.Settings.name], ("user_id",), _merge_credits)
+    await _migrate_to_unique(database[UserRole.Settings.name], ("user_id", "role"), _keep_oldest)
+    links = database[AccountLink.Settings.name]
+    await _migrate_to_unique(links, ("telegram_user_id",), _newest_value("whatsapp_phone"))
+    await _migrate_to_unique(links, ("whatsapp_phone",), _newest_value("telegram_user_id"))
+    await _migrate_to_unique(
+        database[UserMonthlyUsage.Settings.name], ("user_id", "month_key"), _sum_usage
+    )
+    # confirm_link has always matched the oldest of a reused code
+    await _migrate_to_unique(database[LinkCode.Settings.name], ("code",), _keep_oldest)
+    await _migrate_to_unique(
+        database[LinkAttempt.Settings.name], ("whatsapp_phone",), _merge_attempts
+    )
+
+
+# Settings change only when a user taps a button but are read on every message.
+# Setters invalidate their entry, and a read racing a setter does not store its stale
+# result (see TtlCache.put); the TTL bounds staleness from other instances.
+user_settings_cache: TtlCache[str, UserSettings | None] = TtlCache(
+    "user settings", settings.settings_cache_size, settings.settings_cache_ttl_seconds
+)
+bot_config_cache: TtlCache[str, str | None] = TtlCache(
+    "bot config", settings.settings_cache_size, settings.settings_cache_ttl_seconds
+)
 
 
-async def get_or_create_user(chat_id: str) -> UserSettings:
-    """Get existing user or create new one with defaults."""
+async def find_user_settings(chat_id: str) -> UserSettings | None:
+    """Cached read-only settings document; modify it through the set_* functions."""
+    cached = user_settings_cache.get(chat_id)
+    if cached is not MISSING:
+        return cached
+    generation = user_settings_cache.generation(chat_id)
     user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
-    if not user:
-        user = UserSettings(chat_id=chat_id)
-        await user.insert()
+    user_settings_cache.put(chat_id, user, generation)
     return user
 
 
+async def find_user_settings_many(chat_ids: list[str]) -> dict[str, UserSettings | None]:
+    """find_user_settings for several chats, with one query for all cache misses."""
+    found: dict[str, UserSettings | None] = {}
+    missing: list[str] = []
+    for chat_id in dict.fromkeys(chat_ids):
+        cached = user_settings_cache.get(chat_id)
+        if cached is MISSING:
+            missing.append(chat_id)
+        else:
+            found[chat_id] = cached
+    if missing:
+        generations = {chat_id: user_settings_cache.generation(chat_id) for chat_id in missing}
+        docs = await UserSettings.find({"chat_id": {"$in": missing}}).to_list()
+        by_chat = {doc.chat_id: doc for doc in docs}
+        for chat_id in missing:
+            found[chat_id] = by_chat.get(chat_id)
+            user_settings_cache.put(chat_id, found[chat_id], generations[chat_id])
+    return found
+
+
+# Fields a settings document is created with; $set on the first write overrides them
+_USER_SETTINGS_DEFAULTS = {
+    name: field.default
+    for name, field in UserSettings.model_fields.items()
+    if name not in ("id", "revision_id", "chat_id")
+}
+
+
+async def _update_user(chat_id: str, **fields: typing.Any) -> None:
+    """Set fields of a chat's settings in one upsert, creating the document if needed."""
+    defaults = {
+        name: value for name, value in _USER_SETTINGS_DEFAULTS.items() if name not in fields
+    }
+    await UserSettings.get_motor_collection().update_one(
+        {"chat_id": chat_id},
+        {"$set": fields, "$setOnInsert": defaults},
+        upsert=True,
+    )
+    user_settings_cache.invalidate(chat_id)
+
+
 async def set_chat_language(chat_id: str, language: str):
-    user = await get_or_create_user(chat_id)
-    user.language = language
-    await user.save()
+    await _update_user(chat_id, language=language)
 
 
 async def get_chat_language(chat_id: str) -> str:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return settings.default_language
     return user.language or settings.default_language
 
 
 async def set_gpt_command(chat_id: str, command: str):
-    user = await get_or_create_user(chat_id)
-    user.command = command
-    await user.save()
+    await _update_user(chat_id, command=command)
 
 
 async def get_gpt_command(chat_id: str) -> str:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return settings.telegram_bot_command
     return user.command or settings.telegram_bot_command
 
 
 async def set_github_settings(chat_id: str, owner: str, repo: str, token: str):
-    user = await get_or_create_user(chat_id)
-    user.github_settings = {
-        "owner": owner,
-        "repo": repo,
-        "token": token,
-    }
-    await user.save()
+    await _update_user(
+        chat_id,
+        github_settings={
+            "owner": owner,
+            "repo": repo,
+            "token": token,
+        },
+    )
 
 
 async def get_github_settings(chat_id: str) -> dict:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user or not user.github_settings:
         return {}
     if all(user.github_settings.values()):
@@ -98,76 +322,139 @@ async def get_github_settings(chat_id: str) -> dict:
 
 
 async def clear_github_settings(chat_id: str):
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
-    if user:
-        user.github_settings = None
-        user.save_to_obsidian = False
-        await user.save()
+    await UserSettings.get_motor_collection().update_one(
+        {"chat_id": chat_id}, {"$set": {"github_settings": None, "save_to_obsidian": False}}
+    )
+    user_settings_cache.invalidate(chat_id)
 
 
 async def set_save_to_obsidian(chat_id: str, enabled: bool):
-    user = await get_or_create_user(chat_id)
-    user.save_to_obsidian = enabled
-    await user.save()
+    await _update_user(chat_id, save_to_obsidian=enabled)
 
 
 async def get_save_to_obsidian(chat_id: str) -> bool:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return False
     return user.save_to_obsidian
 
 
 async def set_auto_categorize(chat_id: str, enabled: bool):
-    user = await get_or_create_user(chat_id)
-    user.auto_categorize = enabled
-    await user.save()
+    await _update_user(chat_id, auto_categorize=enabled)
 
 
 async def get_auto_categorize(chat_id: str) -> bool:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return False
     return user.auto_categorize
 
 
 async def set_auto_cleanup(chat_id: str, enabled: bool):
-    user = await get_or_create_user(chat_id)
-    user.auto_cleanup = enabled
-    await user.save()
+    await _update_user(chat_id, auto_cleanup=enabled)
 
 
 async def get_auto_cleanup(chat_id: str) -> bool:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return False
     return user.auto_cleanup
 
 
 async def set_preferred_provider(chat_id: str, provider: str | None):
-    user = await get_or_create_user(chat_id)
-    user.preferred_provider = provider
-    await user.save()
+    await _update_user(chat_id, preferred_provider=provider)
 
 
 async def get_preferred_provider(chat_id: str) -> str | None:
-    user = await UserSettings.find_one(UserSettings.chat_id == chat_id)
+    user = await find_user_settings(chat_id)
     if not user:
         return None
     return user.preferred_provider
 
 
+class RoleIndex:
+    """
+    Every role assignment as per-role sets of user ids, so role checks skip Mongo.
+
+    Loaded at startup (or on first use) and reloaded at most every refresh_seconds to pick up
+    other instances' changes; this instance's own add/remove update it in place. While a
+    refresh runs, other callers keep using the previous snapshot instead of piling up.
+    """
+
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._members: dict[str, set[str]] = {}
+        self._loaded_at: float | None = None
+        self._generation = 0  # bumped by local changes a running reload may not have seen
+        self._reloading = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _fresh(self) -> bool:
+        return self.loaded and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def reload(self) -> None:
+        generation = self._generation
+        self._reloading = True
+        try:
+            members: dict[str, set[str]] = {}
+            cursor = UserRole.get_motor_collection().find(
+                {}, projection={"user_id": True, "role": True, "_id": False}
+            )
+            async for doc in cursor:
+                members.setdefault(doc["role"], set()).add(doc["user_id"])
+        finally:
+            self._reloading = False
+        self._members = members
+        # A role changed here mid-load may be missing from the snapshot: stay stale
+        self._loaded_at = time.monotonic() if generation == self._generation else -math.inf
+
+    async def _ensure_loaded(self) -> None:
+        if self._fresh() or (self.loaded and self._reloading):
+            return
+        await self.reload()
+
+    async def roles_of(self, user_id: str) -> set[str]:
+        await self._ensure_loaded()
+        return {role for role, users in self._members.items() if user_id in users}
+
+    async def has(self, user_id: str, role: str) -> bool:
+        await self._ensure_loaded()
+        return user_id in self._members.get(role, ())
+
+    def add(self, user_id: str, role: str) -> None:
+        self._generation += 1
+        self._members.setdefault(role, set()).add(user_id)
+
+    def discard(self, user_id: str, role: str) -> None:
+        self._generation += 1
+        self._members.get(role, set()).discard(user_id)
+
+    def clear(self) -> None:
+        self._members = {}
+        self._loaded_at = None
+
+
+# Module-level singleton — preloaded in the Telegram post_init hook
+role_index = RoleIndex(settings.role_index_refresh_seconds)
+
+
 async def add_user_role(user_id: str, role: str, added_by: str):
     """Add a role to a user (upsert)."""
-    existing = await UserRole.find_one(UserRole.user_id == user_id, UserRole.role == role)
-    if existing:
-        return
-    await UserRole(user_id=user_id, role=role, added_by=added_by).insert()
+    await UserRole.get_motor_collection().update_one(
+        {"user_id": user_id, "role": role},
+        {"$setOnInsert": {"added_by": added_by, "added_at": datetime.datetime.now(datetime.UTC)}},
+        upsert=True,
+    )
+    role_index.add(user_id, role)
 
 
 async def remove_user_role(user_id: str, role: str) -> bool:
     """Remove a role from a user. Returns True if removed."""
     existing = await UserRole.find_one(UserRole.user_id == user_id, UserRole.role == role)
+    role_index.discard(user_id, role)
     if not existing:
         return False
     await existing.delete()
@@ -180,50 +467,80 @@ async def get_users_by_role(role: str) -> list[str]:
     return [doc.user_id for doc in docs]
 
 
+async def get_user_roles(user_id: str) -> set[str]:
+    """All roles of a user, from the in-memory role index."""
+    return await role_index.roles_of(user_id)
+
+
 async def has_role(user_id: str, role: str) -> bool:
     """Check if a user has a specific role."""
-    existing = await UserRole.find_one(UserRole.user_id == user_id, UserRole.role == role)
-    return existing is not None
+    return await role_index.has(user_id, role)
 
 
 _RECENT_TRANSCRIPTION_KEEP = 5
 
+# In-process copy of each chat's ring: the voice pipeline reads context without a query.
+# Held on the settings-cache scale, so other instances' entries show up within it.
+recent_transcriptions_cache: TtlCache[str, list[RecentEntry]] = TtlCache(
+    "recent transcriptions",
+    settings.recent_transcriptions_cache_size,
+    settings.settings_cache_ttl_seconds,
+)
+
+
+def _is_recent(entry: RecentEntry) -> bool:
+    created_at = entry.created_at
+    if created_at.tzinfo is None:  # Mongo returns naive UTC
+        created_at = created_at.replace(tzinfo=datetime.UTC)
+    age = datetime.datetime.now(datetime.UTC) - created_at
+    return age.total_seconds() < RECENT_TRANSCRIPTION_TTL_SECONDS
+
 
 async def save_recent_transcription(chat_id: str, text: str) -> None:
     """Save cleaned transcription for cleanup context; keep only the last 5 per chat."""
-    await RecentTranscription(chat_id=chat_id, text=text).insert()
-    # Trim to keep only the most recent entries
-    all_docs = (
-        await RecentTranscription.find(RecentTranscription.chat_id == chat_id)
-        .sort("-created_at")
-        .to_list()
+    entry = RecentEntry(text=text)
+    raw = await RecentTranscriptions.get_motor_collection().find_one_and_update(
+        {"chat_id": chat_id},
+        {
+            "$push": {
+                "entries": {"$each": [entry.model_dump()], "$slice": -_RECENT_TRANSCRIPTION_KEEP}
+            },
+            "$set": {"updated_at": entry.created_at},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
-    for doc in all_docs[_RECENT_TRANSCRIPTION_KEEP:]:
-        await doc.delete()
+    # The write returns the whole ring, including other instances' entries; a read that
+    # started before it must not store its older copy afterwards
+    recent_transcriptions_cache.invalidate(chat_id)
+    recent_transcriptions_cache.put(chat_id, RecentTranscriptions.model_validate(raw).entries)
 
 
 async def get_recent_transcriptions(chat_id: str, limit: int = 3) -> list[str]:
     """Get recent cleaned transcriptions for a chat, oldest-first (for LLM context)."""
-    docs = (
-        await RecentTranscription.find(RecentTranscription.chat_id == chat_id)
-        .sort("-created_at")
-        .limit(limit)
-        .to_list()
-    )
-    return [doc.text for doc in reversed(docs)]
+    entries = recent_transcriptions_cache.get(chat_id)
+    if entries is MISSING:
+        generation = recent_transcriptions_cache.generation(chat_id)
+        doc = await RecentTranscriptions.find_one(RecentTranscriptions.chat_id == chat_id)
+        entries = doc.entries if doc else []
+        recent_transcriptions_cache.put(chat_id, entries, generation)
+    return [entry.text for entry in entries if _is_recent(entry)][-limit:]
 
 
 async def get_bot_config(key: str, default: str = "") -> str:
     """Get a runtime bot config value; falls back to default if not set."""
-    doc = await BotConfig.find_one(BotConfig.key == key)
-    return doc.value if doc else default
+    value = bot_config_cache.get(key)
+    if value is MISSING:
+        generation = bot_config_cache.generation(key)
+        doc = await BotConfig.find_one(BotConfig.key == key)
+        value = doc.value if doc else None
+        bot_config_cache.put(key, value, generation)
+    return default if value is None else value
 
 
 async def set_bot_config(key: str, value: str) -> None:
     """Set a runtime bot config value (upsert)."""
-    doc = await BotConfig.find_one(BotConfig.key == key)
-    if doc:
-        doc.value = value
-        await doc.save()
-    else:
-        await BotConfig(key=key, value=value).insert()
+    await BotConfig.get_motor_collection().update_one(
+        {"key": key}, {"$set": {"value": value}}, upsert=True
+    )
+    bot_config_cache.invalidate(key)
@@ -0,0 +1,51 @@
+"""Steps of a message's pipeline already done, so a retried job does not repeat them."""
+
+import datetime
+import typing
+
+from pymongo.errors import DuplicateKeyError
+
+from src.dto import MessageProgress
+
+STEP_BILLED = "billed"  # credits settled, usage and stats recorded
+STEP_CLEANED = "cleaned"  # transcript cleaned up and added to the recent transcriptions
+STEP_OBSIDIAN = "obsidian"  # note committed to the Obsidian repository
+
+
+def progress_key(chat_id: str, message_id: int) -> str:
+    return f"{chat_id}:{message_id}"
+
+
+async def claim_step(key: str, step: str) -> bool:
+    """
+    Mark step as taken before doing it; False if an earlier run already took it.
+
+    For steps that must never run twice, even if they fail halfway (billing).
+    """
+    try:
+        await MessageProgress.get_motor_collection().update_one(
+            {"key": key, "steps": {"$ne": step}},
+            {
+                "$push": {"steps": step},
+                "$setOnInsert": {"created_at": datetime.datetime.now(datetime.UTC)},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:  # the document exists and already lists the step
+        return False
+    return True
+
+
+async def complete_step(key: str, step: str, **results: typing.Any) -> None:
+    """Record a step done, with the results a retry needs instead of redoing it."""
+    update: dict[str, typing.Any] = {
+        "$addToSet": {"steps": step},
+        "$setOnInsert": {"created_at": datetime.datetime.now(datetime.UTC)},
+    }
+    if results:
+        update["$set"] = results
+    await MessageProgress.get_motor_collection().update_one({"key": key}, update, upsert=True)
+
+
+async def load_progress(key: str) -> MessageProgress:
+    return await MessageProgress.find_one(MessageProgress.key == key) or MessageProgress(key=key)
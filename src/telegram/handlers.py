@@ -9,6 +9,7 @@ from src.account_linking import generate_link_code, get_linked_whatsapp, unlink
 from src.ai_client import _PROVIDER_LIMITS, CATEGORIZATION_FALLBACK_CHAIN, GPT_FALLBACK_CHAIN
 from src.categorization import categorize_all_income
 from src.config import settings
+from src.counters import usage_counters
 from src.credits import (
     current_month_key,
     get_monthly_stats,
@@ -19,8 +20,11 @@ from src.credits import (
 from src.dto import UserCredits, UserTier
 from src.github_api import create_obsidian_git_config, get_or_create_obsidian_repo
 from src.github_oauth import get_github_device_code, poll_github_for_token
+from src.governor import expected_wait_seconds, governor
+from src.jobs import JOB_DEAD, JOB_QUEUED, count_jobs, job_pool
 from src.localization import translates
 from src.mongo import (
+    bot_config_cache,
     clear_github_settings,
     get_auto_categorize,
     get_auto_cleanup,
@@ -30,6 +34,7 @@ from src.mongo import (
     get_gpt_command,
     get_preferred_provider,
     get_save_to_obsidian,
+    recent_transcriptions_cache,
     set_auto_categorize,
     set_auto_cleanup,
     set_chat_language,
@@ -37,9 +42,12 @@ from src.mongo import (
     set_gpt_command,
     set_preferred_provider,
     set_save_to_obsidian,
+    user_settings_cache,
 )
 from src.telegram.chat_params import get_chat_id, is_private_chat, is_user_admin, reply_text
 from src.telegram.payments import balance_command, buy_command
+from src.transcription.cache import transcription_cache
+from src.transcription.executor import audio_executor
 from src.wit_tracking import get_all_wit_usage_this_month
 
 logger = logging.getLogger(__name__)
@@ -363,6 +371,50 @@ def _provider_rpm(name: str) -> str:
     return f" {rpm}rpm" if rpm else ""
 
 
+async def _runtime_lines() -> str:
+    """Runtime metrics: pools and cache are this instance only, queue depth is global."""
+    pool = audio_executor.stats()
+    cache = transcription_cache.stats()
+    jobs = job_pool.stats()
+    counters = usage_counters.stats()
+    queued = await count_jobs(JOB_QUEUED)
+    dead = await count_jobs(JOB_DEAD)
+    expected_wait = await expected_wait_seconds()
+    return (
+        f"• Audio pool ({pool.kind}, {pool.workers} workers): "
+        f"queue {pool.queue_depth}, waiting {pool.waiting}, running {pool.running}\n"
+        f"  - tasks: {pool.completed:,}, avg {pool.avg_task_seconds:.2f}s, "
+        f"max {pool.max_task_seconds:.2f}s\n"
+        f"• Transcription cache: {cache.hit_rate:.0%} hits ({cache.size:,} in memory)\n"
+        f"  - memory {cache.memory_hits:,}, mongo {cache.mongo_hits:,}, "
+        f"shared {cache.shared:,}, misses {cache.misses:,}, in flight {cache.in_flight}\n"
+        + "".join(
+            f"• Cache {c.name}: {c.hit_rate:.0%} hits ({c.size:,} entries, {c.misses:,} misses)\n"
+            for c in (
+                user_settings_cache.stats(),
+                bot_config_cache.stats(),
+                recent_transcriptions_cache.stats(),
+            )
+        )
+        + f"• Counters: {counters.pending:,} pending, {counters.flushes:,} flushes, "
+        f"{counters.writes:,} writes, {counters.failures:,} retried\n"
+        f"• Job queue: {queued:,} queued, {dead:,} dead letters\n"
+        f"  - workers {jobs.busy}/{jobs.workers} busy, completed {jobs.completed:,}, "
+        f"retried {jobs.retried:,}, dead {jobs.dead:,}"
+        + "".join(
+            f"\n  - wait {tier.value}: avg {wait.avg_seconds:.1f}s, "
+            f"max {wait.max_seconds:.1f}s ({wait.jobs:,} jobs)"
+            for tier, wait in sorted(jobs.wait_by_tier.items())
+        )
+        + f"\n• Load: expected wait ~{expected_wait:.0f}s, free-tier shed {governor.shed:,}"
+        + "".join(
+            f"\n  - {stage.name}: {stage.running}/{stage.limit or '∞'} running, "
+            f"{stage.waiting} waiting, avg {stage.avg_seconds:.1f}s"
+            for stage in governor.stats()
+        )
+    )
+
+
 async def build_stats_text() -> str:
     """Build admin stats message text."""
     month = current_month_key()
@@ -442,7 +494,9 @@ async def build_stats_text() -> str:
         )
         + ("• Wit.ai: ✅ OK (no data)\n" if not wit_usage_by_lang else "")
         + f"• Groq: {'✅' if settings.groq_api_key else '❌'} "
-        f"{'Configured' if settings.groq_api_key else 'Not configured'}"
+        f"{'Configured' if settings.groq_api_key else 'Not configured'}\n\n"
+        f"<b>Runtime</b>\n"
+        f"{await _runtime_lines()}"
     )
 
 
@@ -1,5 +1,6 @@
 """Telegram application setup: handler registration and bot initialization."""
 
+import functools
 import logging
 
 from telegram import BotCommand, BotCommandScopeAllPrivateChats, BotCommandScopeChat
@@ -14,8 +15,12 @@ from telegram.ext import (
     filters,
 )
 
+from src.ai_client import close_client
 from src.config import settings
+from src.counters import usage_counters
 from src.gpt_commands import evlampiy_command
+from src.jobs import job_pool
+from src.mongo import role_index
 from src.selftest import run_selftest
 from src.telegram import admin, handlers
 from src.telegram.payments import (
@@ -25,7 +30,11 @@ from src.telegram.payments import (
     handle_pre_checkout,
     handle_successful_payment,
 )
-from src.telegram.voice import from_voice_to_text
+from src.telegram.voice import JOB_TELEGRAM_VOICE, from_voice_to_text, run_voice_job
+from src.transcription.executor import audio_executor
+from src.transcription.wit_client import close_clients
+from src.whatsapp.handlers import JOB_WHATSAPP_VOICE
+from src.whatsapp.handlers import run_voice_job as run_whatsapp_voice_job
 
 logger = logging.getLogger(__name__)
 
@@ -115,13 +124,41 @@ async def post_init(application: Application):
             scope=BotCommandScopeChat(chat_id=int(admin_id)),
         )
 
+    await role_index.reload()
     await run_selftest(bot)
 
+    job_pool.register(JOB_TELEGRAM_VOICE, functools.partial(run_voice_job, application))
+    job_pool.register(JOB_WHATSAPP_VOICE, run_whatsapp_voice_job)
+    await job_pool.start()
+    await usage_counters.start()
+
+
+async def post_stop(application: Application):
+    # While the bot can still send: jobs in progress go back to the queue instead of
+    # failing their replies against a closed HTTP client
+    await job_pool.stop()
+    await usage_counters.stop()  # after the workers: their last messages are counted too
+
+
+async def post_shutdown(application: Application):
+    await close_clients()
+    await close_client()
+    audio_executor.shutdown()
+
 
 def build_application() -> Application:
     """Build and configure the Telegram Application with all handlers."""
+    builder = ApplicationBuilder().token(settings.telegram_bot_token)
+    if settings.telegram_local_mode:
+        # Self-hosted Bot API server: get_file returns a path on its disk, no download needed
+        base_url = settings.telegram_api_base_url.rstrip("/")
+        builder = (
+            builder.base_url(f"{base_url}/bot")
+            .base_file_url(f"{base_url}/file/bot")
+            .local_mode(True)
+        )
     application = (
-        ApplicationBuilder().token(settings.telegram_bot_token).post_init(post_init).build()
+        builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
     )
 
     for command_name, command_handler in COMMAND_HANDLERS.items():
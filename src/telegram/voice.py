@@ -1,9 +1,11 @@
 """Telegram voice message handler."""
 
 import logging
+import pathlib
 
 from telegram import Update
-from telegram.ext import ContextTypes
+from telegram.error import BadRequest
+from telegram.ext import Application, ContextTypes
 
 from src import const
 from src.alerts import check_and_send_alerts
@@ -11,37 +13,41 @@ from src.categorization import categorize_note
 from src.config import settings
 from src.credits import (
     calculate_token_cost,
-    can_perform_operation,
-    deduct_credits,
-    get_user_tier,
-    has_unlimited_voice_access,
     increment_transcription_stats,
     increment_user_stats,
-    is_blocked_user,
     record_groq_usage,
     record_user_usage,
+    settle_credits,
+    voice_admission,
+    voice_gate,
 )
 from src.dto import UserTier
+from src.governor import should_shed
+from src.jobs import PermanentJobError, enqueue_job, job_pool
 from src.localization import translates
-from src.mongo import (
-    get_auto_categorize,
-    get_auto_cleanup,
-    get_chat_language,
-    get_github_settings,
-    get_gpt_command,
-    get_preferred_provider,
-    get_recent_transcriptions,
-    save_recent_transcription,
-)
+from src.mongo import get_recent_transcriptions, save_recent_transcription
 from src.obsidian import save_transcription_to_obsidian
+from src.progress import (
+    STEP_BILLED,
+    STEP_CLEANED,
+    STEP_OBSIDIAN,
+    claim_step,
+    complete_step,
+    load_progress,
+    progress_key,
+)
 from src.telegram.bot import send_response
 from src.telegram.chat_params import get_chat_id
 from src.transcript_cleanup import cleanup_transcript
-from src.transcription.service import transcribe_audio
+from src.transcription.cache import transcription_cache, transcription_key
+from src.transcription.service import TranscriptionResult, transcribe_audio
+from src.user_context import UserContext, load_user_context
 from src.wit_tracking import increment_wit_usage, is_wit_available
 
 logger = logging.getLogger(__name__)
 
+JOB_TELEGRAM_VOICE = "telegram_voice"
+
 
 def _select_provider(
     tier: UserTier,
@@ -77,34 +83,35 @@ def _select_provider(
 
 
 async def _handle_obsidian_save(
-    chat_id: str,
+    user: UserContext,
     text: str,
-    language: str,
-    user_id: str | None = None,
     original_text: str | None = None,
+    message_key: str | None = None,
 ):
     """Save transcription to Obsidian and auto-categorize if enabled."""
-    settings_chat_id = f"u_{user_id}" if chat_id.startswith("g_") and user_id else None
+    if not (user.save_to_obsidian and user.github_settings):
+        return
     saved, filename = await save_transcription_to_obsidian(
-        chat_id,
+        user.chat_id,
         text,
         const.SOURCE_TELEGRAM,
-        language,
-        settings_chat_id=settings_chat_id,
+        user.language,
+        settings_chat_id=user.settings_chat_id,
         original_text=original_text,
     )
-    lookup_id = settings_chat_id or chat_id
-    if not (saved and filename and await get_auto_categorize(lookup_id)):
+    if saved and message_key:
+        # Notes are named by time: a retry would commit a second one
+        await complete_step(message_key, STEP_OBSIDIAN)
+    if not (saved and filename and user.auto_categorize):
         return
-    github_settings = await get_github_settings(lookup_id)
-    if github_settings:
-        await categorize_note(
-            token=github_settings["token"],
-            owner=github_settings["owner"],
-            repo=github_settings["repo"],
-            filename=filename,
-            content=text,
-        )
+    github_settings = user.github_settings
+    await categorize_note(
+        token=github_settings["token"],
+        owner=github_settings["owner"],
+        repo=github_settings["repo"],
+        filename=filename,
+        content=text,
+    )
 
 
 def _build_voice_response(text: str, gpt_command: str, message_id: int) -> dict:
@@ -118,7 +125,7 @@ def _build_voice_response(text: str, gpt_command: str, message_id: int) -> dict:
 
 
 async def from_voice_to_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle incoming voice/audio message from Telegram."""
+    """Handle incoming voice/audio message from Telegram: queue it, or process inline."""
     voice = update.message.voice or update.message.audio
     if not voice:
         return
@@ -137,12 +144,56 @@ async def from_voice_to_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.debug("No effective_user, skipping (likely channel forward)")
         return
 
-    user_id = str(update.effective_user.id)
-    chat_id = get_chat_id(update)
-    language = await get_chat_language(chat_id)
+    user = await load_user_context(str(update.effective_user.id), get_chat_id(update))
+    if await should_shed(user.tier):
+        # Saturated: tell free users now rather than answering after minutes in the queue
+        await send_response(
+            update,
+            context,
+            response=translates["server_busy"].get(user.language, translates["server_busy"]["en"]),
+        )
+        return
+
+    if job_pool.running:
+        # Durable path: the message survives restarts and is processed by the worker pool,
+        # scheduled by tier and shared fairly between chats
+        await enqueue_job(
+            JOB_TELEGRAM_VOICE,
+            {"update": update.to_dict()},
+            chat_id=user.chat_id,
+            tier=user.tier,
+            user_id=user.user_id,
+        )
+        return
+    async with voice_gate.slot(user.user_id):
+        await process_voice_message(update, context, user)
+
+
+async def run_voice_job(application: Application, payload: dict) -> None:
+    """Job handler: rebuild the Update from the queue and run the voice pipeline."""
+    update = Update.de_json(payload["update"], application.bot)
+    context = application.context_types.context.from_update(update, application)
+    try:
+        await process_voice_message(update, context)
+    except BadRequest as exc:
+        # Telegram rejected the request itself (reply target deleted, bad markup): a retry
+        # would fail the same way after repeating the steps before it
+        raise PermanentJobError(str(exc)) from exc
+
+
+async def process_voice_message(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, user: UserContext | None = None
+):
+    """Voice pipeline: admission, transcription, billing, cleanup, Obsidian, reply."""
+    voice = update.message.voice or update.message.audio
+    if user is None:
+        # Queued job: settings may have changed since the message arrived
+        user = await load_user_context(str(update.effective_user.id), get_chat_id(update))
+    user_id = user.user_id
+    language = user.language
 
     # 1. Blocked check — FIRST
-    if await is_blocked_user(user_id):
+    if user.is_blocked:
         await send_response(
             update,
             context,
@@ -153,10 +204,9 @@ async def from_voice_to_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     # 2. Tier + provider selection
-    tier = await get_user_tier(user_id)
+    tier = user.tier
     wit_available = await is_wit_available(language)
-    preferred = await get_preferred_provider(chat_id)
-    provider = _select_provider(tier, wit_available, preferred)
+    provider = _select_provider(tier, wit_available, user.preferred_provider)
 
     if provider is None:
         await send_response(
@@ -168,80 +218,128 @@ async def from_voice_to_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return
 
-    # 3. Pre-check: has at least 1 token?
-    if not await has_unlimited_voice_access(user_id):
-        ok, _msg = await can_perform_operation(user_id, 1)
-        if not ok:
+    # 3-6 reserve the estimated cost in the ledger: a burst is admitted in order, each message
+    # seeing what the previous reservation left
+    async with voice_admission(user_id, tier, voice.duration, voice.file_size) as admission:
+        # 3. Admission from Telegram metadata: length, size and balance — before any download
+        if not admission.allowed:
             await send_response(
                 update,
                 context,
-                response=translates["insufficient_credits"].get(
-                    language, translates["insufficient_credits"]["en"]
-                ),
+                response=translates[admission.reason]
+                .get(language, translates[admission.reason]["en"])
+                .format(max_seconds=admission.max_seconds),
             )
             return
 
-    # 4. Transcription
-    voice_file = await voice.get_file()
-    file_data = await voice_file.download_as_bytearray()
-
-    text, duration, wit_requests = await transcribe_audio(
-        bytes(file_data), audio_format="ogg", language=language, provider=provider
-    )
-
-    logger.debug("Voice message translation: %s", text)
-    if not text:
-        logger.debug("Empty voice message.")
-        return
+        # 4. Transcription — forwarded copies share file_unique_id: a cache hit or an identical
+        # in-flight job skips the download and the provider call
+        async def _download_and_transcribe() -> TranscriptionResult:
+            voice_file = await voice.get_file()
+            if settings.telegram_local_mode:
+                # Local Bot API server: the file is already on disk, read it in place
+                source = pathlib.Path(voice_file.file_path)
+            else:
+                source = bytes(await voice_file.download_as_bytearray())
+            return await transcribe_audio(
+                source,
+                audio_format="ogg",
+                language=language,
+                provider=provider,
+                max_seconds=admission.max_seconds,
+            )
 
-    # 5. Calculate cost and deduct
-    token_cost = calculate_token_cost(duration)
-    if not await has_unlimited_voice_access(user_id):
-        result = await deduct_credits(user_id, token_cost)
-        await record_user_usage(
-            user_id, duration, token_cost, result.free_used, result.purchased_used
+        audio_id = voice.file_unique_id
+        if admission.max_seconds is not None:
+            # A truncated result is not the full one
+            audio_id = f"{audio_id}@{admission.max_seconds}s"
+        result = await transcription_cache.get_or_transcribe(
+            transcription_key(audio_id, language, provider), _download_and_transcribe
+        )
+        text = result.text
+        # Bill on speech time: leading/trailing silence and long pauses are free
+        duration = result.speech_duration
+        logger.debug(
+            "Speech %ds of %ds (%ds silence removed)",
+            duration,
+            result.duration,
+            result.removed_seconds,
         )
 
-        if result.overdraft:
-            await send_response(
-                update,
-                context,
-                response=translates["credits_exhausted_warning"].get(
-                    language, translates["credits_exhausted_warning"]["en"]
-                ),
-            )
-
-    # 6. Track provider usage
-    if provider == const.PROVIDER_WIT:
-        await increment_wit_usage(wit_requests, language=language)
-        await check_and_send_alerts(context.bot)
-    elif provider == const.PROVIDER_GROQ:
-        await record_groq_usage(duration)
+        logger.debug("Voice message translation: %s", text)
+        if not text:
+            logger.debug("Empty voice message.")
+            return
 
-    await increment_transcription_stats()
-    await increment_user_stats(user_id, audio_seconds=duration)
+        # 5-6 run once per message: a job retried after a late failure (e.g. the reply) must
+        # not bill or count it again — its reservation is released on exit instead
+        message_key = progress_key(user.chat_id, update.message.message_id)
+        first_run = await claim_step(message_key, STEP_BILLED)
+        if first_run:
+            # 5. Calculate cost and deduct
+            token_cost = calculate_token_cost(duration)
+            if not user.has_unlimited_voice:
+                # Bill against the admission's reservation: the difference is refunded or taken
+                deduct = await settle_credits(admission.reservation, token_cost)
+                await record_user_usage(
+                    user_id, duration, token_cost, deduct.free_used, deduct.purchased_used
+                )
+
+                if deduct.overdraft:
+                    await send_response(
+                        update,
+                        context,
+                        response=translates["credits_exhausted_warning"].get(
+                            language, translates["credits_exhausted_warning"]["en"]
+                        ),
+                    )
+
+            # 6. Track provider usage (a cached result made no provider call)
+            if not result.cached and provider == const.PROVIDER_WIT:
+                await increment_wit_usage(result.wit_requests, language=language)
+                await check_and_send_alerts(context.bot)
+            elif not result.cached and provider == const.PROVIDER_GROQ:
+                await record_groq_usage(duration)
+
+            await increment_transcription_stats()
+            await increment_user_stats(user_id, audio_seconds=duration)
+
+    # A retry skips the steps with side effects an earlier run completed
+    progress = None if first_run else await load_progress(message_key)
+    done = set(progress.steps) if progress else set()
 
     # 7. Cleanup: always for Obsidian, conditionally for reply
-    settings_chat_id = f"u_{user_id}" if chat_id.startswith("g_") and user_id else chat_id
+    settings_chat_id = user.settings_chat_id
     raw_text = text
     obsidian_text = text
-    if tier != UserTier.FREE:
+    if progress and STEP_CLEANED in done:
+        text, obsidian_text = progress.text, progress.obsidian_text
+    elif tier != UserTier.FREE:
         recent_context = await get_recent_transcriptions(settings_chat_id)
-        if await get_auto_cleanup(settings_chat_id):
+        if user.auto_cleanup:
             text = await cleanup_transcript(raw_text, context=recent_context)
             obsidian_text = text  # no double call
         else:
             # Clean silently for Obsidian only
             obsidian_text = await cleanup_transcript(raw_text, context=recent_context)
         await save_recent_transcription(settings_chat_id, obsidian_text)
+        await complete_step(message_key, STEP_CLEANED, text=text, obsidian_text=obsidian_text)
 
     # 8. Obsidian integration
-    original_for_obsidian = raw_text if raw_text != obsidian_text else None
-    await _handle_obsidian_save(
-        chat_id, obsidian_text, language, user_id=user_id, original_text=original_for_obsidian
-    )
+    if STEP_OBSIDIAN not in done:
+        original_for_obsidian = raw_text if raw_text != obsidian_text else None
+        await _handle_obsidian_save(
+            user, obsidian_text, original_text=original_for_obsidian, message_key=message_key
+        )
 
     # 9. Send response
-    gpt_command = await get_gpt_command(chat_id)
-    response_kwargs = _build_voice_response(text, gpt_command, update.message.message_id)
+    response_kwargs = _build_voice_response(text, user.gpt_command, update.message.message_id)
     await send_response(update, context, **response_kwargs)
+    if admission.reason == "voice_truncated":
+        await send_response(
+            update,
+            context,
+            response=translates["voice_truncated"]
+            .get(language, translates["voice_truncated"]["en"])
+            .format(max_seconds=admission.max_seconds),
+        )
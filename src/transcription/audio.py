@@ -0,0 +1,92 @@
+"""Decoded audio buffer: one decode, then slicing and encoding from memory."""
+
+import array
+import contextlib
+import dataclasses
+import mmap
+import pathlib
+import wave
+from collections.abc import Iterator
+from io import BytesIO
+
+import audioop
+from pydub import AudioSegment
+
+SAMPLE_RATE = 16000  # Hz; speech APIs resample to 16 kHz anyway
+SAMPLE_WIDTH = 2  # bytes, signed 16-bit little-endian
+CHANNELS = 1
+MS_PER_SECOND = 1000
+
+WAV_CONTENT_TYPE = "audio/wav"
+
+# Compressed input: bytes in memory, or a file on local disk (local Bot API server)
+AudioSource = bytes | pathlib.Path
+
+
+@dataclasses.dataclass(frozen=True)
+class PcmAudio:
+    """Mono 16 kHz signed 16-bit PCM held in a flat sample array."""
+
+    samples: array.array
+
+    @property
+    def duration_ms(self) -> int:
+        return len(self.samples) * MS_PER_SECOND // SAMPLE_RATE
+
+    @property
+    def duration_seconds(self) -> int:
+        return self.duration_ms // MS_PER_SECOND
+
+    def slice_ms(self, start_ms: int, end_ms: int) -> PcmAudio:
+        """Return the [start_ms, end_ms) window as a new buffer."""
+        start = _ms_to_sample(start_ms)
+        end = min(_ms_to_sample(end_ms), len(self.samples))
+        return PcmAudio(self.samples[start:end])
+
+    def rms_profile(self, frame_ms: int) -> list[int]:
+        """RMS energy of consecutive frame_ms windows (last partial frame included)."""
+        step = _ms_to_sample(frame_ms)
+        data = memoryview(self.samples).cast("B")
+        width = step * SAMPLE_WIDTH
+        return [audioop.rms(data[i : i + width], SAMPLE_WIDTH) for i in range(0, len(data), width)]
+
+    def to_wav(self) -> bytes:
+        """Wrap the samples in a WAV container (header only, no re-encoding)."""
+        stream = BytesIO()
+        with wave.open(stream, "wb") as wav:
+            wav.setnchannels(CHANNELS)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(self.samples.tobytes())
+        return stream.getvalue()
+
+
+def _ms_to_sample(ms: int) -> int:
+    return ms * SAMPLE_RATE // MS_PER_SECOND
+
+
+def decode_audio(source: AudioSource, audio_format: str, max_ms: int | None = None) -> PcmAudio:
+    """Decode compressed audio once into a mono 16 kHz PCM buffer, at most max_ms of it."""
+    # pydub hands a path straight to ffmpeg, so a local file is never read into memory here
+    file = str(source) if isinstance(source, pathlib.Path) else BytesIO(source)
+    # ffmpeg -t: stop decoding at max_ms instead of decoding everything and cutting
+    duration = max_ms / MS_PER_SECOND if max_ms is not None else None
+    segment = AudioSegment.from_file(file, format=audio_format, duration=duration)
+    segment = segment.set_channels(CHANNELS).set_sample_width(SAMPLE_WIDTH)
+    segment = segment.set_frame_rate(SAMPLE_RATE)
+    return PcmAudio(array.array("h", segment.raw_data))
+
+
+def source_size(source: AudioSource) -> int:
+    return source.stat().st_size if isinstance(source, pathlib.Path) else len(source)
+
+
+@contextlib.contextmanager
+def map_audio_file(path: pathlib.Path) -> Iterator[mmap.mmap | bytes]:
+    """Read-only memory map of a local audio file; pages are loaded on access, not copied."""
+    with path.open("rb") as file:
+        if not path.stat().st_size:
+            yield b""  # empty files cannot be mapped
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
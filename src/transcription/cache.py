@@ -0,0 +1,173 @@
+"""Transcription result cache: in-process LRU in front of a shared Mongo TTL collection."""
+
+import asyncio
+import collections
+import dataclasses
+import hashlib
+import logging
+import typing
+
+from pymongo.errors import DuplicateKeyError
+
+from src.config import settings
+from src.dto import CachedTranscription
+from src.transcription.service import TranscriptionResult
+
+logger = logging.getLogger(__name__)
+
+
+def transcription_key(audio_id: str, language: str, provider: str) -> str:
+    """Cache key: the same audio may be transcribed differently per language and provider."""
+    return f"{provider}:{language}:{audio_id}"
+
+
+def content_id(audio_bytes: bytes) -> str:
+    """Stable audio id for platforms without a file-level unique id (WhatsApp)."""
+    return "sha256:" + hashlib.sha256(audio_bytes).hexdigest()
+
+
+def _consume_exception(flight: asyncio.Future) -> None:
+    # A failed job nobody joined must not log "exception was never retrieved"
+    if not flight.cancelled():
+        flight.exception()
+
+
+@dataclasses.dataclass
+class CacheStats:
+    size: int
+    memory_hits: int
+    mongo_hits: int
+    shared: int  # joined an identical in-flight transcription
+    misses: int
+    in_flight: int
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.memory_hits + self.mongo_hits + self.shared
+        lookups = hits + self.misses
+        return hits / lookups if lookups else 0.0
+
+
+class TranscriptionCache:
+    """
+    Two-tier cache of transcription results.
+
+    The LRU tier serves repeats within this process; the Mongo tier (7-day TTL) is shared
+    by all instances and survives restarts. Hits are returned with cached=True and
+    wit_requests=0 so provider usage is not counted twice. Only non-empty texts are stored.
+
+    get_or_transcribe adds single-flight on top: concurrent requests for the same key
+    share one in-flight job instead of each downloading and transcribing the audio.
+    """
+
+    def __init__(self) -> None:
+        self._entries: collections.OrderedDict[str, TranscriptionResult] = collections.OrderedDict()
+        self._memory_hits = 0
+        self._mongo_hits = 0
+        self._shared = 0
+        self._misses = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    def _remember(self, key: str, result: TranscriptionResult) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.transcription_cache_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> TranscriptionResult | None:
+        if not settings.transcription_cache_size:
+            return None
+
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self._memory_hits += 1
+            return result
+
+        doc = await CachedTranscription.find_one(CachedTranscription.key == key)
+        if doc is None:
+            self._misses += 1
+            return None
+        result = TranscriptionResult(
+            text=doc.text,
+            duration=doc.duration,
+            speech_duration=doc.speech_duration,
+            wit_requests=0,
+            cached=True,
+        )
+        self._remember(key, result)
+        self._mongo_hits += 1
+        return result
+
+    async def put(self, key: str, result: TranscriptionResult) -> None:
+        if not settings.transcription_cache_size or not result.text or result.cached:
+            return
+        self._remember(key, dataclasses.replace(result, wit_requests=0, cached=True))
+        try:
+            await CachedTranscription(
+                key=key,
+                text=result.text,
+                duration=result.duration,
+                speech_duration=result.speech_duration,
+            ).insert()
+        except DuplicateKeyError:
+            logger.debug("Transcription %s already cached by another worker", key)
+
+    async def get_or_transcribe(
+        self,
+        key: str,
+        transcribe: typing.Callable[[], typing.Awaitable[TranscriptionResult]],
+    ) -> TranscriptionResult:
+        """Cached result for key, else join the in-flight job for key, else run transcribe."""
+        while (flight := self._in_flight.get(key)) is not None:
+            try:
+                result = await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if flight.cancelled():
+                    continue  # the leader was cancelled, not us — take over
+                raise
+            self._shared += 1
+            logger.debug("Joined in-flight transcription %s", key)
+            return dataclasses.replace(result, wit_requests=0, cached=True)
+
+        # Registered before the first await so later arrivals join this job
+        flight = asyncio.get_running_loop().create_future()
+        flight.add_done_callback(_consume_exception)
+        self._in_flight[key] = flight
+        try:
+            result = await self.get(key)
+            if result is None:
+                result = await transcribe()
+                await self.put(key, result)
+            else:
+                logger.debug("Transcription cache hit for %s", key)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=len(self._entries),
+            memory_hits=self._memory_hits,
+            mongo_hits=self._mongo_hits,
+            shared=self._shared,
+            misses=self._misses,
+            in_flight=len(self._in_flight),
+        )
+
+    def clear(self) -> None:
+        """Drop the in-process tier and counters (the Mongo tier expires on its own)."""
+        self._entries.clear()
+        self._memory_hits = self._mongo_hits = self._shared = self._misses = 0
+
+
+# Module-level singleton — one LRU tier per process
+transcription_cache = TranscriptionCache()
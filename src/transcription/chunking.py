@@ -0,0 +1,53 @@
+"""Silence-aware chunk boundary planner for Wit.ai segmentation."""
+
+import math
+
+from src.transcription.audio import PcmAudio
+
+FRAME_MS = 20  # energy scan resolution
+SEARCH_WINDOW_MS = 4000  # how far back from the hard limit a split may move
+
+
+def plan_chunks(
+    audio: PcmAudio, max_chunk_ms: int, search_window_ms: int = SEARCH_WINDOW_MS
+) -> list[tuple[int, int]]:
+    """
+    Split audio into [start_ms, end_ms) segments no longer than max_chunk_ms.
+
+    Uses the minimum possible number of segments. Each split is placed at the quietest
+    frame in the window just before the hard limit, so words are not cut in half and
+    segments stay packed close to max_chunk_ms. Ties go to the later frame.
+    """
+    duration = audio.duration_ms
+    if duration <= max_chunk_ms:
+        return [(0, duration)] if duration else []
+
+    energies = audio.rms_profile(FRAME_MS)
+    chunk_count = math.ceil(duration / max_chunk_ms)
+
+    bounds: list[tuple[int, int]] = []
+    start = 0
+    for index in range(1, chunk_count):
+        latest = start + max_chunk_ms
+        # Leave the remaining chunks enough room to cover the rest of the audio
+        earliest = max(latest - search_window_ms, duration - (chunk_count - index) * max_chunk_ms)
+        split = _quietest_point(energies, earliest, latest)
+        bounds.append((start, split))
+        start = split
+    bounds.append((start, duration))
+    return bounds
+
+
+def _quietest_point(energies: list[int], earliest_ms: int, latest_ms: int) -> int:
+    """Return the ms offset of the centre of the quietest whole frame in the window."""
+    first = math.ceil(earliest_ms / FRAME_MS)
+    last = latest_ms // FRAME_MS - 1  # frame must end at or before latest_ms
+    if last < first:
+        return latest_ms
+    best = min(range(last, first - 1, -1), key=lambda frame: energies[frame])
+    return best * FRAME_MS + FRAME_MS // 2
+
+
+def split_point(audio: PcmAudio, earliest_ms: int, latest_ms: int) -> int:
+    """Quietest split point in [earliest_ms, latest_ms] of a single buffer (streaming use)."""
+    return _quietest_point(audio.rms_profile(FRAME_MS), earliest_ms, latest_ms)
@@ -0,0 +1,116 @@
+"""Off-loop executor pool for CPU-bound audio work (decode, slice, encode)."""
+
+import asyncio
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import typing
+
+from src.config import settings
+from src.loop_local import LoopLocal
+from src.transcription.worker import timed_call
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+@dataclasses.dataclass
+class ExecutorStats:
+    kind: str
+    workers: int
+    queue_depth: int  # submitted, waiting for a free worker
+    waiting: int  # callers blocked by the bounded queue
+    running: int
+    completed: int
+    avg_task_seconds: float
+    max_task_seconds: float
+
+
+def _create_pool(kind: str, workers: int) -> concurrent.futures.Executor:
+    if kind == EXECUTOR_PROCESS:
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    if kind != EXECUTOR_THREAD:
+        # Sub-interpreters are not an option: decoding spawns ffmpeg, which isolated
+        # interpreters forbid
+        logger.warning("Unknown audio executor kind %r, using threads", kind)
+    return concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audio")
+
+
+class AudioExecutor:
+    """
+    Runs blocking audio functions on a worker pool so the event loop stays responsive.
+
+    At most workers + max_queue tasks per event loop are submitted to the pool at once;
+    further callers wait on their loop (backpressure) instead of growing an unbounded
+    pool queue.
+    For process pools, functions and arguments must be picklable and the functions
+    importable without the app config (see src.transcription.worker).
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int) -> None:
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self._max_queue = max_queue
+        self._pool: concurrent.futures.Executor | None = None
+        # Per event loop: the WhatsApp webhook runs its own loop beside the Telegram one
+        self._slots: LoopLocal[asyncio.Semaphore] = LoopLocal(
+            lambda: asyncio.Semaphore(self.workers + self._max_queue)
+        )
+        self._waiting = 0
+        self._submitted = 0
+        self._completed = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            self._pool = _create_pool(self.kind, self.workers)
+        return self._pool
+
+    async def run(self, fn: typing.Callable, *args: typing.Any) -> typing.Any:
+        """Run fn(*args) in the pool and await its result."""
+        slots = self._slots.get()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._submitted += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, seconds = await loop.run_in_executor(self._get_pool(), timed_call, fn, *args)
+        finally:
+            self._submitted -= 1
+            slots.release()
+        self._completed += 1
+        self._total_seconds += seconds
+        self._max_seconds = max(self._max_seconds, seconds)
+        return result
+
+    def stats(self) -> ExecutorStats:
+        return ExecutorStats(
+            kind=self.kind,
+            workers=self.workers,
+            queue_depth=max(0, self._submitted - self.workers),
+            waiting=self._waiting,
+            running=min(self._submitted, self.workers),
+            completed=self._completed,
+            avg_task_seconds=self._total_seconds / self._completed if self._completed else 0.0,
+            max_task_seconds=self._max_seconds,
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Module-level singleton — one audio pool per process
+audio_executor = AudioExecutor(
+    kind=settings.audio_executor_kind,
+    workers=settings.audio_executor_workers,
+    max_queue=settings.audio_executor_max_queue,
+)
@@ -1,7 +1,7 @@
 """Groq Whisper client for speech-to-text."""
 
 import logging
-from io import BytesIO
+import mmap
 
 import httpx
 
@@ -11,12 +11,13 @@ logger = logging.getLogger(__name__)
 
 GROQ_API_URL = "https://api.groq.com/openai/v1/audio/transcriptions"
 GROQ_TIMEOUT = 30.0
+GROQ_MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # larger files are rejected
 
 LANGUAGE_MAP = {"en": "en", "ru": "ru", "es": "es", "de": "de"}
 
 
 async def transcribe_with_groq(
-    audio_bytes: bytes,
+    audio_bytes: bytes | mmap.mmap,
     language: str,
     audio_format: str = "ogg",
 ) -> str:
@@ -24,7 +25,7 @@ async def transcribe_with_groq(
     Transcribe audio using Groq Whisper API.
 
     Args:
-        audio_bytes: Raw audio data
+        audio_bytes: Raw audio data, or a memory-mapped file (streamed from the mapping)
         language: ISO language code (en, ru, es, de)
         audio_format: Audio format for filename hint
 
@@ -38,7 +39,7 @@ async def transcribe_with_groq(
     groq_language = LANGUAGE_MAP.get(language, "en")
 
     files = {
-        "file": (f"audio.{audio_format}", BytesIO(audio_bytes), f"audio/{audio_format}"),
+        "file": (f"audio.{audio_format}", audio_bytes, f"audio/{audio_format}"),
         "model": (None, settings.groq_model),
         "language": (None, groq_language),
         "response_format": (None, "text"),
@@ -0,0 +1,111 @@
+"""Container-header duration probe (OGG Opus/Vorbis, MP4/M4A) — no decoding."""
+
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+MS_PER_SECOND = 1000
+
+_OGG_CAPTURE = b"OggS"
+# capture, version, header type, granule position, serial, sequence, CRC, segment count
+_OGG_HEADER = struct.Struct("<4sBBqIIIB")
+_OPUS_HEAD = b"OpusHead"
+_OPUS_GRANULE_RATE = 48000  # Opus granule positions are always at 48 kHz
+_VORBIS_HEAD = b"\x01vorbis"
+
+_MP4_FTYP = b"ftyp"
+_BOX_HEADER = struct.Struct(">I4s")
+_BOX_LARGESIZE = struct.Struct(">Q")
+
+
+def _ogg_page(data: bytes, offset: int) -> tuple[int, int, bytes] | None:
+    """Parse an OGG page at offset; returns (granule, serial, payload)."""
+    if offset + _OGG_HEADER.size > len(data):
+        return None
+    capture, _version, _type, granule, serial, _seq, _crc, nsegs = _OGG_HEADER.unpack_from(
+        data, offset
+    )
+    if capture != _OGG_CAPTURE:
+        return None
+    table_start = offset + _OGG_HEADER.size
+    payload_start = table_start + nsegs
+    payload_end = payload_start + sum(data[table_start:payload_start])
+    return granule, serial, data[payload_start:payload_end]
+
+
+def _ogg_duration_ms(data: bytes) -> int | None:
+    first = _ogg_page(data, 0)
+    if first is None:
+        return None
+    _, serial, payload = first
+
+    if payload.startswith(_OPUS_HEAD):
+        rate = _OPUS_GRANULE_RATE
+        pre_skip = struct.unpack_from("<H", payload, 10)[0]
+    elif payload.startswith(_VORBIS_HEAD):
+        rate = struct.unpack_from("<I", payload, 12)[0]
+        pre_skip = 0
+    else:
+        return None
+    if not rate:
+        return None
+
+    # The last page of the stream carries the final granule position
+    offset = data.rfind(_OGG_CAPTURE)
+    while offset > 0:
+        page = _ogg_page(data, offset)
+        if page is not None and page[1] == serial and page[0] >= 0:
+            return max(0, page[0] - pre_skip) * MS_PER_SECOND // rate
+        offset = data.rfind(_OGG_CAPTURE, 0, offset)
+    return None
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    """Yield (type, payload_start, box_end) for ISO BMFF boxes in [start, end)."""
+    offset = start
+    while offset + _BOX_HEADER.size <= end:
+        size, box_type = _BOX_HEADER.unpack_from(data, offset)
+        header = _BOX_HEADER.size
+        if size == 1:
+            if offset + header + _BOX_LARGESIZE.size > end:
+                return
+            size = _BOX_LARGESIZE.unpack_from(data, offset + header)[0]
+            header += _BOX_LARGESIZE.size
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _mp4_duration_ms(data: bytes) -> int | None:
+    """Duration from moov/mvhd (timescale + duration), v0 or v1 layout."""
+    for box_type, payload, box_end in _iter_boxes(data, 0, len(data)):
+        if box_type != b"moov":
+            continue
+        for child_type, child, _child_end in _iter_boxes(data, payload, box_end):
+            if child_type != b"mvhd":
+                continue
+            version = data[child]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", data, child + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", data, child + 12)
+            if not timescale:
+                return None
+            return duration * MS_PER_SECOND // timescale
+    return None
+
+
+def probe_duration_ms(audio_bytes: bytes) -> int | None:
+    """Read duration from container headers; None if the container is not understood."""
+    try:
+        if audio_bytes.startswith(_OGG_CAPTURE):
+            return _ogg_duration_ms(audio_bytes)
+        if audio_bytes[4:8] == _MP4_FTYP:
+            return _mp4_duration_ms(audio_bytes)
+    except struct.error as exc:
+        logger.debug("Duration probe failed on truncated header: %s", exc)
+    return None
@@ -1,77 +1,324 @@
 """Voice transcription service — platform-agnostic."""
 
+import asyncio
+import contextlib
+import dataclasses
 import logging
-from io import BytesIO
-
-from pydub import AudioSegment
+import pathlib
+from collections.abc import AsyncIterator
 
 from src import const
-from src.transcription.groq_client import transcribe_with_groq
+from src.config import settings
+from src.governor import STAGE_AUDIO, STAGE_PROVIDER, governor
+from src.loop_local import LoopLocal
+from src.transcription.audio import (
+    MS_PER_SECOND,
+    WAV_CONTENT_TYPE,
+    AudioSource,
+    PcmAudio,
+    decode_audio,
+    map_audio_file,
+    source_size,
+)
+from src.transcription.executor import audio_executor
+from src.transcription.groq_client import GROQ_MAX_UPLOAD_BYTES, transcribe_with_groq
+from src.transcription.probe import probe_duration_ms
+from src.transcription.streaming import (
+    OPUS_BITRATE,
+    OPUS_FORMAT,
+    encode_opus,
+    stream_chunks,
+    stream_pcm,
+)
 from src.transcription.wit_client import voice_translators
+from src.transcription.worker import (
+    TrimSettings,
+    encode_wit_chunks,
+    prepare_audio,
+    trim,
+    trim_and_encode,
+)
 
 logger = logging.getLogger(__name__)
 
-CHUNK_LENGTH_MS = 19500  # Wit.ai limit: <20 sec
-MS_PER_SECOND = 1000
+CHUNK_LENGTH_MS = 19800  # Wit.ai limit: <20 sec; PCM length is exact, so a small margin is enough
+# Most speech one Groq upload holds as Opus, with 10% left for container overhead (~2 hours)
+GROQ_MAX_SPEECH_MS = GROQ_MAX_UPLOAD_BYTES * 8 * MS_PER_SECOND // OPUS_BITRATE * 9 // 10
+
+# One cap per Wit.ai app (language) shared by all in-flight messages of an event loop
+_wit_semaphores: LoopLocal[dict[str, asyncio.Semaphore]] = LoopLocal(dict)
+
+
+def _get_wit_semaphore(language: str) -> asyncio.Semaphore:
+    semaphores = _wit_semaphores.get()
+    if language not in semaphores:
+        semaphores[language] = asyncio.Semaphore(settings.wit_max_concurrent_chunks)
+    return semaphores[language]
+
+
+@dataclasses.dataclass
+class TranscriptionResult:
+    text: str
+    duration: int  # raw audio length decoded (up to max_seconds), seconds
+    speech_duration: int  # after silence trimming, seconds; billing uses this
+    wit_requests: int  # Wit.ai API calls made (>1 for chunked audio), 0 for other providers
+    cached: bool = False  # served from the transcription cache, no provider call
+
+    @property
+    def removed_seconds(self) -> int:
+        return self.duration - self.speech_duration
+
+
+def _trim_settings() -> TrimSettings:
+    return TrimSettings(
+        enabled=settings.silence_trim_enabled,
+        threshold_dbfs=settings.silence_threshold_dbfs,
+        min_pause_ms=settings.silence_min_pause_ms,
+        keep_ms=settings.silence_keep_ms,
+    )
 
 
 def get_audio_duration_seconds(audio_bytes: bytes, audio_format: str) -> int:
-    """Get audio duration in seconds."""
-    audio_stream = BytesIO(audio_bytes)
-    audio = AudioSegment.from_file(audio_stream, format=audio_format)
-    return len(audio) // MS_PER_SECOND
+    """Get audio duration in seconds: container header first, full decode as fallback."""
+    duration_ms = probe_duration_ms(audio_bytes)
+    if duration_ms is None:
+        logger.debug("No usable %s header, decoding to measure duration", audio_format)
+        return decode_audio(audio_bytes, audio_format).duration_seconds
+    return duration_ms // MS_PER_SECOND
 
 
 async def transcribe_audio(
-    audio_bytes: bytes,
+    source: AudioSource,
     audio_format: str,
     language: str,
     provider: str = const.PROVIDER_WIT,
-) -> tuple[str, int, int]:
+    max_seconds: int | None = None,
+) -> TranscriptionResult:
     """
     Transcribe audio to text.
 
     Args:
-        audio_bytes: Raw audio data
+        source: Compressed audio bytes, or a path to a local file (read in place)
         audio_format: Format hint for pydub (e.g., "ogg", "opus", "mp4")
         language: Language code (en, ru, es, de)
         provider: Transcription provider (const.PROVIDER_WIT or const.PROVIDER_GROQ)
+        max_seconds: Transcribe only the beginning of the audio (admission truncation)
 
     Returns:
-        Tuple of (transcribed text, duration in seconds, wit_requests_count).
-        wit_requests_count is the number of Wit.ai API calls made (>1 for chunked audio),
-        or 0 for non-Wit providers.
+        TranscriptionResult with text, raw and speech (silence-trimmed) durations
+        and the number of Wit.ai requests made.
     """
-    duration = get_audio_duration_seconds(audio_bytes, audio_format)
+    async with governor.stage(STAGE_AUDIO):
+        return await _transcribe(source, audio_format, language, provider, max_seconds)
+
+
+async def _transcribe(
+    source: AudioSource,
+    audio_format: str,
+    language: str,
+    provider: str,
+    max_seconds: int | None,
+) -> TranscriptionResult:
+    max_ms = max_seconds * MS_PER_SECOND if max_seconds is not None else None
+    if source_size(source) >= settings.streaming_decode_min_bytes:
+        # Large file: constant-memory decode, chunks go out as soon as they are ready
+        if provider == const.PROVIDER_GROQ:
+            return await _transcribe_with_groq_streaming(source, language, max_ms)
+        return await _transcribe_with_wit_streaming(source, language, max_ms)
+
+    # Single decode: duration, chunking and upload encoding all come from this buffer
+    prepared = await audio_executor.run(
+        prepare_audio, source, audio_format, _trim_settings(), max_ms
+    )
+    audio = prepared.audio
+    raw_duration = prepared.raw_duration_ms // MS_PER_SECOND
+    if prepared.trimmed:
+        logger.debug("Silence trimmed: %d ms -> %d ms", prepared.raw_duration_ms, audio.duration_ms)
+
+    if not audio.duration_ms:
+        # Nothing but silence — no provider call, nothing to bill
+        return TranscriptionResult("", raw_duration, 0, 0)
 
     if provider == const.PROVIDER_GROQ:
-        text = await transcribe_with_groq(audio_bytes, language, audio_format)
+        if not prepared.trimmed and source_size(source) <= GROQ_MAX_UPLOAD_BYTES:
+            # Groq accepts compressed containers — the original bytes are the smallest upload
+            text = await _transcribe_original_with_groq(source, language, audio_format)
+        else:
+            # Re-compressed: trimmed PCM as WAV would be ~10x the original Opus voice note
+            if audio.duration_ms > GROQ_MAX_SPEECH_MS:
+                logger.warning("Speech over the Groq upload limit, transcribing the beginning")
+                audio = audio.slice_ms(0, GROQ_MAX_SPEECH_MS)
+            upload = await encode_opus(_single_chunk(audio))
+            async with governor.stage(STAGE_PROVIDER):
+                text = await transcribe_with_groq(upload, language, OPUS_FORMAT)
         wit_requests = 0
     else:
-        text, wit_requests = _transcribe_with_wit(audio_bytes, audio_format, language)
+        text, wit_requests = await _transcribe_with_wit(audio, language)
 
     logger.debug("Transcription result (%s): %s", provider, text)
-    return text, duration, wit_requests
+    return TranscriptionResult(
+        text=text,
+        duration=raw_duration,
+        speech_duration=audio.duration_seconds,
+        wit_requests=wit_requests,
+    )
+
+
+async def _single_chunk(audio: PcmAudio) -> AsyncIterator[PcmAudio]:
+    yield audio
+
 
+async def _transcribe_original_with_groq(
+    source: AudioSource, language: str, audio_format: str
+) -> str:
+    if not isinstance(source, pathlib.Path):
+        async with governor.stage(STAGE_PROVIDER):
+            return await transcribe_with_groq(source, language, audio_format)
+    # Local file: upload straight from a memory map instead of reading it into a buffer
+    with map_audio_file(source) as mapped:
+        async with governor.stage(STAGE_PROVIDER):
+            return await transcribe_with_groq(mapped, language, audio_format)
 
-def _transcribe_with_wit(audio_bytes: bytes, audio_format: str, language: str) -> tuple[str, int]:
-    """Wit.ai transcription. Returns (text, number_of_api_requests)."""
-    audio_stream = BytesIO(audio_bytes)
-    audio = AudioSegment.from_file(audio_stream, format=audio_format)
 
-    chunks = [audio[i : i + CHUNK_LENGTH_MS] for i in range(0, len(audio), CHUNK_LENGTH_MS)]
+async def _transcribe_chunk(chunk: bytes, language: str) -> str:
+    async with _get_wit_semaphore(language), governor.stage(STAGE_PROVIDER):
+        response = await voice_translators[language].speech(chunk, WAV_CONTENT_TYPE)
+    return response.get("text", "")
 
-    translator = voice_translators[language]
-    full_text = ""
 
-    for chunk in chunks:
-        converted_stream = BytesIO()
-        chunk.export(converted_stream, format="mp3")
-        converted_stream.seek(0)
+async def _transcribe_with_wit(audio: PcmAudio, language: str) -> tuple[str, int]:
+    """Wit.ai transcription. Returns (text, number_of_api_requests).
+
+    Chunk boundaries fall on the quietest moments near the length limit.
+    Chunks are sent concurrently (bounded per language) and reassembled in order.
+    Chunks that failed in the concurrent pass are retried one by one afterwards.
+    """
+    chunks = await audio_executor.run(encode_wit_chunks, audio, CHUNK_LENGTH_MS)
+
+    results = await asyncio.gather(
+        *(_transcribe_chunk(chunk, language) for chunk in chunks), return_exceptions=True
+    )
+
+    texts: list[str] = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                "Wit.ai chunk %d/%d failed, retrying: %s", index + 1, len(chunks), result
+            )
+            result = await _transcribe_chunk(chunks[index], language)
+        texts.append(result)
+
+    return "".join(texts), len(chunks)
+
+
+async def _transcribe_streamed_chunk(chunk: bytes, language: str) -> str:
+    try:
+        return await _transcribe_chunk(chunk, language)
+    except Exception as exc:
+        # The payload is not kept after dispatch, so retry right away rather than later
+        logger.warning("Wit.ai streamed chunk failed, retrying: %s", exc)
+        return await _transcribe_chunk(chunk, language)
+
+
+async def _transcribe_with_wit_streaming(
+    source: AudioSource, language: str, max_ms: int | None = None
+) -> TranscriptionResult:
+    """
+    Wit.ai transcription with a memory-bounded decode.
+
+    ffmpeg output is read in fixed-size blocks and re-cut at silence into chunks; each chunk
+    is trimmed, encoded and dispatched as soon as it is ready. Decoding pauses while
+    wit_max_concurrent_chunks requests are in flight, so peak memory does not grow with
+    audio length. With max_ms, decoding stops once that much audio has been read.
+    """
+    trim_settings = _trim_settings()
+    raw_ms = 0
+    speech_ms = 0
+    tasks: list[asyncio.Task] = []
+    in_flight: set[asyncio.Task] = set()
+    try:
+        # aclosing: stopping early at max_ms must terminate ffmpeg right away
+        async with (
+            contextlib.aclosing(stream_pcm(source)) as blocks,
+            contextlib.aclosing(stream_chunks(blocks, CHUNK_LENGTH_MS)) as chunks,
+        ):
+            async for chunk in chunks:
+                if max_ms is not None and raw_ms + chunk.duration_ms > max_ms:
+                    chunk = chunk.slice_ms(0, max_ms - raw_ms)
+                raw_ms += chunk.duration_ms
+                chunk_speech_ms, wav = await audio_executor.run(
+                    trim_and_encode, chunk, trim_settings
+                )
+                if wav:
+                    speech_ms += chunk_speech_ms
+                    if len(in_flight) >= settings.wit_max_concurrent_chunks:
+                        _done, in_flight = await asyncio.wait(
+                            in_flight, return_when=asyncio.FIRST_COMPLETED
+                        )
+                    task = asyncio.create_task(_transcribe_streamed_chunk(wav, language))
+                    tasks.append(task)
+                    in_flight.add(task)
+                if max_ms is not None and raw_ms >= max_ms:
+                    break
+        texts = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return TranscriptionResult(
+        text="".join(texts),
+        duration=raw_ms // MS_PER_SECOND,
+        speech_duration=speech_ms // MS_PER_SECOND,
+        wit_requests=len(tasks),
+    )
+
+
+async def _transcribe_with_groq_streaming(
+    source: AudioSource, language: str, max_ms: int | None = None
+) -> TranscriptionResult:
+    """
+    Groq transcription with a memory-bounded decode.
+
+    Decoded blocks are trimmed chunk by chunk and piped straight into the Opus encoder, so
+    only the compressed upload is held in memory. Decoding stops at max_ms, or once the
+    upload would exceed Groq's size limit; billing covers only what was sent.
+    """
+    trim_settings = _trim_settings()
+    raw_ms = 0
+    speech_ms = 0
 
-        response = translator.speech(
-            audio_file=converted_stream, headers={"Content-Type": "audio/mpeg3"}
-        )
-        full_text += response.get("text", "")
+    async def _speech() -> AsyncIterator[PcmAudio]:
+        nonlocal raw_ms, speech_ms
+        async with (
+            contextlib.aclosing(stream_pcm(source)) as blocks,
+            contextlib.aclosing(stream_chunks(blocks, CHUNK_LENGTH_MS)) as chunks,
+        ):
+            async for chunk in chunks:
+                if max_ms is not None and raw_ms + chunk.duration_ms > max_ms:
+                    chunk = chunk.slice_ms(0, max_ms - raw_ms)
+                raw_ms += chunk.duration_ms
+                speech = await audio_executor.run(trim, chunk, trim_settings)
+                if speech_ms + speech.duration_ms > GROQ_MAX_SPEECH_MS:
+                    logger.warning("Speech over the Groq upload limit, transcribing the beginning")
+                    speech = speech.slice_ms(0, GROQ_MAX_SPEECH_MS - speech_ms)
+                speech_ms += speech.duration_ms
+                if speech.duration_ms:
+                    yield speech
+                if speech_ms >= GROQ_MAX_SPEECH_MS or (max_ms is not None and raw_ms >= max_ms):
+                    break
 
-    return full_text, len(chunks)
+    # aclosing: an encoder failure must terminate the decoding ffmpeg right away
+    async with contextlib.aclosing(_speech()) as speech:
+        upload = await encode_opus(speech)
+    if not speech_ms:
+        # Nothing but silence — no provider call, nothing to bill
+        return TranscriptionResult("", raw_ms // MS_PER_SECOND, 0, 0)
+    async with governor.stage(STAGE_PROVIDER):
+        text = await transcribe_with_groq(upload, language, OPUS_FORMAT)
+    return TranscriptionResult(
+        text=text,
+        duration=raw_ms // MS_PER_SECOND,
+        speech_duration=speech_ms // MS_PER_SECOND,
+        wit_requests=0,
+    )
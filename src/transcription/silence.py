@@ -0,0 +1,67 @@
+"""Silence trimming: drop leading/trailing silence and shorten long pauses."""
+
+import array
+
+from src.transcription.audio import PcmAudio
+
+FRAME_MS = 20
+_FULL_SCALE = 32768  # 16-bit PCM peak amplitude (0 dBFS)
+
+
+def _rms_threshold(threshold_dbfs: float) -> int:
+    return int(_FULL_SCALE * 10 ** (threshold_dbfs / 20))
+
+
+def _voiced_frames(audio: PcmAudio, threshold_dbfs: float) -> list[bool]:
+    threshold = _rms_threshold(threshold_dbfs)
+    return [rms > threshold for rms in audio.rms_profile(FRAME_MS)]
+
+
+def _kept_ranges(
+    voiced: list[bool], total_ms: int, min_pause_ms: int, keep_ms: int
+) -> list[tuple[int, int]]:
+    """Compute [start_ms, end_ms) ranges to keep, merged and in order."""
+    ranges: list[tuple[int, int]] = []
+    frame = 0
+    while frame < len(voiced):
+        if not voiced[frame]:
+            frame += 1
+            continue
+        start = frame
+        while frame < len(voiced) and voiced[frame]:
+            frame += 1
+        ranges.append((start * FRAME_MS, min(frame * FRAME_MS, total_ms)))
+
+    # Pad each voiced run with up to keep_ms / 2 of context on both sides
+    half = keep_ms // 2
+    padded = [(max(0, start - half), min(total_ms, end + half)) for start, end in ranges]
+
+    # Short pauses (< min_pause_ms) stay intact; long ones collapse to keep_ms
+    merged: list[tuple[int, int]] = []
+    for start, end in padded:
+        if merged and start - merged[-1][1] < min_pause_ms - keep_ms:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def trim_silence(
+    audio: PcmAudio, threshold_dbfs: float, min_pause_ms: int, keep_ms: int
+) -> PcmAudio:
+    """
+    Remove leading/trailing silence and shorten pauses longer than min_pause_ms.
+
+    Frames quieter than threshold_dbfs count as silence. Around speech, keep_ms / 2 of
+    silence is kept on each side so words are not clipped. All-silent audio yields an
+    empty buffer.
+    """
+    voiced = _voiced_frames(audio, threshold_dbfs)
+    ranges = _kept_ranges(voiced, audio.duration_ms, min_pause_ms, keep_ms)
+    if ranges == [(0, audio.duration_ms)]:
+        return audio
+
+    samples = array.array("h")
+    for start, end in ranges:
+        samples.extend(audio.slice_ms(start, end).samples)
+    return PcmAudio(samples)
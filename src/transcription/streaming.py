@@ -0,0 +1,192 @@
+"""Streaming ffmpeg pipes: bounded-memory decode to PCM blocks and Wit-sized chunks, Opus encode."""
+
+import array
+import asyncio
+import logging
+import pathlib
+from collections.abc import AsyncIterable, AsyncIterator
+
+from src.transcription.audio import CHANNELS, SAMPLE_RATE, SAMPLE_WIDTH, AudioSource, PcmAudio
+from src.transcription.chunking import SEARCH_WINDOW_MS, split_point
+
+logger = logging.getLogger(__name__)
+
+BLOCK_MS = 500  # PCM read from ffmpeg per step: 16 KB at 16 kHz mono
+OPUS_BITRATE = 24_000  # bits/s: speech-grade mono Opus, 3 KB per second of audio
+OPUS_FORMAT = "ogg"  # container of encode_opus output
+_FFMPEG = "ffmpeg"
+_STDERR_TAIL_BYTES = 4096  # end of the ffmpeg log kept for error messages
+
+
+class AudioDecodeError(Exception):
+    """Raised when ffmpeg fails to decode a streamed input."""
+
+
+class AudioEncodeError(Exception):
+    """Raised when ffmpeg fails to encode PCM for upload."""
+
+
+def _ffmpeg_args(input_arg: str) -> list[str]:
+    return [
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        input_arg,
+        "-f",
+        "s16le",
+        "-ac",
+        str(CHANNELS),
+        "-ar",
+        str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+
+
+async def _stderr_tail(stream: asyncio.StreamReader) -> bytes:
+    """Read ffmpeg's log as it is written, keeping the tail: a full pipe would stall ffmpeg."""
+    tail = b""
+    while data := await stream.read(_STDERR_TAIL_BYTES):
+        tail = (tail + data)[-_STDERR_TAIL_BYTES:]
+    return tail
+
+
+async def _feed_stdin(stdin: asyncio.StreamWriter, data: bytes) -> None:
+    try:
+        stdin.write(data)
+        await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        logger.debug("ffmpeg closed stdin early")
+    finally:
+        stdin.close()
+
+
+async def stream_pcm(source: AudioSource, block_ms: int = BLOCK_MS) -> AsyncIterator[array.array]:
+    """
+    Decode source with an ffmpeg subprocess and yield fixed-size PCM sample blocks.
+
+    source is either the compressed bytes (piped to stdin) or a path ffmpeg reads itself.
+    Only one block is held at a time; ffmpeg is paused by pipe backpressure otherwise.
+    """
+    from_path = isinstance(source, pathlib.Path)
+    process = await asyncio.create_subprocess_exec(
+        _FFMPEG,
+        *_ffmpeg_args(str(source) if from_path else "pipe:0"),
+        stdin=asyncio.subprocess.DEVNULL if from_path else asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    feeder = None if from_path else asyncio.create_task(_feed_stdin(process.stdin, source))
+    log = asyncio.create_task(_stderr_tail(process.stderr))
+    block_bytes = block_ms * SAMPLE_RATE // 1000 * SAMPLE_WIDTH
+    try:
+        while True:
+            try:
+                data = await process.stdout.readexactly(block_bytes)
+            except asyncio.IncompleteReadError as exc:
+                data = exc.partial[: len(exc.partial) // SAMPLE_WIDTH * SAMPLE_WIDTH]
+                if data:
+                    yield array.array("h", data)
+                break
+            yield array.array("h", data)
+
+        stderr = await log
+        if await process.wait() != 0:
+            raise AudioDecodeError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    finally:
+        log.cancel()
+        if feeder is not None:
+            feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def stream_chunks(
+    blocks: AsyncIterator[array.array],
+    max_chunk_ms: int,
+    search_window_ms: int = SEARCH_WINDOW_MS,
+) -> AsyncIterator[PcmAudio]:
+    """
+    Re-cut a block stream into chunks no longer than max_chunk_ms, split at silence.
+
+    Holds at most one chunk plus one block in memory. Unlike plan_chunks the total length
+    is unknown, so each split is simply the quietest point in the window before the limit.
+    """
+    limit = max_chunk_ms * SAMPLE_RATE // 1000
+    buffer = array.array("h")
+    async for block in blocks:
+        buffer.extend(block)
+        while len(buffer) > limit:
+            window = PcmAudio(buffer[:limit])
+            split_ms = split_point(window, max_chunk_ms - search_window_ms, max_chunk_ms)
+            split = split_ms * SAMPLE_RATE // 1000
+            yield PcmAudio(buffer[:split])
+            del buffer[:split]
+    if buffer:
+        yield PcmAudio(buffer)
+
+
+def _opus_args() -> list[str]:
+    return [
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ac",
+        str(CHANNELS),
+        "-ar",
+        str(SAMPLE_RATE),
+        "-i",
+        "pipe:0",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        str(OPUS_BITRATE),
+        "-application",
+        "voip",
+        "-f",
+        OPUS_FORMAT,
+        "pipe:1",
+    ]
+
+
+async def _feed_chunks(stdin: asyncio.StreamWriter, chunks: AsyncIterable[PcmAudio]) -> None:
+    try:
+        async for chunk in chunks:
+            stdin.write(chunk.samples.tobytes())
+            await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        logger.debug("ffmpeg closed stdin early")
+    finally:
+        stdin.close()
+
+
+async def encode_opus(chunks: AsyncIterable[PcmAudio]) -> bytes:
+    """
+    Encode PCM chunks to Opus in an OGG container with an ffmpeg subprocess.
+
+    Chunks are piped in as they arrive while the output is read concurrently, so besides
+    the chunk being written only the compressed result (OPUS_BITRATE / 8 bytes per second
+    of audio, about a tenth of WAV) is held in memory.
+    """
+    process = await asyncio.create_subprocess_exec(
+        _FFMPEG,
+        *_opus_args(),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    feeder = asyncio.create_task(_feed_chunks(process.stdin, chunks))
+    try:
+        encoded, stderr = await asyncio.gather(process.stdout.read(), _stderr_tail(process.stderr))
+        await feeder
+        if await process.wait() != 0:
+            raise AudioEncodeError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+        return encoded
+    finally:
+        feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
@@ -1,12 +1,122 @@
-"""Wit.ai client initialization."""
+"""Async Wit.ai speech client with one pooled keep-alive connection per language app."""
 
-import wit
+import asyncio
+import http
+import logging
+
+import httpx
 
 from src.config import ENGLISH, GERMAN, RUSSIAN, SPANISH, settings
+from src.loop_local import LoopLocal
+
+logger = logging.getLogger(__name__)
+
+WIT_API_URL = "https://api.wit.ai/speech"
+WIT_API_VERSION = "20200513"
+# Read timeout covers Wit's processing of a ~20 s chunk
+WIT_TIMEOUT = httpx.Timeout(connect=10.0, read=30.0, write=30.0, pool=10.0)
+WIT_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0)
+
+_MAX_RETRIES = 3
+_RETRY_DELAYS = (1.0, 2.0, 4.0)
+_MAX_RETRY_AFTER = 10.0  # don't let a long Retry-After stall the chat
+_HTTP_5XX_MIN = http.HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+class WitError(Exception):
+    """Raised when Wit.ai cannot transcribe a request after all retries."""
+
+
+def _retry_delay(response: httpx.Response | None, attempt: int) -> float:
+    """Honour Retry-After on 429, otherwise exponential backoff."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), _MAX_RETRY_AFTER)
+    return _RETRY_DELAYS[attempt]
+
 
-voice_translators = {
-    ENGLISH: wit.Wit(settings.wit_en_token),
-    RUSSIAN: wit.Wit(settings.wit_ru_token),
-    SPANISH: wit.Wit(settings.wit_es_token),
-    GERMAN: wit.Wit(settings.wit_de_token),
+class WitClient:
+    """Speech client for a single Wit.ai app (one token = one language)."""
+
+    def __init__(
+        self, access_token: str, transport: httpx.AsyncBaseTransport | None = None
+    ) -> None:
+        self._access_token = access_token
+        self._transport = transport
+        # One pool per event loop: the WhatsApp webhook runs its own loop in another thread
+        self._clients: LoopLocal[httpx.AsyncClient] = LoopLocal(self._new_client)
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=WIT_TIMEOUT,
+            limits=WIT_LIMITS,
+            headers={
+                "authorization": f"Bearer {self._access_token}",
+                "accept": f"application/vnd.wit.{WIT_API_VERSION}+json",
+            },
+            transport=self._transport,
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        client = self._clients.get()
+        if client.is_closed:
+            self._clients.pop()
+            client = self._clients.get()
+        return client
+
+    async def speech(self, audio: bytes, content_type: str) -> dict:
+        """POST audio to /speech; retry on 429, 5xx and transport errors."""
+        client = self._get_client()
+        for attempt in range(_MAX_RETRIES):
+            response = None
+            try:
+                response = await client.post(
+                    WIT_API_URL, content=audio, headers={"content-type": content_type}
+                )
+            except httpx.TransportError as exc:
+                logger.warning(
+                    "Wit.ai request failed, attempt %d/%d: %s", attempt + 1, _MAX_RETRIES, exc
+                )
+            else:
+                if response.status_code == http.HTTPStatus.OK:
+                    data = response.json()
+                    if "error" in data:
+                        raise WitError(f"Wit.ai responded with an error: {data['error']}")
+                    return data
+                if (
+                    response.status_code != http.HTTPStatus.TOO_MANY_REQUESTS
+                    and response.status_code < _HTTP_5XX_MIN
+                ):
+                    raise WitError(
+                        f"Wit.ai error, status: {response.status_code}, body: {response.text[:300]}"
+                    )
+                logger.warning(
+                    "Wit.ai status %s, attempt %d/%d",
+                    response.status_code,
+                    attempt + 1,
+                    _MAX_RETRIES,
+                )
+            if attempt < _MAX_RETRIES - 1:
+                await asyncio.sleep(_retry_delay(response, attempt))
+        raise WitError(f"Wit.ai request failed after {_MAX_RETRIES} attempts")
+
+    async def aclose(self) -> None:
+        """Close the running loop's pool; other loops' pools are closed with their loop."""
+        client = self._clients.pop()
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+
+voice_translators: dict[str, WitClient] = {
+    ENGLISH: WitClient(settings.wit_en_token),
+    RUSSIAN: WitClient(settings.wit_ru_token),
+    SPANISH: WitClient(settings.wit_es_token),
+    GERMAN: WitClient(settings.wit_de_token),
 }
+
+
+async def close_clients() -> None:
+    """Close the running loop's pooled Wit.ai connections. Call on application shutdown."""
+    for translator in voice_translators.values():
+        await translator.aclose()
@@ -0,0 +1,73 @@
+"""
+CPU-bound audio steps run on the audio executor's workers.
+
+Imports only the stdlib, pydub and audioop (through the sibling audio modules), never the
+app config: a process worker loads this module on its own and gets every setting as an
+argument, so it computes exactly what the calling process asked for.
+"""
+
+import dataclasses
+import time
+import typing
+
+from src.transcription.audio import AudioSource, PcmAudio, decode_audio
+from src.transcription.chunking import plan_chunks
+from src.transcription.silence import trim_silence
+
+
+@dataclasses.dataclass(frozen=True)
+class TrimSettings:
+    enabled: bool
+    threshold_dbfs: float
+    min_pause_ms: int
+    keep_ms: int
+
+
+@dataclasses.dataclass
+class PreparedAudio:
+    raw_duration_ms: int
+    audio: PcmAudio  # truncated and silence-trimmed as configured
+    trimmed: bool  # audio is not the whole source: cut at max_ms or silence-trimmed
+
+
+def timed_call(fn: typing.Callable, *args: typing.Any) -> tuple[typing.Any, float]:
+    """Runs inside the worker; returns (result, seconds spent executing)."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def trim(audio: PcmAudio, settings: TrimSettings) -> PcmAudio:
+    if not settings.enabled:
+        return audio
+    return trim_silence(
+        audio,
+        threshold_dbfs=settings.threshold_dbfs,
+        min_pause_ms=settings.min_pause_ms,
+        keep_ms=settings.keep_ms,
+    )
+
+
+def prepare_audio(
+    source: AudioSource, audio_format: str, trim_settings: TrimSettings, max_ms: int | None
+) -> PreparedAudio:
+    """Decode once, at most max_ms of it, and trim silence."""
+    raw_audio = decode_audio(source, audio_format, max_ms)
+    audio = raw_audio
+    if max_ms is not None and max_ms < raw_audio.duration_ms:
+        audio = raw_audio.slice_ms(0, max_ms)  # the decoder may overshoot by a frame
+    audio = trim(audio, trim_settings)
+    # Decoding stopped at max_ms: the source may go on beyond the audio
+    truncated = max_ms is not None and raw_audio.duration_ms >= max_ms
+    return PreparedAudio(raw_audio.duration_ms, audio, trimmed=truncated or audio is not raw_audio)
+
+
+def trim_and_encode(chunk: PcmAudio, trim_settings: TrimSettings) -> tuple[int, bytes]:
+    """Streaming path: trim one chunk, return (speech_ms, wav); wav is empty if all silent."""
+    speech = trim(chunk, trim_settings)
+    return speech.duration_ms, speech.to_wav() if speech.duration_ms else b""
+
+
+def encode_wit_chunks(audio: PcmAudio, max_chunk_ms: int) -> list[bytes]:
+    """Plan silence-aware chunk boundaries and encode each chunk as WAV."""
+    return [audio.slice_ms(start, end).to_wav() for start, end in plan_chunks(audio, max_chunk_ms)]
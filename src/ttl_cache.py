@@ -0,0 +1,94 @@
+"""Bounded in-process LRU cache whose entries also expire after a fixed time."""
+
+import collections
+import dataclasses
+import time
+import typing
+
+MISSING: typing.Final = object()  # get() result for a miss; None is a valid cached value
+
+
+@dataclasses.dataclass
+class TtlCacheStats:
+    name: str
+    size: int
+    hits: int
+    misses: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TtlCache[K, V]:
+    """
+    LRU of at most maxsize entries, each valid for ttl_seconds after it was stored.
+
+    Meant for data that only this bot writes: writers call put() or invalidate() so the
+    local process never sees its own stale values, and the TTL bounds how long another
+    instance's write can go unnoticed. maxsize 0 disables caching.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: collections.OrderedDict[K, tuple[float, V]] = collections.OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        # Bumped by invalidate(): a read that started before is not stored (see put).
+        # Reset with a new epoch once it tracks more keys than the cache holds.
+        self._generations: dict[K, int] = {}
+        self._epoch = 0
+
+    def get(self, key: K) -> V | object:
+        """Cached value, or MISSING if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[1]
+
+    def generation(self, key: K) -> tuple[int, int]:
+        """Snapshot to pass to put() for a value read from the source after this call."""
+        return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key: K, value: V, generation: tuple[int, int] | None = None) -> None:
+        """
+        Store value; with generation, only if key was not invalidated since the snapshot.
+
+        A read that missed the cache may complete after a writer's invalidate(): storing
+        its result would bring the overwritten value back for the whole TTL.
+        """
+        if self.maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation(key):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+        if key not in self._generations and len(self._generations) >= max(1, self.maxsize):
+            self._generations.clear()
+            self._epoch += 1
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+        self._epoch += 1
+        self._hits = 0
+        self._misses = 0
+
+    def stats(self) -> TtlCacheStats:
+        return TtlCacheStats(
+            name=self.name, size=len(self._entries), hits=self._hits, misses=self._misses
+        )
@@ -0,0 +1,113 @@
+"""Everything the voice pipeline needs to know about the sender, loaded once per update."""
+
+import asyncio
+import dataclasses
+
+from src import const
+from src.config import settings
+from src.credits import has_unlimited_voice, resolve_tier
+from src.dto import AccountLink, UserCredits, UserSettings, UserTier
+from src.mongo import find_user_settings_many, get_user_roles
+
+
+@dataclasses.dataclass(frozen=True)
+class UserContext:
+    """
+    Snapshot of a user's settings, roles, credits record and account link.
+
+    Settings are read from two documents: the chat the message came from (language,
+    GPT command, provider) and the user's personal settings (cleanup, Obsidian, GitHub),
+    which are the same document in private chats. The balance is not part of the
+    snapshot: admission and billing always read it fresh.
+    """
+
+    user_id: str
+    chat_id: str
+    chat_settings: UserSettings
+    personal_settings: UserSettings
+    roles: frozenset[str]
+    credits: UserCredits | None
+    linked_whatsapp: str | None
+
+    @property
+    def settings_chat_id(self) -> str:
+        return self.personal_settings.chat_id
+
+    @property
+    def language(self) -> str:
+        return self.chat_settings.language or settings.default_language
+
+    @property
+    def gpt_command(self) -> str:
+        return self.chat_settings.command or settings.telegram_bot_command
+
+    @property
+    def preferred_provider(self) -> str | None:
+        return self.chat_settings.preferred_provider
+
+    @property
+    def auto_cleanup(self) -> bool:
+        return self.personal_settings.auto_cleanup
+
+    @property
+    def auto_categorize(self) -> bool:
+        return self.personal_settings.auto_categorize
+
+    @property
+    def save_to_obsidian(self) -> bool:
+        return self.personal_settings.save_to_obsidian
+
+    @property
+    def github_settings(self) -> dict[str, str]:
+        github = self.personal_settings.github_settings
+        return github if github and all(github.values()) else {}
+
+    @property
+    def is_blocked(self) -> bool:
+        return const.ROLE_BLOCKED in self.roles
+
+    @property
+    def tier(self) -> UserTier:
+        return resolve_tier(self.user_id, self.roles, self.credits)
+
+    @property
+    def has_unlimited_voice(self) -> bool:
+        return has_unlimited_voice(self.tier)
+
+
+def personal_chat_id(user_id: str, chat_id: str) -> str:
+    """Chat id holding the user's own settings: groups defer to the user's private chat."""
+    return f"u_{user_id}" if chat_id.startswith("g_") and user_id else chat_id
+
+
+async def _find_link(user_id: str) -> str | None:
+    doc = await AccountLink.get_motor_collection().find_one(
+        {"telegram_user_id": user_id}, projection={"whatsapp_phone": True, "_id": False}
+    )
+    return doc["whatsapp_phone"] if doc else None
+
+
+async def load_user_context(user_id: str, chat_id: str) -> UserContext:
+    """
+    Load the context with at most four concurrent queries instead of one per getter.
+
+    Settings usually come from the in-process settings cache.
+    """
+    settings_chat_id = personal_chat_id(user_id, chat_id)
+    by_chat, roles, credits, linked_whatsapp = await asyncio.gather(
+        find_user_settings_many([chat_id, settings_chat_id]),
+        get_user_roles(user_id),
+        UserCredits.find_one(UserCredits.user_id == user_id),
+        _find_link(user_id),
+    )
+    chat_settings = by_chat.get(chat_id) or UserSettings(chat_id=chat_id)
+    personal_settings = by_chat.get(settings_chat_id) or UserSettings(chat_id=settings_chat_id)
+    return UserContext(
+        user_id=user_id,
+        chat_id=chat_id,
+        chat_settings=chat_settings,
+        personal_settings=personal_settings,
+        roles=frozenset(roles),
+        credits=credits,
+        linked_whatsapp=linked_whatsapp,
+    )
@@ -1,6 +1,7 @@
 """WhatsApp message handlers."""
 
 import asyncio
+import functools
 import logging
 
 import httpx
@@ -13,6 +14,9 @@ from src.categorization import categorize_note
 from src.config import settings
 from src.credits import get_user_tier
 from src.dto import UserTier
+from src.governor import should_shed
+from src.jobs import enqueue_job, job_pool
+from src.localization import translates
 from src.mongo import (
     get_auto_categorize,
     get_auto_cleanup,
@@ -23,11 +27,14 @@ from src.mongo import (
 )
 from src.obsidian import save_transcription_to_obsidian
 from src.transcript_cleanup import cleanup_transcript
+from src.transcription.cache import content_id, transcription_cache, transcription_key
 from src.transcription.service import transcribe_audio
-from src.whatsapp.client import WHATSAPP_CHAT_PREFIX
+from src.whatsapp.client import WHATSAPP_CHAT_PREFIX, get_whatsapp_client
 
 logger = logging.getLogger(__name__)
 
+JOB_WHATSAPP_VOICE = "whatsapp_voice"
+
 
 def register_handlers(wa: WhatsApp) -> None:
     """Register WhatsApp message handlers."""
@@ -68,21 +75,59 @@ async def handle_link_command(wa: WhatsApp, message: Message) -> None:
         )
 
 
-async def handle_voice_message(wa: WhatsApp, message: Message) -> None:
-    """Handle voice message from WhatsApp."""
-    phone_number = message.from_user.wa_id
-    chat_id = f"{WHATSAPP_CHAT_PREFIX}{phone_number}"
+async def _get_tier(phone_number: str) -> UserTier:
+    """Tier of the linked Telegram account; unlinked numbers are free."""
+    telegram_user_id = await get_linked_telegram_id(phone_number)
+    if not telegram_user_id:
+        return UserTier.FREE
+    return await get_user_tier(telegram_user_id)
 
+
+async def handle_voice_message(wa: WhatsApp, message: Message) -> None:
+    """Handle voice message from WhatsApp: queue it, or process inline."""
     # Get audio from voice or audio message
     audio = message.voice or message.audio
     if not audio:
         return
 
+    phone_number = message.from_user.wa_id
+    chat_id = f"{WHATSAPP_CHAT_PREFIX}{phone_number}"
+    tier = await _get_tier(phone_number)
+    if await should_shed(tier):
+        language = await get_chat_language(chat_id)
+        text = translates["server_busy"].get(language, translates["server_busy"]["en"])
+        await asyncio.to_thread(wa.send_message, to=phone_number, text=text)
+        return
+
+    if job_pool.running:
+        # Durable path: the webhook returns at once, the worker pool does the rest
+        await enqueue_job(
+            JOB_WHATSAPP_VOICE,
+            {"phone_number": phone_number, "media_id": audio.id},
+            chat_id=chat_id,
+            tier=tier,
+            user_id=chat_id,
+        )
+        return
+    await process_voice_message(wa, phone_number, audio.id)
+
+
+async def run_voice_job(payload: dict) -> None:
+    """Job handler for queued WhatsApp voice messages."""
+    wa = get_whatsapp_client()
+    if wa is None:
+        raise RuntimeError("WhatsApp is not configured")
+    await process_voice_message(wa, payload["phone_number"], payload["media_id"])
+
+
+async def process_voice_message(wa: WhatsApp, phone_number: str, media_id: str) -> None:
+    """Voice pipeline: download, transcription, cleanup, Obsidian, reply."""
+    chat_id = f"{WHATSAPP_CHAT_PREFIX}{phone_number}"
     language = await get_chat_language(chat_id)
 
     # Download voice file from WhatsApp
     try:
-        media_url = wa.get_media_url(audio.id)
+        media_url = await asyncio.to_thread(wa.get_media_url, media_id)
         async with httpx.AsyncClient() as client:
             response = await client.get(
                 media_url,
@@ -94,28 +139,30 @@ async def handle_voice_message(wa: WhatsApp, message: Message) -> None:
         logger.error("Failed to download WhatsApp audio: %s", e)
         return
 
-    # WhatsApp voice messages are opus in ogg container
-    text, _, _ = await transcribe_audio(audio_bytes, audio_format="ogg", language=language)
+    # No stable file id across forwards on WhatsApp — key the cache by content.
+    # WhatsApp voice messages are opus in ogg container.
+    result = await transcription_cache.get_or_transcribe(
+        transcription_key(content_id(audio_bytes), language, const.PROVIDER_WIT),
+        functools.partial(transcribe_audio, audio_bytes, audio_format="ogg", language=language),
+    )
+    text = result.text
 
     if not text:
         logger.debug("Empty WhatsApp voice message from %s", phone_number)
         return
 
     # Cleanup: always for Obsidian, conditionally for reply (only for linked paid users)
-    telegram_user_id = await get_linked_telegram_id(phone_number)
     raw_text = text
     obsidian_text = text
-    if telegram_user_id:
-        tier = await get_user_tier(telegram_user_id)
-        if tier != UserTier.FREE:
-            recent_context = await get_recent_transcriptions(chat_id)
-            if await get_auto_cleanup(chat_id):
-                text = await cleanup_transcript(raw_text, context=recent_context)
-                obsidian_text = text  # no double call
-            else:
-                # Clean silently for Obsidian only
-                obsidian_text = await cleanup_transcript(raw_text, context=recent_context)
-            await save_recent_transcription(chat_id, obsidian_text)
+    if await _get_tier(phone_number) != UserTier.FREE:
+        recent_context = await get_recent_transcriptions(chat_id)
+        if await get_auto_cleanup(chat_id):
+            text = await cleanup_transcript(raw_text, context=recent_context)
+            obsidian_text = text  # no double call
+        else:
+            # Clean silently for Obsidian only
+            obsidian_text = await cleanup_transcript(raw_text, context=recent_context)
+        await save_recent_transcription(chat_id, obsidian_text)
 
     original_for_obsidian = raw_text if raw_text != obsidian_text else None
     saved, filename = await save_transcription_to_obsidian(
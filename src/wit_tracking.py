@@ -1,41 +1,44 @@
 """Wit.ai monthly usage tracking."""
 
+import collections
+
 from src.config import settings
+from src.counters import usage_counters
 from src.credits import current_month_key
 from src.dto import WitUsageStats
 
 
-async def increment_wit_usage(count: int = 1, language: str = "ru") -> int:
-    month_key = current_month_key()
-    record = await WitUsageStats.find_one(
-        WitUsageStats.month_key == month_key,
-        WitUsageStats.language == language,
+async def increment_wit_usage(count: int = 1, language: str = "ru") -> None:
+    await usage_counters.add(
+        WitUsageStats,
+        {"month_key": current_month_key(), "language": language},
+        shards=settings.stats_counter_shards,
+        request_count=count,
     )
-    if not record:
-        record = WitUsageStats(month_key=month_key, language=language, request_count=count)
-        await record.insert()
-    else:
-        record.request_count += count
-        await record.save()
-    return record.request_count
 
 
 async def get_wit_usage_this_month(language: str) -> int:
+    """Requests this month over all shards, including this instance's not yet written ones."""
     month_key = current_month_key()
-    record = await WitUsageStats.find_one(
+    shards = await WitUsageStats.find(
         WitUsageStats.month_key == month_key,
         WitUsageStats.language == language,
-    )
-    if not record:
-        return 0
-    return record.request_count
+    ).to_list()
+    pending = usage_counters.pending(WitUsageStats, {"month_key": month_key, "language": language})
+    return sum(shard.request_count for shard in shards) + pending.get("request_count", 0)
 
 
 async def get_all_wit_usage_this_month() -> dict[str, int]:
     """Return per-language request counts for the current month."""
     month_key = current_month_key()
-    records = await WitUsageStats.find(WitUsageStats.month_key == month_key).to_list()
-    return {r.language: r.request_count for r in records if r.language}
+    usage: collections.Counter[str] = collections.Counter()
+    for shard in await WitUsageStats.find(WitUsageStats.month_key == month_key).to_list():
+        if shard.language:
+            usage[shard.language] += shard.request_count
+    for key, increments in usage_counters.pending_for(WitUsageStats):
+        if key["month_key"] == month_key and key["language"]:
+            usage[key["language"]] += increments["request_count"]
+    return dict(usage)
 
 
 async def is_wit_available(language: str) -> bool:
@@ -2,14 +2,19 @@ import pytest
 from beanie import init_beanie
 from mongomock_motor import AsyncMongoMockClient
 
+from src.counters import usage_counters
+from src.credits import voice_gate
 from src.dto import (
     AccountLink,
     AlertState,
     BotConfig,
+    CachedTranscription,
     LinkAttempt,
     LinkCode,
+    MessageProgress,
     MonthlyStats,
-    RecentTranscription,
+    QueuedJob,
+    RecentTranscriptions,
     UsedTrial,
     UserCredits,
     UserMonthlyUsage,
@@ -17,6 +22,13 @@ from src.dto import (
     UserSettings,
     WitUsageStats,
 )
+from src.mongo import (
+    bot_config_cache,
+    recent_transcriptions_cache,
+    role_index,
+    user_settings_cache,
+)
+from src.transcription.cache import transcription_cache
 
 ALL_TEST_MODELS = [
     UserSettings,
@@ -30,8 +42,11 @@ ALL_TEST_MODELS = [
     LinkCode,
     LinkAttempt,
     UserMonthlyUsage,
-    RecentTranscription,
+    RecentTranscriptions,
     BotConfig,
+    CachedTranscription,
+    MessageProgress,
+    QueuedJob,
 ]
 
 pytest_plugins = [
@@ -47,3 +62,10 @@ async def init_db():
     yield
     for model in ALL_TEST_MODELS:
         await model.delete_all()
+    transcription_cache.clear()
+    voice_gate.clear()
+    user_settings_cache.clear()
+    bot_config_cache.clear()
+    role_index.clear()
+    recent_transcriptions_cache.clear()
+    usage_counters.clear()
@@ -3,6 +3,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 import src.ai_client
+from src.transcription.service import TranscriptionResult
 
 
 @pytest.fixture
@@ -67,6 +68,9 @@ def mock_callback_query():
 def mock_telegram_voice():
     """Mock Telegram voice file with download capability."""
     voice = MagicMock()
+    voice.file_unique_id = "AgADvoice"
+    voice.duration = 5
+    voice.file_size = 8_000
     voice.get_file = AsyncMock()
     voice.get_file.return_value.download_as_bytearray = AsyncMock(return_value=b"fake_audio_data")
     return voice
@@ -76,6 +80,8 @@ def mock_telegram_voice():
 def mock_telegram_audio():
     """Mock Telegram audio file with download capability."""
     audio = MagicMock()
+    audio.file_unique_id = "AgADaudio"
+    audio.file_size = 480_000
     audio.get_file = AsyncMock()
     audio.get_file.return_value.download_as_bytearray = AsyncMock(return_value=b"fake_audio_data")
     audio.duration = 30
@@ -173,7 +179,7 @@ def voice_external_mocks():
     with (
         patch(
             "src.telegram.voice.transcribe_audio",
-            AsyncMock(return_value=("Hello world", 5, 1)),
+            AsyncMock(return_value=TranscriptionResult("Hello world", 5, 5, 1)),
         ) as mock_transcribe,
         patch("src.telegram.voice.send_response", AsyncMock()) as mock_send,
         patch(
@@ -230,7 +236,7 @@ def whatsapp_voice_external_mocks(mock_httpx_download_response):
         patch("src.whatsapp.handlers.httpx.AsyncClient") as mock_client_class,
         patch(
             "src.whatsapp.handlers.transcribe_audio",
-            AsyncMock(return_value=("Hello world", 5, 1)),
+            AsyncMock(return_value=TranscriptionResult("Hello world", 5, 5, 1)),
         ) as mock_transcribe,
         patch(
             "src.whatsapp.handlers.save_transcription_to_obsidian",
@@ -1,7 +1,8 @@
 """Tests for account linking between Telegram and WhatsApp."""
 
+import asyncio
 from datetime import UTC, datetime, timedelta
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from src.account_linking import (
     LINK_CODE_LENGTH,
@@ -13,7 +14,7 @@ from src.account_linking import (
     get_linked_whatsapp,
     unlink,
 )
-from src.dto import LinkAttempt, LinkCode
+from src.dto import AccountLink, LinkAttempt, LinkCode
 from src.mongo import set_chat_language
 from src.telegram.handlers import link_whatsapp, unlink_whatsapp
 from src.whatsapp.handlers import handle_link_command
@@ -85,6 +86,16 @@ class TestAccountLinking:
         result = await confirm_link(new_code, "79001111111")
         assert result == "success"
 
+    async def test_code_held_by_another_user_redrawn(self):
+        """A drawn code that is already issued is replaced by a fresh one."""
+        with patch("src.account_linking.secrets.choice", side_effect=list("1" * 12 + "2" * 6)):
+            first = await generate_link_code("collide_a")
+            second = await generate_link_code("collide_b")
+
+        assert (first, second) == ("111111", "222222")
+        assert await confirm_link(first, "79007777777") == "success"
+        assert await get_linked_whatsapp("collide_a") == "79007777777"
+
     async def test_relinking_replaces_old_link(self):
         """New link replaces existing one for the same Telegram user."""
         user_a = "aaa111"
@@ -119,6 +130,18 @@ class TestAccountLinking:
         assert await get_linked_telegram_id(phone) == user_b
         assert await get_linked_whatsapp(user_a) is None
 
+    async def test_concurrent_links_of_one_phone_keep_one(self):
+        """Two accounts confirming the same phone at once leave a single 1:1 link."""
+        phone = "79004444444"
+        codes = [await generate_link_code(user) for user in ("userC", "userD")]
+
+        results = await asyncio.gather(*(confirm_link(code, phone) for code in codes))
+
+        assert results == ["success", "success"]
+        links = await AccountLink.find(AccountLink.whatsapp_phone == phone).to_list()
+        assert len(links) == 1
+        assert await get_linked_whatsapp(links[0].telegram_user_id) == phone
+
     async def test_unlink_nonexistent_returns_false(self):
         """Unlinking when no link exists returns False."""
         result = await unlink("nonexistent_user")
@@ -226,6 +249,15 @@ class TestRateLimiting:
         result = await confirm_link("000000", phone)
         assert result == "rate_limited"
 
+    async def test_concurrent_first_attempts_share_one_record(self):
+        """Parallel first attempts from one phone are counted on a single record."""
+        phone = "79008888888"
+
+        results = await asyncio.gather(*(confirm_link("000000", phone) for _ in range(3)))
+
+        assert results == ["invalid"] * 3
+        assert await LinkAttempt.find(LinkAttempt.whatsapp_phone == phone).count() == 1
+
     async def test_rate_limit_blocks_valid_code(self):
         """Even valid code is rejected when rate limited."""
         phone = "79006666666"
@@ -1,6 +1,8 @@
 """Tests for admin role, statistics, and user management commands."""
 
-from unittest.mock import patch
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
 
 from src import const
 from src.alerts import check_and_send_alerts
@@ -9,7 +11,7 @@ from src.credits import (
     add_credits,
     admin_add_credits,
     current_month_key,
-    deduct_credits,
+    get_monthly_stats,
     get_total_credits,
     has_unlimited_access,
     has_unlimited_voice_access,
@@ -21,9 +23,17 @@ from src.credits import (
     is_tester_user,
     is_vip_user,
     record_groq_usage,
+    reserve_credits,
+    settle_credits,
+)
+from src.dto import AlertState, MonthlyStats, UserCredits, UserRole, UserTier, WitUsageStats
+from src.mongo import (
+    RoleIndex,
+    add_user_role,
+    get_users_by_role,
+    remove_user_role,
+    role_index,
 )
-from src.dto import AlertState, MonthlyStats, UserCredits, UserTier, WitUsageStats
-from src.mongo import add_user_role, get_users_by_role, remove_user_role
 from src.telegram.admin import (
     add_credits_command,
     add_tester_command,
@@ -147,6 +157,60 @@ class TestUserRoleCrud:
         vips = await get_users_by_role(const.ROLE_VIP)
         assert vips == ["100"]
 
+    async def test_concurrent_role_adds_store_one(self):
+        """Simultaneous grants of the same role upsert one document without errors."""
+        await asyncio.gather(*(add_user_role("101", const.ROLE_VIP, "admin") for _ in range(3)))
+
+        assert await UserRole.find(UserRole.user_id == "101").count() == 1
+
+
+class TestRoleIndex:
+    async def test_checks_do_not_query_after_load(self):
+        await add_user_role("idx_vip", const.ROLE_VIP, "admin")
+        await add_user_role("idx_blocked", const.ROLE_BLOCKED, "admin")
+        await role_index.reload()
+
+        with patch.object(UserRole, "get_motor_collection", side_effect=AssertionError("query")):
+            assert await is_vip_user("idx_vip")
+            assert await is_blocked_user("idx_blocked")
+            assert not await is_tester_user("idx_vip")
+            assert await has_unlimited_voice_access("idx_vip")
+
+    async def test_local_changes_apply_immediately(self):
+        await role_index.reload()
+
+        await add_user_role("idx_tester", const.ROLE_TESTER, "admin")
+        assert await is_tester_user("idx_tester")
+
+        await remove_user_role("idx_tester", const.ROLE_TESTER)
+        assert not await is_tester_user("idx_tester")
+
+    async def test_other_instance_changes_seen_after_refresh(self):
+        index = RoleIndex(refresh_seconds=60)
+        await index.reload()
+        await UserRole(user_id="idx_remote", role=const.ROLE_VIP, added_by="admin").insert()
+
+        assert not await index.has("idx_remote", const.ROLE_VIP)
+
+        with patch("src.mongo.time.monotonic", return_value=time.monotonic() + 61):
+            assert await index.has("idx_remote", const.ROLE_VIP)
+            assert await index.roles_of("idx_remote") == {const.ROLE_VIP}
+
+    async def test_change_during_reload_keeps_index_stale(self):
+        index = RoleIndex(refresh_seconds=60)
+
+        async def _cursor():
+            index.add("idx_mid", const.ROLE_VIP)  # lands after the snapshot was read
+            return
+            yield
+
+        collection = MagicMock()
+        collection.find.return_value = _cursor()
+        with patch.object(UserRole, "get_motor_collection", return_value=collection):
+            await index.reload()
+
+        assert index.loaded and not index._fresh()
+
 
 class TestAdminCommands:
     async def test_admin_hub_shown_to_admin(self, mock_private_update, mock_context):
@@ -392,6 +456,7 @@ class TestStatsCommand:
         # Verify real stats are shown in response
         assert "3" in call_text  # transcriptions count
         assert "50" in call_text  # credits sold
+        assert "Audio pool" in call_text  # runtime metrics
 
     async def test_non_admin_ignored(self, mock_private_update, mock_context):
         """Non-admin cannot view system stats."""
@@ -508,7 +573,7 @@ class TestUserStatsTracking:
         await record_groq_usage(45)
 
         month_key = current_month_key()
-        stats = await MonthlyStats.find_one(MonthlyStats.month_key == month_key)
+        stats = await get_monthly_stats(month_key)
         assert stats is not None
         assert stats.groq_audio_seconds >= 45
 
@@ -529,7 +594,7 @@ class TestUserStatsTracking:
         assert record.purchased_credits == 150
 
         # 3. Spend credits - track total_tokens_used
-        result = await deduct_credits(user_id, 30)
+        result = await settle_credits(await reserve_credits(user_id, 30), 30)
         assert result.overdraft is False
         record = await UserCredits.find_one(UserCredits.user_id == user_id)
         assert record.total_tokens_used == 30
@@ -0,0 +1,74 @@
+"""Tests for the silence-aware Wit.ai chunk planner."""
+
+import array
+import itertools
+
+from src.transcription.audio import SAMPLE_RATE, PcmAudio
+from src.transcription.chunking import plan_chunks
+
+MAX_CHUNK_MS = 19800
+LOUD = 8000
+
+
+def _audio(*pieces: tuple[int, int]) -> PcmAudio:
+    """Build PCM from (duration_ms, amplitude) pieces; amplitude 0 is silence."""
+    samples = array.array("h")
+    for duration_ms, amplitude in pieces:
+        count = duration_ms * SAMPLE_RATE // 1000
+        # Square wave: RMS equals amplitude
+        samples.extend(amplitude if i % 2 else -amplitude for i in range(count))
+    return PcmAudio(samples)
+
+
+def test_short_audio_single_chunk():
+    assert plan_chunks(_audio((5000, LOUD)), MAX_CHUNK_MS) == [(0, 5000)]
+
+
+def test_empty_audio_no_chunks():
+    assert plan_chunks(_audio(), MAX_CHUNK_MS) == []
+
+
+def test_splits_inside_pause_before_limit():
+    """Split lands in the pause, not at the fixed 19.8 s offset mid-word."""
+    audio = _audio((17000, LOUD), (400, 0), (10000, LOUD))
+
+    bounds = plan_chunks(audio, MAX_CHUNK_MS)
+
+    assert len(bounds) == 2
+    split = bounds[0][1]
+    assert 17000 <= split <= 17400
+    assert bounds[1] == (split, 27400)
+
+
+def test_chunks_respect_limit_and_cover_audio():
+    """Every chunk fits under the limit, chunks are contiguous and cover everything."""
+    audio = _audio((61000, LOUD))
+
+    bounds = plan_chunks(audio, MAX_CHUNK_MS)
+
+    assert bounds[0][0] == 0
+    assert bounds[-1][1] == audio.duration_ms
+    for (_, end), (next_start, _) in itertools.pairwise(bounds):
+        assert end == next_start
+    assert all(end - start <= MAX_CHUNK_MS for start, end in bounds)
+
+
+def test_uses_minimum_chunk_count():
+    """A pause early in the window is ignored when using it would add a request."""
+    # 39 s total fits in 2 chunks only if the first split is after 19.2 s
+    audio = _audio((16000, LOUD), (300, 0), (22700, LOUD))
+
+    bounds = plan_chunks(audio, MAX_CHUNK_MS)
+
+    assert len(bounds) == 2
+    assert bounds[0][1] >= 39000 - MAX_CHUNK_MS
+
+
+def test_uniform_audio_packs_to_limit():
+    """Without pauses, splits go as late as allowed (ties prefer later frames)."""
+    audio = _audio((45000, LOUD))
+
+    bounds = plan_chunks(audio, MAX_CHUNK_MS)
+
+    assert len(bounds) == 3
+    assert MAX_CHUNK_MS - bounds[0][1] < 20
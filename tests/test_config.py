@@ -1,4 +1,9 @@
-from src.config import _parse_comma_separated_ids
+from src.config import (
+    BOT_API_MAX_FILE_BYTES,
+    LOCAL_BOT_API_MAX_FILE_BYTES,
+    Settings,
+    _parse_comma_separated_ids,
+)
 
 
 class TestParseCommaSeparatedIds:
@@ -19,3 +24,19 @@ class TestParseCommaSeparatedIds:
 
     def test_empty_segments_ignored(self):
         assert _parse_comma_separated_ids("123,,456,") == {"123", "456"}
+
+
+class TestVoiceFileSizeLimit:
+    def test_cloud_bot_api_limit_by_default(self):
+        config = Settings(telegram_api_base_url="", max_voice_file_bytes=0)
+        assert not config.telegram_local_mode
+        assert config.voice_file_size_limit == BOT_API_MAX_FILE_BYTES
+
+    def test_local_server_lifts_limit(self):
+        config = Settings(telegram_api_base_url="http://bot-api:8081", max_voice_file_bytes=0)
+        assert config.telegram_local_mode
+        assert config.voice_file_size_limit == LOCAL_BOT_API_MAX_FILE_BYTES
+
+    def test_explicit_limit_wins(self):
+        config = Settings(telegram_api_base_url="http://bot-api:8081", max_voice_file_bytes=1000)
+        assert config.voice_file_size_limit == 1000
@@ -0,0 +1,168 @@
+"""Tests for buffered, sharded usage counters and their bulk flush."""
+
+import inspect
+from unittest.mock import patch
+
+import pytest
+from mongomock.collection import BulkOperationBuilder
+
+from src.config import settings
+from src.counters import CounterBuffer, usage_counters
+from src.credits import (
+    current_month_key,
+    get_monthly_stats,
+    increment_payment_stats,
+    increment_transcription_stats,
+)
+from src.dto import MonthlyStats, UserCredits, WitUsageStats
+from src.wit_tracking import (
+    get_all_wit_usage_this_month,
+    get_wit_usage_this_month,
+    increment_wit_usage,
+)
+
+
+@pytest.fixture(autouse=True)
+def _mongomock_bulk_update_sort():
+    """mongomock's bulk builder predates the sort argument newer pymongo passes (always None)."""
+    add_update = BulkOperationBuilder.add_update
+    if "sort" in inspect.signature(add_update).parameters:
+        yield
+        return
+
+    def _add_update(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    with patch.object(BulkOperationBuilder, "add_update", _add_update):
+        yield
+
+
+async def _stored_transcriptions() -> int:
+    stats = await get_monthly_stats(current_month_key())
+    return stats.total_transcriptions if stats else 0
+
+
+class TestCounterBuffer:
+    async def test_writes_through_until_started(self):
+        await increment_transcription_stats()
+
+        assert await _stored_transcriptions() == 1
+
+    async def test_buffered_until_flush(self):
+        buffer = CounterBuffer(interval_seconds=60)
+        await buffer.start()
+        try:
+            for _ in range(3):
+                await buffer.add(MonthlyStats, {"month_key": "2026-01"}, total_transcriptions=1)
+            await buffer.add(UserCredits, {"user_id": "cnt_1"}, total_audio_seconds=30)
+            await buffer.add(UserCredits, {"user_id": "cnt_1"}, total_audio_seconds=15)
+
+            assert await get_monthly_stats("2026-01") is None
+            assert buffer.pending(UserCredits, {"user_id": "cnt_1"}) == {"total_audio_seconds": 45}
+
+            await buffer.flush()
+        finally:
+            await buffer.stop()
+
+        assert (await get_monthly_stats("2026-01")).total_transcriptions == 3
+        record = await UserCredits.find_one(UserCredits.user_id == "cnt_1")
+        assert record.total_audio_seconds == 45
+        stats = buffer.stats()
+        assert (stats.pending, stats.flushes, stats.writes) == (0, 1, 2)
+
+    async def test_stop_flushes_pending(self):
+        buffer = CounterBuffer(interval_seconds=60)
+        await buffer.start()
+        await buffer.add(MonthlyStats, {"month_key": "2026-02"}, groq_audio_seconds=40)
+
+        await buffer.stop()
+
+        assert (await get_monthly_stats("2026-02")).groq_audio_seconds == 40
+        assert not buffer.running
+
+    async def test_failed_flush_is_retried(self):
+        buffer = CounterBuffer(interval_seconds=60)
+        await buffer.start()
+        await buffer.add(MonthlyStats, {"month_key": "2026-03"}, total_transcriptions=2)
+        collection = MonthlyStats.get_motor_collection()
+
+        with patch.object(
+            type(collection), "bulk_write", side_effect=ConnectionError("mongo down")
+        ):
+            await buffer.flush()
+
+        assert buffer.pending(MonthlyStats, {"month_key": "2026-03"}) == {"total_transcriptions": 2}
+        await buffer.stop()
+        assert (await get_monthly_stats("2026-03")).total_transcriptions == 2
+        assert buffer.stats().failures == 1
+
+    async def test_disabled_interval_never_buffers(self):
+        buffer = CounterBuffer(interval_seconds=0)
+        await buffer.start()
+
+        await buffer.add(MonthlyStats, {"month_key": "2026-04"}, total_transcriptions=1)
+
+        assert not buffer.running
+        assert (await get_monthly_stats("2026-04")).total_transcriptions == 1
+
+
+class TestPendingReads:
+    async def test_wit_usage_includes_unflushed_requests(self):
+        month_key = current_month_key()
+        await WitUsageStats(month_key=month_key, language="ru", request_count=5).insert()
+        await usage_counters.start()
+        try:
+            await usage_counters.add(
+                WitUsageStats, {"month_key": month_key, "language": "ru"}, request_count=2
+            )
+            await usage_counters.add(
+                WitUsageStats, {"month_key": month_key, "language": "en"}, request_count=1
+            )
+
+            assert await get_wit_usage_this_month("ru") == 7
+            assert await get_all_wit_usage_this_month() == {"ru": 7, "en": 1}
+        finally:
+            await usage_counters.stop()
+
+        assert await get_wit_usage_this_month("ru") == 7
+
+
+class TestShardedCounters:
+    async def test_writes_spread_over_shards_and_reads_sum_them(self):
+        month_key = current_month_key()
+        # Written before sharding: no shard field
+        await MonthlyStats.get_motor_collection().insert_one(
+            {"month_key": month_key, "total_transcriptions": 5}
+        )
+        with (
+            patch.object(settings, "stats_counter_shards", 4),
+            patch("src.counters.random.randrange", side_effect=[0, 1, 2, 3, 1]),
+        ):
+            for _ in range(4):
+                await increment_transcription_stats()
+            await increment_payment_stats(7)
+
+        assert await MonthlyStats.find(MonthlyStats.month_key == month_key).count() == 5
+        stats = await get_monthly_stats(month_key)
+        assert (stats.total_transcriptions, stats.total_payments) == (9, 1)
+        assert stats.total_credits_sold == 7
+
+    async def test_wit_usage_summed_over_shards(self):
+        with patch.object(settings, "stats_counter_shards", 3):
+            for _ in range(6):
+                await increment_wit_usage(2, "de")
+            await increment_wit_usage(1, "en")
+
+        assert await get_wit_usage_this_month("de") == 12
+        assert await get_all_wit_usage_this_month() == {"de": 12, "en": 1}
+
+    async def test_buffered_shard_chosen_at_flush(self):
+        buffer = CounterBuffer(interval_seconds=60)
+        await buffer.start()
+        for _ in range(5):
+            await buffer.add(MonthlyStats, {"month_key": "2026-05"}, shards=8, total_payments=1)
+
+        await buffer.stop()
+
+        assert buffer.stats().writes == 1
+        assert (await get_monthly_stats("2026-05")).total_payments == 5
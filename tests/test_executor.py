@@ -0,0 +1,125 @@
+"""Tests for the off-loop audio executor."""
+
+import array
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src.transcription.audio import SAMPLE_RATE, PcmAudio
+from src.transcription.executor import EXECUTOR_PROCESS, EXECUTOR_THREAD, AudioExecutor
+from src.transcription.worker import TrimSettings, prepare_audio
+
+
+def _blocking_work(seconds: float) -> str:
+    time.sleep(seconds)
+    return threading.current_thread().name
+
+
+@pytest.fixture
+def executor():
+    pool = AudioExecutor(kind=EXECUTOR_THREAD, workers=2, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+async def test_runs_off_event_loop_thread(executor):
+    worker_name = await executor.run(_blocking_work, 0)
+
+    assert worker_name != threading.current_thread().name
+    assert worker_name.startswith("audio")
+
+
+async def test_event_loop_stays_responsive(executor):
+    """Loop ticks while a blocking task runs in the pool."""
+    ticks = 0
+
+    async def _ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticker = asyncio.create_task(_ticker())
+    await executor.run(_blocking_work, 0.1)
+    ticker.cancel()
+
+    assert ticks > 5
+
+
+async def test_bounded_queue_applies_backpressure(executor):
+    """workers + max_queue tasks are submitted; the rest wait on the loop."""
+    tasks = [asyncio.create_task(executor.run(_blocking_work, 0.05)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+
+    stats = executor.stats()
+    assert stats.running == 2
+    assert stats.queue_depth == 1
+    assert stats.waiting == 2
+
+    await asyncio.gather(*tasks)
+    stats = executor.stats()
+    assert stats.completed == 5
+    assert stats.waiting == stats.queue_depth == stats.running == 0
+    assert stats.max_task_seconds >= 0.05
+
+
+async def test_worker_exception_propagates(executor):
+    def _fail():
+        raise ValueError("corrupt audio")
+
+    with pytest.raises(ValueError, match="corrupt audio"):
+        await executor.run(_fail)
+
+    assert executor.stats().running == 0
+
+
+async def test_pool_usable_from_another_event_loop(executor):
+    """The WhatsApp webhook loop submits work while the Telegram loop holds slots."""
+    busy = [asyncio.create_task(executor.run(_blocking_work, 0.05)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    async def _other_loop() -> str:
+        async with asyncio.timeout(2):
+            return await executor.run(_blocking_work, 0)
+
+    assert (await asyncio.to_thread(asyncio.run, _other_loop())).startswith("audio")
+    await asyncio.gather(*busy)
+
+
+def test_unknown_kind_falls_back_to_threads():
+    pool = AudioExecutor(kind="interpreter", workers=1, max_queue=0)
+
+    assert pool._get_pool()._thread_name_prefix == "audio"
+    pool.shutdown()
+
+
+def test_worker_module_does_not_load_app_config():
+    """Process workers import the worker functions without settings or pydantic."""
+    code = (
+        "import sys, src.transcription.worker; "
+        "sys.exit(bool({'src.config', 'pydantic'} & set(sys.modules)))"
+    )
+
+    result = subprocess.run([sys.executable, "-c", code], check=False)  # noqa: S603 - fixed input
+    assert result.returncode == 0
+
+
+async def test_process_pool_prepares_audio():
+    """Real process pool: WAV decodes without ffmpeg, trim settings travel as arguments."""
+    silence = array.array("h", [0] * SAMPLE_RATE * 2)
+    tone = array.array("h", [8000, -8000] * (SAMPLE_RATE // 2) * 3)
+    wav = PcmAudio(silence + tone + silence).to_wav()
+    trim = TrimSettings(enabled=True, threshold_dbfs=-45.0, min_pause_ms=1000, keep_ms=400)
+    pool = AudioExecutor(kind=EXECUTOR_PROCESS, workers=1, max_queue=0)
+    try:
+        prepared = await pool.run(prepare_audio, wav, "wav", trim, None)
+    finally:
+        pool.shutdown()
+
+    assert prepared.raw_duration_ms == 7000
+    assert prepared.trimmed
+    assert prepared.audio.duration_ms == 3400
@@ -0,0 +1,127 @@
+"""Tests for per-stage concurrency limits and free-tier load shedding."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from src.config import settings
+from src.dto import UserTier
+from src.governor import STAGE_LLM, STAGE_PROVIDER, ConcurrencyGovernor, should_shed
+from src.jobs import JobWorkerPool, enqueue_job
+
+
+class TestConcurrencyGovernor:
+    async def test_stage_limits_concurrency(self):
+        governor = ConcurrencyGovernor({STAGE_LLM: 2})
+        running = 0
+        peak = 0
+
+        async def _call():
+            nonlocal running, peak
+            async with governor.stage(STAGE_LLM):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(_call() for _ in range(5)))
+
+        assert peak == 2
+        (stats,) = governor.stats()
+        assert (stats.completed, stats.running, stats.waiting) == (5, 0, 0)
+
+    async def test_slots_not_shared_across_event_loops(self):
+        """A slot held on the Telegram loop neither blocks nor breaks the WhatsApp loop."""
+        governor = ConcurrencyGovernor({STAGE_LLM: 1})
+
+        async def _other_loop():
+            async with asyncio.timeout(1), governor.stage(STAGE_LLM):
+                return True
+
+        async with governor.stage(STAGE_LLM):
+            assert await asyncio.to_thread(asyncio.run, _other_loop())
+
+    async def test_zero_limit_is_unlimited(self):
+        governor = ConcurrencyGovernor({STAGE_LLM: 0})
+        entered = 0
+
+        async def _call():
+            nonlocal entered
+            async with governor.stage(STAGE_LLM):
+                entered += 1
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(_call()) for _ in range(10)]
+        await asyncio.sleep(0)
+
+        assert entered == 10
+        assert governor.expected_wait_seconds() == 0
+        await asyncio.gather(*tasks)
+
+    async def test_expected_wait_grows_with_waiters(self):
+        governor = ConcurrencyGovernor({STAGE_PROVIDER: 1, STAGE_LLM: 4})
+        async with governor.stage(STAGE_PROVIDER):
+            await asyncio.sleep(0.01)  # establishes the average stage time
+        release = asyncio.Event()
+
+        async def _hold():
+            async with governor.stage(STAGE_PROVIDER):
+                await release.wait()
+
+        tasks = [asyncio.create_task(_hold()) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        provider = governor.stats()[0]
+        assert (provider.running, provider.waiting) == (1, 2)
+        assert governor.expected_wait_seconds() == provider.expected_wait_seconds > 0
+        release.set()
+        await asyncio.gather(*tasks)
+        assert governor.expected_wait_seconds() == 0
+
+    async def test_cancelled_waiter_is_not_counted(self):
+        governor = ConcurrencyGovernor({STAGE_LLM: 1})
+        release = asyncio.Event()
+
+        async def _hold():
+            async with governor.stage(STAGE_LLM):
+                await release.wait()
+
+        holder = asyncio.create_task(_hold())
+        waiter = asyncio.create_task(_hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+
+        assert governor.stats()[0].waiting == 0
+        release.set()
+        await holder
+
+
+class TestLoadShedding:
+    async def test_free_tier_shed_when_wait_too_long(self):
+        with patch("src.governor.expected_wait_seconds", AsyncMock(return_value=500.0)):
+            assert await should_shed(UserTier.FREE)
+            assert not await should_shed(UserTier.PAID)
+            assert not await should_shed(UserTier.VIP)
+
+    async def test_not_shed_under_threshold(self):
+        wait = settings.shed_free_tier_wait_seconds - 1
+        with patch("src.governor.expected_wait_seconds", AsyncMock(return_value=wait)):
+            assert not await should_shed(UserTier.FREE)
+
+    async def test_shedding_disabled(self):
+        with (
+            patch.object(settings, "shed_free_tier_wait_seconds", 0),
+            patch("src.governor.expected_wait_seconds", AsyncMock(return_value=500.0)),
+        ):
+            assert not await should_shed(UserTier.FREE)
+
+    async def test_job_backlog_wait(self):
+        pool = JobWorkerPool(workers=2)
+        for _ in range(4):
+            await enqueue_job("voice", {})
+
+        assert await pool.expected_wait_seconds() == 0  # not running
+        pool._tasks = [AsyncMock()]  # pretend started
+        pool._avg_job_seconds = 3.0
+
+        assert await pool.expected_wait_seconds() == 4 * 3.0 / 2
@@ -0,0 +1,105 @@
+"""Every hot query must be served by a declared index (needs a real mongod)."""
+
+import datetime
+import os
+
+import pytest
+from motor import motor_asyncio
+
+from src.dto import (
+    AccountLink,
+    AlertState,
+    BotConfig,
+    CachedTranscription,
+    LinkAttempt,
+    LinkCode,
+    MonthlyStats,
+    QueuedJob,
+    RecentTranscriptions,
+    UsedTrial,
+    UserCredits,
+    UserMonthlyUsage,
+    UserRole,
+    UserSettings,
+    WitUsageStats,
+)
+
+# (model, filter, sort) of every query on the per-message or per-command path
+HOT_QUERIES = [
+    (UserSettings, {"chat_id": "u_1"}, None),
+    (UserSettings, {"chat_id": {"$in": ["u_1", "g_1"]}}, None),
+    (UserCredits, {"user_id": "1"}, None),
+    (UserRole, {"user_id": "1", "role": "vip"}, None),
+    (UserRole, {"role": "vip"}, None),
+    (UserMonthlyUsage, {"user_id": "1", "month_key": "2026-01"}, None),
+    (UsedTrial, {"user_hash": "abc"}, None),
+    (BotConfig, {"key": "k"}, None),
+    (WitUsageStats, {"month_key": "2026-01", "language": "en"}, None),
+    (WitUsageStats, {"month_key": "2026-01", "language": "en", "shard": 3}, None),
+    (WitUsageStats, {"month_key": "2026-01"}, None),
+    (MonthlyStats, {"month_key": "2026-01"}, None),
+    (MonthlyStats, {"month_key": "2026-01", "shard": 3}, None),
+    (AlertState, {"alert_type": "wit_80", "month_key": "2026-01"}, None),
+    (AccountLink, {"telegram_user_id": "1"}, None),
+    (AccountLink, {"whatsapp_phone": "15550001111"}, None),
+    (LinkCode, {"code": "123456"}, None),
+    (LinkCode, {"telegram_user_id": "1"}, None),
+    (LinkAttempt, {"whatsapp_phone": "15550001111"}, None),
+    (RecentTranscriptions, {"chat_id": "u_1"}, None),
+    (CachedTranscription, {"key": "wit:en:AgAD"}, None),
+    (
+        QueuedJob,
+        {
+            "status": {"$in": ["queued", "running"]},
+            "visible_at": {"$lte": datetime.datetime.now(datetime.UTC)},
+        },
+        [("order", 1)],
+    ),
+    (QueuedJob, {"status": {"$in": ["queued", "running"]}, "chat_id": "u_1"}, [("order", -1)]),
+    (QueuedJob, {"status": "dead"}, None),
+    (QueuedJob, {"status": "running", "user_id": {"$ne": ""}}, None),
+    (QueuedJob, {"status": "running", "user_id": "1"}, None),
+]
+
+
+def _stages(plan: dict) -> set[str]:
+    stages = {plan["stage"]}
+    for child in (plan.get("inputStage"), *plan.get("inputStages", ())):
+        if child:
+            stages |= _stages(child)
+    return stages
+
+
+@pytest.mark.skipif(
+    not os.getenv("MONGO_TEST_URI"),
+    reason="MONGO_TEST_URI not set — skipping index integration test",
+)
+class TestHotQueriesUseIndexes:
+    @pytest.fixture
+    async def database(self):
+        client = motor_asyncio.AsyncIOMotorClient(os.getenv("MONGO_TEST_URI"))
+        database = client["evlampiy_index_test"]
+        for model in {model for model, _, _ in HOT_QUERIES}:
+            collection = database[model.Settings.name]
+            await collection.insert_one({"_placeholder": True})
+            await collection.create_indexes(model.Settings.indexes)
+        yield database
+        await client.drop_database(database.name)
+        client.close()
+
+    @pytest.mark.parametrize(
+        ("model", "query", "sort"),
+        HOT_QUERIES,
+        ids=lambda value: value.Settings.name if isinstance(value, type) else None,
+    )
+    async def test_query_uses_index(self, database, model, query, sort):
+        cursor = database[model.Settings.name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+
+        stages = _stages(plan.get("queryPlan", plan))
+        assert "IXSCAN" in stages, stages
+        assert "COLLSCAN" not in stages
+        assert "SORT" not in stages
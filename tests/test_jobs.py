@@ -0,0 +1,339 @@
+"""Tests for the durable job queue and worker pool."""
+
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, patch
+
+from src.config import settings
+from src.dto import QueuedJob, UserTier
+from src.jobs import (
+    JOB_DEAD,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JobWorkerPool,
+    PermanentJobError,
+    claim_job,
+    count_jobs,
+    enqueue_job,
+    release_job,
+)
+from src.telegram.setup import build_application, post_stop
+
+
+async def _wait_until(predicate, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not await predicate():
+            await asyncio.sleep(0.01)
+
+
+async def _queue_empty() -> bool:
+    return await QueuedJob.count() == 0
+
+
+class TestClaim:
+    async def test_claim_leases_oldest_job_once(self):
+        first = await enqueue_job("voice", {"n": 1})
+        await enqueue_job("voice", {"n": 2})
+
+        claimed = await claim_job("w1")
+        other = await claim_job("w2")
+
+        assert claimed.id == first.id
+        assert claimed.status == JOB_RUNNING
+        assert claimed.worker == "w1"
+        assert claimed.attempts == 1
+        assert other.payload == {"n": 2}
+        assert await claim_job("w3") is None
+
+    async def test_expired_lease_is_reclaimed(self):
+        await enqueue_job("voice", {})
+        with patch.object(settings, "job_visibility_timeout_seconds", -1):
+            await claim_job("crashed")
+
+        reclaimed = await claim_job("w2")
+
+        assert reclaimed.worker == "w2"
+        assert reclaimed.attempts == 2
+
+    async def test_release_returns_job_without_counting_attempt(self):
+        await enqueue_job("voice", {})
+        job = await claim_job("w1")
+
+        await release_job(job, "w1")
+
+        stored = await QueuedJob.get(job.id)
+        assert (stored.status, stored.attempts) == (JOB_QUEUED, 0)
+
+    async def test_release_ignored_after_lease_lost(self):
+        await enqueue_job("voice", {})
+        with patch.object(settings, "job_visibility_timeout_seconds", -1):
+            stale = await claim_job("w1")
+        await claim_job("w2")
+
+        await release_job(stale, "w1")
+
+        stored = await QueuedJob.get(stale.id)
+        assert (stored.status, stored.worker) == (JOB_RUNNING, "w2")
+
+
+class TestScheduling:
+    async def test_paid_tiers_claimed_before_free(self):
+        await enqueue_job("voice", {"t": "free"}, chat_id="u_1", tier=UserTier.FREE)
+        await enqueue_job("voice", {"t": "paid"}, chat_id="u_2", tier=UserTier.PAID)
+        await enqueue_job("voice", {"t": "vip"}, chat_id="u_3", tier=UserTier.VIP)
+
+        claimed = [(await claim_job("w")).payload["t"] for _ in range(3)]
+
+        assert claimed == ["vip", "paid", "free"]
+
+    async def test_chatty_chat_does_not_starve_others(self):
+        for n in range(5):
+            await enqueue_job("voice", {"chat": "g_busy", "n": n}, chat_id="g_busy")
+        await enqueue_job("voice", {"chat": "u_quiet"}, chat_id="u_quiet")
+
+        claimed = [(await claim_job("w")).payload["chat"] for _ in range(6)]
+
+        assert claimed[:2] == ["g_busy", "u_quiet"]
+
+    async def test_free_work_is_not_starved(self):
+        with patch.object(settings, "job_schedule_quantum_seconds", 0.05):
+            await enqueue_job("voice", {"t": "free"}, chat_id="u_1")
+            await asyncio.sleep(0.05)
+            await enqueue_job("voice", {"t": "vip"}, chat_id="u_2", tier=UserTier.VIP)
+
+        assert (await claim_job("w")).payload["t"] == "free"
+
+    async def test_queue_wait_reported_per_tier(self):
+        pool = JobWorkerPool(workers=1)
+        pool.register("voice", AsyncMock())
+        await enqueue_job("voice", {}, tier=UserTier.VIP)
+        await enqueue_job("voice", {}, tier=UserTier.FREE)
+        await pool.start()
+        try:
+            await _wait_until(_queue_empty)
+        finally:
+            await pool.stop()
+
+        waits = pool.stats().wait_by_tier
+        assert set(waits) == {UserTier.VIP, UserTier.FREE}
+        assert waits[UserTier.VIP].jobs == 1
+        assert waits[UserTier.FREE].max_seconds >= waits[UserTier.FREE].avg_seconds >= 0
+
+
+class TestUserInFlightLimit:
+    async def test_user_at_limit_is_skipped(self):
+        await enqueue_job("voice", {"u": "busy", "n": 1}, chat_id="u_1", user_id="1")
+        await enqueue_job("voice", {"u": "busy", "n": 2}, chat_id="u_1", user_id="1")
+        await enqueue_job("voice", {"u": "other"}, chat_id="u_2", user_id="2")
+
+        first = await claim_job("w1")
+        second = await claim_job("w2")
+
+        assert first.payload == {"u": "busy", "n": 1}
+        assert second.payload == {"u": "other"}
+        assert await claim_job("w3") is None
+
+    async def test_expired_lease_does_not_count(self):
+        await enqueue_job("voice", {"n": 1}, user_id="1")
+        await enqueue_job("voice", {"n": 2}, user_id="1")
+        with patch.object(settings, "job_visibility_timeout_seconds", -1):
+            await claim_job("crashed")
+
+        assert (await claim_job("w2")) is not None
+
+    async def test_concurrent_claim_of_same_user_backs_off(self):
+        await enqueue_job("voice", {"n": 1}, user_id="1")
+        await enqueue_job("voice", {"n": 2}, user_id="1")
+        await claim_job("w1")
+
+        # Both workers looked for busy users before either claimed
+        with patch("src.jobs._busy_users", AsyncMock(return_value=set())):
+            assert await claim_job("w2") is None
+
+        deferred = await QueuedJob.find_one({"payload.n": 2})
+        assert (deferred.status, deferred.attempts) == (JOB_QUEUED, 0)
+        assert deferred.visible_at.replace(tzinfo=datetime.UTC) > datetime.datetime.now(
+            datetime.UTC
+        )
+
+    async def test_burst_of_one_user_leaves_workers_for_others(self):
+        pool = JobWorkerPool(workers=2)
+        release = asyncio.Event()
+        served = []
+
+        async def _handler(payload):
+            if payload["u"] == "burst":
+                await release.wait()
+            served.append(payload["u"])
+
+        async def _other_served() -> bool:
+            return served == ["other"]
+
+        pool.register("voice", _handler)
+        for _ in range(3):
+            await enqueue_job("voice", {"u": "burst"}, chat_id="u_1", user_id="1")
+        await enqueue_job("voice", {"u": "other"}, chat_id="u_2", user_id="2")
+        await pool.start()
+        try:
+            await _wait_until(_other_served)
+            assert pool.stats().busy == 1
+            release.set()
+            await _wait_until(_queue_empty)
+        finally:
+            await pool.stop()
+
+        assert served == ["other", "burst", "burst", "burst"]
+
+
+class TestWorkerPool:
+    async def test_pool_processes_and_deletes_jobs(self):
+        pool = JobWorkerPool(workers=2)
+        seen = []
+
+        async def _handler(payload):
+            seen.append(payload["n"])
+
+        pool.register("voice", _handler)
+        for n in range(3):
+            await enqueue_job("voice", {"n": n})
+        await pool.start()
+        try:
+            await _wait_until(_queue_empty)
+        finally:
+            await pool.stop()
+
+        assert sorted(seen) == [0, 1, 2]
+        assert pool.stats().completed == 3
+        assert not pool.running
+
+    async def test_failed_job_is_retried(self):
+        pool = JobWorkerPool(workers=1)
+        calls = 0
+
+        async def _flaky(payload):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RuntimeError("wit down")
+
+        pool.register("voice", _flaky)
+        await enqueue_job("voice", {})
+        with patch.object(settings, "job_retry_delay_seconds", 0):
+            await pool.start()
+            try:
+                await _wait_until(_queue_empty)
+            finally:
+                await pool.stop()
+
+        stats = pool.stats()
+        assert calls == 2
+        assert (stats.retried, stats.completed, stats.dead) == (1, 1, 0)
+
+    async def test_job_dead_lettered_after_max_attempts(self):
+        pool = JobWorkerPool(workers=1)
+
+        async def _broken(payload):
+            raise ValueError("bad audio")
+
+        pool.register("voice", _broken)
+        job = await enqueue_job("voice", {})
+        with (
+            patch.object(settings, "job_retry_delay_seconds", 0),
+            patch.object(settings, "job_max_attempts", 2),
+        ):
+            await pool.start()
+            try:
+
+                async def _dead():
+                    return await count_jobs(JOB_DEAD) == 1
+
+                await _wait_until(_dead)
+            finally:
+                await pool.stop()
+
+        stored = await QueuedJob.get(job.id)
+        assert stored.attempts == 2
+        assert "bad audio" in stored.last_error
+        assert pool.stats().dead == 1
+
+    async def test_permanent_error_dead_lettered_without_retry(self):
+        pool = JobWorkerPool(workers=1)
+        calls = 0
+
+        async def _rejected(payload):
+            nonlocal calls
+            calls += 1
+            raise PermanentJobError("Message to reply not found")
+
+        pool.register("voice", _rejected)
+        job = await enqueue_job("voice", {})
+        await pool.start()
+        try:
+
+            async def _dead():
+                return await count_jobs(JOB_DEAD) == 1
+
+            await _wait_until(_dead)
+        finally:
+            await pool.stop()
+
+        stored = await QueuedJob.get(job.id)
+        assert (calls, stored.attempts) == (1, 1)
+        assert (pool.stats().retried, pool.stats().dead) == (0, 1)
+
+    async def test_unknown_kind_is_dead_lettered(self):
+        pool = JobWorkerPool(workers=1)
+        await enqueue_job("mystery", {})
+        with patch.object(settings, "job_max_attempts", 1):
+            await pool.start()
+            try:
+
+                async def _dead():
+                    return await count_jobs(JOB_DEAD) == 1
+
+                await _wait_until(_dead)
+            finally:
+                await pool.stop()
+
+        stored = await QueuedJob.find_one()
+        assert "mystery" in stored.last_error
+
+    async def test_stop_returns_in_flight_job_to_queue(self):
+        pool = JobWorkerPool(workers=1)
+        started = asyncio.Event()
+
+        async def _slow(payload):
+            started.set()
+            await asyncio.sleep(10)
+
+        pool.register("voice", _slow)
+        job = await enqueue_job("voice", {})
+        await pool.start()
+        await asyncio.wait_for(started.wait(), timeout=2)
+        await pool.stop()
+
+        stored = await QueuedJob.get(job.id)
+        assert (stored.status, stored.attempts, stored.worker) == (JOB_QUEUED, 0, "")
+        assert stored.visible_at <= datetime.datetime.now(datetime.UTC).replace(
+            tzinfo=stored.visible_at.tzinfo
+        )
+
+    async def test_disabled_pool_does_not_start(self):
+        pool = JobWorkerPool(workers=0)
+
+        await pool.start()
+
+        assert not pool.running
+
+    async def test_pool_stopped_while_bot_can_still_send(self):
+        """post_stop runs before Application.shutdown() closes the bot's HTTP client."""
+        with patch.object(settings, "telegram_bot_token", "123:TEST"):
+            application = build_application()
+        with (
+            patch("src.telegram.setup.job_pool.stop", AsyncMock()) as stop_pool,
+            patch("src.telegram.setup.usage_counters.stop", AsyncMock()),
+        ):
+            await application.post_stop(application)
+
+        stop_pool.assert_awaited_once()
+        assert application.post_stop is post_stop
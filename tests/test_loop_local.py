@@ -0,0 +1,33 @@
+"""Tests for per-event-loop values."""
+
+import asyncio
+
+from src.loop_local import LoopLocal
+
+
+class TestLoopLocal:
+    async def test_value_reused_within_a_loop(self):
+        local = LoopLocal(asyncio.Semaphore)
+
+        assert local.get() is local.get()
+
+    async def test_other_loop_gets_its_own_value(self):
+        local = LoopLocal(object)
+        here = local.get()
+
+        there = await asyncio.to_thread(asyncio.run, _get(local))
+
+        assert there is not here
+        assert local.get() is here
+
+    async def test_pop_forgets_running_loop_value(self):
+        local = LoopLocal(object)
+        first = local.get()
+
+        assert local.pop() is first
+        assert local.pop() is None
+        assert local.get() is not first
+
+
+async def _get(local: LoopLocal) -> object:
+    return local.get()
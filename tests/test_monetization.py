@@ -1,15 +1,18 @@
 """Tests for monetization: credits, tokens, billing, blocked, wit tracking."""
 
+import asyncio
+import contextlib
 from unittest.mock import patch
 
+from src.config import settings
 from src.credits import (
     DeductResult,
+    VoiceAdmission,
     add_credits,
     admin_add_credits,
+    admit_voice,
     calculate_token_cost,
-    can_perform_operation,
     current_month_key,
-    deduct_credits,
     get_credits,
     get_total_credits,
     get_user_tier,
@@ -17,6 +20,11 @@ from src.credits import (
     is_blocked_user,
     is_vip_user,
     record_user_usage,
+    release_credits,
+    reserve_credits,
+    settle_credits,
+    voice_admission,
+    voice_gate,
 )
 from src.dto import UserCredits, UserMonthlyUsage, UserTier
 from src.mongo import add_user_role, remove_user_role
@@ -79,31 +87,15 @@ class TestCreditFlow:
         assert balance == 10
         assert await get_user_tier(user_id) == UserTier.FREE
 
-    async def test_can_perform_with_free_credits(self):
-        """New user can perform operations with free credits."""
-        user_id = "can_perform_user"
-        ok, msg = await can_perform_operation(user_id, 5)
-        assert ok is True
-        assert msg == ""
-
-    async def test_cannot_perform_when_exhausted(self):
-        """Cannot perform when total credits are insufficient."""
-        user_id = "exhausted_user"
-        ok, msg = await can_perform_operation(user_id, 100)
-        assert ok is False
-        assert msg == "insufficient_credits"
-
     @patch("src.credits.settings")
-    async def test_vip_always_can_perform(self, mock_settings):
-        """VIP users can always perform operations."""
+    async def test_vip_tier(self, mock_settings):
+        """VIP users get the VIP tier."""
         vip_id = "42"
         mock_settings.vip_user_ids = {vip_id}
         mock_settings.admin_user_ids = set()
 
         assert await is_vip_user(vip_id) is True
         assert await get_user_tier(vip_id) == UserTier.VIP
-        ok, _ = await can_perform_operation(vip_id, 10000)
-        assert ok is True
 
     def test_user_hash_uniqueness(self):
         """Each user_id produces a unique hash."""
@@ -114,72 +106,6 @@ class TestCreditFlow:
         assert hash1 == hash3
 
 
-class TestDeductCredits:
-    """Test deduction: free first, then purchased, soft overdraft."""
-
-    async def test_deduct_from_free_first(self):
-        """Deduction takes from free credits first."""
-        user_id = "deduct_free_first"
-        await add_credits(user_id, 5)
-
-        result = await deduct_credits(user_id, 3)
-        assert isinstance(result, DeductResult)
-        assert result.free_used == 3
-        assert result.purchased_used == 0
-        assert result.overdraft is False
-
-        free, purchased = await get_credits(user_id)
-        assert free == 7
-        assert purchased == 5
-
-    async def test_deduct_spills_to_purchased(self):
-        """When free credits exhausted, deduction spills to purchased."""
-        user_id = "deduct_spill"
-        await add_credits(user_id, 5)
-
-        # Deduct 12: 10 free + 2 purchased
-        result = await deduct_credits(user_id, 12)
-        assert result.free_used == 10
-        assert result.purchased_used == 2
-        assert result.overdraft is False
-
-        free, purchased = await get_credits(user_id)
-        assert free == 0
-        assert purchased == 3
-
-    async def test_soft_overdraft(self):
-        """Overdraft: deducts what's available, never below 0."""
-        user_id = "overdraft_user"
-        # Only has 10 free tokens, no purchased
-        result = await deduct_credits(user_id, 50)
-        assert result.free_used == 10
-        assert result.purchased_used == 0
-        assert result.overdraft is True
-
-        free, purchased = await get_credits(user_id)
-        assert free == 0
-        assert purchased == 0
-
-    async def test_deduct_zero_available(self):
-        """Deducting from user with 0 balance returns overdraft with 0 used."""
-        user_id = "zero_user"
-        # First exhaust free credits
-        await deduct_credits(user_id, 100)
-
-        result = await deduct_credits(user_id, 5)
-        assert result.free_used == 0
-        assert result.purchased_used == 0
-        assert result.overdraft is True
-
-    async def test_deduct_tracks_tokens_used(self):
-        """Deduction increments total_tokens_used."""
-        user_id = "track_user"
-        await deduct_credits(user_id, 3)
-
-        record = await UserCredits.find_one(UserCredits.user_id == user_id)
-        assert record.total_tokens_used == 3
-
-
 class TestLazyReset:
     """Test lazy monthly reset of free credits."""
 
@@ -188,7 +114,7 @@ class TestLazyReset:
         user_id = "reset_user"
 
         # Exhaust free credits
-        await deduct_credits(user_id, 10)
+        await settle_credits(await reserve_credits(user_id, 10), 10)
         free, _ = await get_credits(user_id)
         assert free == 0
 
@@ -200,7 +126,7 @@ class TestLazyReset:
     async def test_same_month_no_reset(self):
         """Free credits are NOT reset within the same month."""
         user_id = "no_reset_user"
-        await deduct_credits(user_id, 5)
+        await settle_credits(await reserve_credits(user_id, 5), 5)
 
         free, _ = await get_credits(user_id)
         assert free == 5  # not reset
@@ -223,6 +149,184 @@ class TestBlockedUser:
         assert await is_blocked_user(user_id) is False
 
 
+class TestVoiceAdmission:
+    """Metadata-first admission: decided before the audio is downloaded."""
+
+    async def test_short_voice_admitted_whole(self):
+        admission = await admit_voice("adm_short", UserTier.FREE, 30, 50_000)
+        assert admission == VoiceAdmission(allowed=True, reserved_tokens=2)
+
+    async def test_oversized_file_rejected(self):
+        admission = await admit_voice("adm_big", UserTier.PAID, 30, 25 * 1024 * 1024)
+        assert not admission.allowed
+        assert admission.reason == "voice_file_too_large"
+
+    async def test_local_bot_api_lifts_file_cap(self):
+        with patch.object(settings, "telegram_api_base_url", "http://bot-api:8081"):
+            admission = await admit_voice("adm_local", UserTier.FREE, 30, 25 * 1024 * 1024)
+        assert admission.allowed
+
+    async def test_empty_balance_rejected(self):
+        await reserve_credits("adm_empty", 100)
+        admission = await admit_voice("adm_empty", UserTier.FREE, 5, 8_000)
+        assert admission == VoiceAdmission(allowed=False, reason="insufficient_credits")
+
+    async def test_over_balance_truncated_to_affordable(self):
+        # 10 free tokens x 20 s
+        admission = await admit_voice("adm_balance", UserTier.FREE, 500, 800_000)
+        assert admission == VoiceAdmission(
+            allowed=True, max_seconds=200, reason="voice_truncated", reserved_tokens=10
+        )
+
+    async def test_tier_limit_truncates(self):
+        await add_credits("adm_paid", 1000)
+        with patch.object(settings, "max_voice_seconds_paid", 900):
+            admission = await admit_voice("adm_paid", UserTier.PAID, 1200, 2_000_000)
+        assert admission.max_seconds == 900
+        assert admission.reason == "voice_truncated"
+
+    async def test_reject_mode_reports_binding_limit(self):
+        await add_credits("adm_reject", 1000)
+        with (
+            patch.object(settings, "voice_over_limit_action", "reject"),
+            patch.object(settings, "max_voice_seconds_paid", 900),
+        ):
+            too_long = await admit_voice("adm_reject", UserTier.PAID, 1200, 2_000_000)
+            too_poor = await admit_voice("adm_reject_poor", UserTier.FREE, 500, 800_000)
+        assert too_long == VoiceAdmission(allowed=False, max_seconds=900, reason="voice_too_long")
+        assert too_poor.reason == "insufficient_credits"
+
+    async def test_unlimited_users_have_no_cap(self):
+        await add_user_role("adm_vip", "vip", "admin")
+        admission = await admit_voice("adm_vip", UserTier.VIP, 7200, 5_000_000)
+        assert admission == VoiceAdmission(allowed=True)
+
+    async def test_missing_duration_caps_decode(self):
+        admission = await admit_voice("adm_unknown", UserTier.FREE, None, None)
+        assert admission == VoiceAdmission(allowed=True, max_seconds=200, reserved_tokens=10)
+
+    async def test_reservation_held_until_released(self):
+        # 10 free tokens: the first message reserves 6, the second only gets the other 4
+        first = await admit_voice("adm_burst", UserTier.FREE, 120, 200_000)
+        second = await admit_voice("adm_burst", UserTier.FREE, 120, 200_000)
+
+        assert first.reserved_tokens == 6
+        assert (second.max_seconds, second.reserved_tokens) == (80, 4)
+        assert await get_total_credits("adm_burst") == 0
+        assert not (await admit_voice("adm_burst", UserTier.FREE, 5, 8_000)).allowed
+
+        await release_credits(first.reservation)
+        await release_credits(second.reservation)
+        assert await get_total_credits("adm_burst") == 10
+        assert voice_gate.in_flight_users() == 0
+
+    async def test_unlimited_users_reserve_nothing(self):
+        await add_user_role("adm_vip2", "vip", "admin")
+        admission = await admit_voice("adm_vip2", UserTier.VIP, 60, 100_000)
+        assert admission.reserved_tokens == 0
+
+
+class TestVoiceGate:
+    """Per-user in-flight slots: a burst is processed one message at a time."""
+
+    async def test_burst_processed_in_order_without_overdraft(self):
+        order = []
+
+        async def _message(n: int):
+            async with voice_admission("gate_user", UserTier.FREE, 100, 100_000) as admission:
+                order.append(n)
+                if admission.allowed:
+                    await asyncio.sleep(0.01)
+                    result = await settle_credits(admission.reservation, admission.reserved_tokens)
+                    assert not result.overdraft
+                return admission.allowed
+
+        # 10 free tokens, 5 tokens per message: two fit, the rest are refused
+        admitted = await asyncio.gather(*(_message(n) for n in range(4)))
+
+        assert order == [0, 1, 2, 3]
+        assert admitted == [True, True, False, False]
+        assert await get_total_credits("gate_user") == 0
+        assert voice_gate.in_flight_users() == 0
+
+    async def test_in_flight_limit_allows_parallel_users(self):
+        running = 0
+        peak = 0
+
+        async def _message(user_id: str):
+            nonlocal running, peak
+            async with voice_gate.slot(user_id):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(_message(f"gate_{n % 2}") for n in range(4)))
+
+        assert peak == 2  # one per user
+
+    async def test_reservation_released_on_error(self):
+        with contextlib.suppress(RuntimeError):
+            async with voice_admission("gate_err", UserTier.FREE, 60, 100_000):
+                raise RuntimeError("download failed")
+
+        assert await get_total_credits("gate_err") == settings.free_monthly_tokens
+
+
+class TestCreditLedger:
+    """Reserve-then-settle and concurrent updates of the atomic ledger."""
+
+    async def test_settle_refunds_unused_reservation(self):
+        await add_credits("ledger_refund", 5)
+        reservation = await reserve_credits("ledger_refund", 12)  # 10 free + 2 purchased
+        assert (reservation.free, reservation.purchased) == (10, 2)
+
+        result = await settle_credits(reservation, 9)
+
+        assert result == DeductResult(free_used=9, purchased_used=0, overdraft=False)
+        assert await get_credits("ledger_refund") == (1, 5)
+        record = await UserCredits.find_one(UserCredits.user_id == "ledger_refund")
+        assert record.total_tokens_used == 9
+
+    async def test_settle_above_reservation_takes_the_rest(self):
+        reservation = await reserve_credits("ledger_extra", 4)
+
+        result = await settle_credits(reservation, 12)
+
+        assert result == DeductResult(free_used=10, purchased_used=0, overdraft=True)
+        assert await get_total_credits("ledger_extra") == 0
+        await release_credits(reservation)  # already settled: no refund
+        assert await get_total_credits("ledger_extra") == 0
+
+    async def test_release_restores_balance(self):
+        reservation = await reserve_credits("ledger_release", 3)
+        assert await get_total_credits("ledger_release") == 7
+
+        await release_credits(reservation)
+
+        assert await get_total_credits("ledger_release") == 10
+        record = await UserCredits.find_one(UserCredits.user_id == "ledger_release")
+        assert record.total_tokens_used == 0
+
+    async def test_refund_after_month_rollover_capped_at_allowance(self):
+        reservation = await reserve_credits("ledger_rollover", 4)
+
+        with patch("src.credits.current_month_key", return_value="2099-01"):
+            await release_credits(reservation)
+            assert await get_credits("ledger_rollover") == (10, 0)
+
+    async def test_concurrent_updates_are_not_lost(self):
+        await asyncio.gather(
+            *(add_credits("ledger_race", 1) for _ in range(20)),
+            *(reserve_credits("ledger_race", 1) for _ in range(5)),
+        )
+
+        assert await get_credits("ledger_race") == (5, 20)
+        record = await UserCredits.find_one(UserCredits.user_id == "ledger_race")
+        assert (record.tier, record.total_credits_purchased) == (UserTier.PAID, 20)
+        assert await UserCredits.find(UserCredits.user_id == "ledger_race").count() == 1
+
+
 class TestRecordUserUsage:
     """Test monthly usage tracking."""
 
@@ -264,17 +368,17 @@ class TestWitUsageLimits:
     async def test_complete_wit_usage_flow(self, mock_settings):
         """Test complete Wit.ai usage tracking flow."""
         mock_settings.wit_free_monthly_limit = 3
+        mock_settings.stats_counter_shards = 1
 
         assert await get_wit_usage_this_month("ru") == 0
         assert await is_wit_available("ru") is True
 
-        count = await increment_wit_usage(language="ru")
-        assert count == 1
+        await increment_wit_usage(language="ru")
         assert await get_wit_usage_this_month("ru") == 1
 
         await increment_wit_usage(language="ru")
-        count = await increment_wit_usage(language="ru")
-        assert count == 3
+        await increment_wit_usage(language="ru")
+        assert await get_wit_usage_this_month("ru") == 3
 
         assert await is_wit_available("ru") is False
 
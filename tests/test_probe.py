@@ -0,0 +1,85 @@
+"""Tests for container-header duration probing."""
+
+import struct
+from unittest.mock import MagicMock, patch
+
+from src.transcription.probe import probe_duration_ms
+from src.transcription.service import get_audio_duration_seconds
+
+OPUS_PRE_SKIP = 312
+
+
+def _ogg_page(payload: bytes, granule: int, serial: int = 7, seq: int = 0) -> bytes:
+    segments = [255] * (len(payload) // 255) + [len(payload) % 255]
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, 0, granule, serial, seq, 0, len(segments))
+    return header + bytes(segments) + payload
+
+
+def _opus_file(duration_ms: int) -> bytes:
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, OPUS_PRE_SKIP, 48000, 0, 0)
+    granule = duration_ms * 48 + OPUS_PRE_SKIP
+    return (
+        _ogg_page(head, 0)
+        + _ogg_page(b"OpusTags" + b"\x00" * 8, 0, seq=1)
+        + _ogg_page(b"\x00" * 300, granule // 2, seq=2)
+        + _ogg_page(b"\x00" * 300, granule, seq=3)
+    )
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _mp4_file(timescale: int, duration: int, version: int = 0) -> bytes:
+    if version == 1:
+        mvhd = struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration)
+    else:
+        mvhd = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration)
+    return (
+        _box(b"ftyp", b"M4A \x00\x00\x00\x00")
+        + _box(b"mdat", b"\x00" * 64)
+        + _box(b"moov", _box(b"mvhd", mvhd + b"\x00" * 80))
+    )
+
+
+class TestProbeDuration:
+    def test_ogg_opus_uses_last_granule_minus_pre_skip(self):
+        assert probe_duration_ms(_opus_file(62_500)) == 62_500
+
+    def test_ogg_vorbis_uses_header_sample_rate(self):
+        ident = b"\x01vorbis" + struct.pack("<IBI", 0, 1, 44100)
+        data = _ogg_page(ident, 0) + _ogg_page(b"\x00" * 10, 44100 * 3, seq=1)
+
+        assert probe_duration_ms(data) == 3000
+
+    def test_ogg_ignores_trailing_pages_of_other_streams(self):
+        data = _opus_file(10_000) + _ogg_page(b"\x00" * 10, 999_999_999, serial=99)
+
+        assert probe_duration_ms(data) == 10_000
+
+    def test_mp4_mvhd_v0(self):
+        assert probe_duration_ms(_mp4_file(timescale=44100, duration=44100 * 95)) == 95_000
+
+    def test_mp4_mvhd_v1(self):
+        assert probe_duration_ms(_mp4_file(timescale=1000, duration=7_250, version=1)) == 7_250
+
+    def test_unknown_container_returns_none(self):
+        assert probe_duration_ms(b"ID3\x03fake mp3 data") is None
+
+    def test_truncated_header_returns_none(self):
+        assert probe_duration_ms(_opus_file(5_000)[:30]) is None
+
+
+class TestGetAudioDurationSeconds:
+    def test_header_probe_skips_decode(self):
+        with patch("src.transcription.service.decode_audio") as mock_decode:
+            assert get_audio_duration_seconds(_opus_file(12_900), "ogg") == 12
+
+        mock_decode.assert_not_called()
+
+    def test_falls_back_to_decode(self):
+        decoded = MagicMock(duration_seconds=4)
+        with patch("src.transcription.service.decode_audio", return_value=decoded) as mock_decode:
+            assert get_audio_duration_seconds(b"not a container", "ogg") == 4
+
+        mock_decode.assert_called_once_with(b"not a container", "ogg")
@@ -1,6 +1,15 @@
 """TROPHY-style pipeline tests for recent transcription context storage."""
 
-from src.mongo import get_recent_transcriptions, save_recent_transcription
+import datetime
+from unittest.mock import patch
+
+from src.config import settings
+from src.dto import RecentEntry, RecentTranscriptions
+from src.mongo import (
+    get_recent_transcriptions,
+    recent_transcriptions_cache,
+    save_recent_transcription,
+)
 
 
 class TestRecentTranscriptionPipeline:
@@ -53,3 +62,76 @@ class TestRecentTranscriptionPipeline:
 
         result = await get_recent_transcriptions("chat_trim", limit=10)
         assert len(result) == 5
+
+    async def test_single_document_per_chat(self):
+        """The ring is one capped document, oldest entries trimmed on write."""
+        for i in range(7):
+            await save_recent_transcription("chat_ring", f"Note {i}")
+
+        docs = await RecentTranscriptions.find(
+            RecentTranscriptions.chat_id == "chat_ring"
+        ).to_list()
+        assert len(docs) == 1
+        assert [entry.text for entry in docs[0].entries] == [f"Note {i}" for i in range(2, 7)]
+
+    async def test_reads_served_from_memory(self):
+        """After a save, context is read without a query."""
+        await save_recent_transcription("chat_hot", "Hot note")
+
+        with patch.object(RecentTranscriptions, "find_one", side_effect=AssertionError("db read")):
+            assert await get_recent_transcriptions("chat_hot") == ["Hot note"]
+
+    async def test_cold_read_loads_from_db(self):
+        """Another process's entries are read once and then cached."""
+        await save_recent_transcription("chat_cold", "Stored note")
+        recent_transcriptions_cache.clear()
+
+        assert await get_recent_transcriptions("chat_cold") == ["Stored note"]
+        assert recent_transcriptions_cache.get("chat_cold") is not None
+
+    async def test_other_instance_entries_seen_after_cache_ttl(self):
+        """The in-memory ring expires on the settings-cache scale, not the entry TTL."""
+        collection = RecentTranscriptions.get_motor_collection()
+        with patch("src.ttl_cache.time.monotonic", return_value=100.0):
+            await save_recent_transcription("chat_shared", "Local note")
+        await collection.update_one(
+            {"chat_id": "chat_shared"},
+            {"$push": {"entries": RecentEntry(text="Remote note").model_dump()}},
+        )
+
+        expiry = 100.0 + settings.settings_cache_ttl_seconds
+        with patch("src.ttl_cache.time.monotonic", return_value=expiry - 1):
+            assert await get_recent_transcriptions("chat_shared") == ["Local note"]
+        with patch("src.ttl_cache.time.monotonic", return_value=expiry + 1):
+            assert await get_recent_transcriptions("chat_shared") == [
+                "Local note",
+                "Remote note",
+            ]
+
+    async def test_read_racing_save_does_not_cache_older_ring(self):
+        """A cold read that started before a save does not overwrite the saved ring."""
+        find_one = RecentTranscriptions.find_one
+
+        async def find_then_save(*args, **kwargs):
+            doc = await find_one(*args, **kwargs)
+            await save_recent_transcription("chat_race", "Saved meanwhile")
+            return doc
+
+        with patch.object(RecentTranscriptions, "find_one", side_effect=find_then_save):
+            assert await get_recent_transcriptions("chat_race") == []
+
+        assert await get_recent_transcriptions("chat_race") == ["Saved meanwhile"]
+
+    async def test_entries_older_than_ttl_ignored(self):
+        """Entries older than 2 hours are not used as context."""
+        stale = datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=3)
+        await RecentTranscriptions.get_motor_collection().insert_one(
+            {
+                "chat_id": "chat_stale",
+                "entries": [{"text": "Old note", "created_at": stale}],
+                "updated_at": stale,
+            }
+        )
+        await save_recent_transcription("chat_stale", "New note")
+
+        assert await get_recent_transcriptions("chat_stale") == ["New note"]
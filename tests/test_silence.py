@@ -0,0 +1,67 @@
+"""Tests for silence trimming before upload and billing."""
+
+import array
+
+from src.transcription.audio import SAMPLE_RATE, PcmAudio
+from src.transcription.silence import trim_silence
+
+LOUD = 8000
+THRESHOLD_DBFS = -45.0
+MIN_PAUSE_MS = 1000
+KEEP_MS = 400
+
+
+def _audio(*pieces: tuple[int, int]) -> PcmAudio:
+    """Build PCM from (duration_ms, amplitude) pieces; amplitude 0 is silence."""
+    samples = array.array("h")
+    for duration_ms, amplitude in pieces:
+        count = duration_ms * SAMPLE_RATE // 1000
+        samples.extend(amplitude if i % 2 else -amplitude for i in range(count))
+    return PcmAudio(samples)
+
+
+def _trim(audio: PcmAudio) -> PcmAudio:
+    return trim_silence(
+        audio, threshold_dbfs=THRESHOLD_DBFS, min_pause_ms=MIN_PAUSE_MS, keep_ms=KEEP_MS
+    )
+
+
+def test_leading_and_trailing_silence_removed():
+    audio = _audio((3000, 0), (5000, LOUD), (4000, 0))
+
+    trimmed = _trim(audio)
+
+    # 5 s speech + 200 ms kept on each side
+    assert trimmed.duration_ms == 5400
+
+
+def test_long_pause_collapsed():
+    audio = _audio((2000, LOUD), (6000, 0), (2000, LOUD))
+
+    trimmed = _trim(audio)
+
+    assert trimmed.duration_ms == 2000 + KEEP_MS + 2000
+
+
+def test_short_pause_kept():
+    """Natural pauses between words are not touched."""
+    audio = _audio((2000, LOUD), (600, 0), (2000, LOUD))
+
+    assert _trim(audio).duration_ms == audio.duration_ms
+
+
+def test_no_silence_returns_same_buffer():
+    audio = _audio((5000, LOUD))
+
+    assert _trim(audio) is audio
+
+
+def test_all_silence_yields_empty_audio():
+    assert _trim(_audio((5000, 0))).duration_ms == 0
+
+
+def test_quiet_speech_above_threshold_kept():
+    """Quiet (but not silent) speech at -40 dBFS survives a -45 dBFS threshold."""
+    audio = _audio((3000, 330))
+
+    assert _trim(audio) is audio
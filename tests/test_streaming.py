@@ -0,0 +1,354 @@
+"""Tests for the streaming, memory-bounded decode path."""
+
+import array
+import asyncio
+import pathlib
+import shutil
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src import const
+from src.config import settings
+from src.loop_local import LoopLocal
+from src.transcription.audio import SAMPLE_RATE, PcmAudio
+from src.transcription.groq_client import GROQ_MAX_UPLOAD_BYTES
+from src.transcription.service import CHUNK_LENGTH_MS, transcribe_audio
+from src.transcription.streaming import (
+    OPUS_BITRATE,
+    AudioDecodeError,
+    AudioEncodeError,
+    encode_opus,
+    stream_chunks,
+    stream_pcm,
+)
+
+LOUD = 8000
+
+
+def _samples(duration_ms: int, amplitude: int) -> array.array:
+    count = duration_ms * SAMPLE_RATE // 1000
+    return array.array("h", (amplitude if i % 2 else -amplitude for i in range(count)))
+
+
+async def _blocks(*pieces: tuple[int, int], block_ms: int = 500):
+    """Async block stream built from (duration_ms, amplitude) pieces."""
+    samples = array.array("h")
+    for duration_ms, amplitude in pieces:
+        samples.extend(_samples(duration_ms, amplitude))
+    step = block_ms * SAMPLE_RATE // 1000
+    for start in range(0, len(samples), step):
+        yield samples[start : start + step]
+
+
+def _fake_process(stdout_data: bytes, returncode: int = 0, stderr_data: bytes = b""):
+    stdout = asyncio.StreamReader()
+    stdout.feed_data(stdout_data)
+    stdout.feed_eof()
+    stderr = asyncio.StreamReader()
+    stderr.feed_data(stderr_data)
+    stderr.feed_eof()
+
+    process = MagicMock()
+    process.stdout = stdout
+    process.stderr = stderr
+    process.stdin = MagicMock()
+    process.stdin.drain = AsyncMock()
+    process.returncode = None
+
+    async def _wait():
+        process.returncode = returncode
+        return returncode
+
+    process.wait = _wait
+    return process
+
+
+async def _read_all(blocks) -> list:
+    return [block async for block in blocks]
+
+
+class TestStreamChunks:
+    async def test_chunks_bounded_and_cover_stream(self):
+        chunks = [c async for c in stream_chunks(_blocks((61_000, LOUD)), CHUNK_LENGTH_MS)]
+
+        assert sum(c.duration_ms for c in chunks) == 61_000
+        assert all(c.duration_ms <= CHUNK_LENGTH_MS for c in chunks)
+
+    async def test_split_lands_in_pause(self):
+        blocks = _blocks((17_000, LOUD), (400, 0), (10_000, LOUD))
+
+        chunks = [c async for c in stream_chunks(blocks, CHUNK_LENGTH_MS)]
+
+        assert len(chunks) == 2
+        assert 17_000 <= chunks[0].duration_ms <= 17_400
+
+
+class TestStreamPcm:
+    async def test_yields_fixed_size_blocks(self):
+        pcm = _samples(1_200, LOUD).tobytes()
+        process = _fake_process(pcm)
+
+        with patch(
+            "src.transcription.streaming.asyncio.create_subprocess_exec",
+            AsyncMock(return_value=process),
+        ) as mock_exec:
+            blocks = [b async for b in stream_pcm(b"ogg bytes", block_ms=500)]
+
+        assert [len(b) for b in blocks] == [8000, 8000, 3200]
+        assert "pipe:0" in mock_exec.call_args[0]
+        assert mock_exec.call_args.kwargs["stdin"] == asyncio.subprocess.PIPE
+
+    async def test_reads_from_path_without_stdin(self, tmp_path):
+        source = pathlib.Path(tmp_path / "voice.oga")
+        process = _fake_process(b"")
+
+        with patch(
+            "src.transcription.streaming.asyncio.create_subprocess_exec",
+            AsyncMock(return_value=process),
+        ) as mock_exec:
+            blocks = [b async for b in stream_pcm(source)]
+
+        assert blocks == []
+        assert str(source) in mock_exec.call_args[0]
+        assert mock_exec.call_args.kwargs["stdin"] == asyncio.subprocess.DEVNULL
+
+    async def test_ffmpeg_failure_raises(self):
+        process = _fake_process(b"", returncode=1, stderr_data=b"Invalid data found")
+
+        with (
+            patch(
+                "src.transcription.streaming.asyncio.create_subprocess_exec",
+                AsyncMock(return_value=process),
+            ),
+            pytest.raises(AudioDecodeError, match="Invalid data"),
+        ):
+            _ = [b async for b in stream_pcm(b"garbage")]
+
+    async def test_stderr_drained_while_decoding(self):
+        """ffmpeg stalls on a full stderr pipe, so its log is read while stdout is open."""
+        process = _fake_process(b"", returncode=1)
+        process.stdout = asyncio.StreamReader()  # no EOF until the whole log was read
+        process.stderr = asyncio.StreamReader()
+        process.stderr.feed_data(b"x" * 200_000 + b" Invalid data found")
+        process.stderr.feed_eof()
+        read_stderr = process.stderr.read
+
+        async def _read(n=-1):
+            data = await read_stderr(n)
+            if not data:
+                process.stdout.feed_eof()
+            return data
+
+        process.stderr.read = _read
+
+        with (
+            patch(
+                "src.transcription.streaming.asyncio.create_subprocess_exec",
+                AsyncMock(return_value=process),
+            ),
+            pytest.raises(AudioDecodeError, match=r"Invalid data found$") as error,
+        ):
+            await asyncio.wait_for(_read_all(stream_pcm(b"garbage")), timeout=5)
+
+        assert len(str(error.value)) <= 4096
+
+
+async def _pcm_chunks(*pieces: tuple[int, int]):
+    for duration_ms, amplitude in pieces:
+        yield PcmAudio(_samples(duration_ms, amplitude))
+
+
+class TestEncodeOpus:
+    async def test_pipes_pcm_and_returns_encoded_output(self):
+        process = _fake_process(b"OggS encoded")
+
+        with patch(
+            "src.transcription.streaming.asyncio.create_subprocess_exec",
+            AsyncMock(return_value=process),
+        ) as mock_exec:
+            encoded = await encode_opus(_pcm_chunks((1_000, LOUD), (500, LOUD)))
+
+        assert encoded == b"OggS encoded"
+        written = b"".join(call.args[0] for call in process.stdin.write.call_args_list)
+        assert len(written) == 1_500 * SAMPLE_RATE // 1000 * 2
+        assert "libopus" in mock_exec.call_args[0]
+        process.stdin.close.assert_called_once()
+
+    async def test_ffmpeg_failure_raises(self):
+        process = _fake_process(b"", returncode=1, stderr_data=b"Unknown encoder")
+
+        with (
+            patch(
+                "src.transcription.streaming.asyncio.create_subprocess_exec",
+                AsyncMock(return_value=process),
+            ),
+            pytest.raises(AudioEncodeError, match="Unknown encoder"),
+        ):
+            await encode_opus(_pcm_chunks((500, LOUD)))
+
+    @pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg not installed")
+    async def test_long_note_fits_groq_upload_limit(self):
+        """14 minutes of speech: over 25 MB as WAV, a few MB as Opus."""
+        duration_ms = 14 * 60 * 1000
+        wav_bytes = duration_ms * SAMPLE_RATE // 1000 * 2
+
+        encoded = await encode_opus(_pcm_chunks((duration_ms, LOUD)))
+
+        assert wav_bytes > GROQ_MAX_UPLOAD_BYTES
+        assert encoded[:4] == b"OggS"
+        assert len(encoded) < duration_ms // 1000 * OPUS_BITRATE // 8 * 1.25
+        assert len(encoded) < GROQ_MAX_UPLOAD_BYTES // 5
+
+
+class TestStreamingTranscription:
+    async def test_large_input_uses_streaming_path(self):
+        in_flight = 0
+        peak = 0
+        texts = iter(["a ", "b ", "c ", "d "])
+
+        async def _speech(audio, content_type):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            text = next(texts)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"text": text}
+
+        mock_wit = MagicMock()
+        mock_wit.speech = _speech
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch.object(settings, "wit_max_concurrent_chunks", 2),
+            patch(
+                "src.transcription.service.stream_pcm",
+                return_value=_blocks((3_000, 0), (70_000, LOUD)),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+            patch("src.transcription.service.decode_audio") as mock_decode,
+        ):
+            result = await transcribe_audio(b"large ogg", "ogg", "en")
+
+        mock_decode.assert_not_called()
+        assert result.text == "a b c d "
+        assert result.wit_requests == 4
+        assert result.duration == 73
+        assert result.speech_duration < result.duration  # leading silence trimmed
+        assert peak <= 2
+
+    async def test_streamed_chunk_retried_once(self):
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(side_effect=[RuntimeError("reset"), {"text": "ok"}])
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch("src.transcription.service.stream_pcm", return_value=_blocks((5_000, LOUD))),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+        ):
+            result = await transcribe_audio(b"large ogg", "ogg", "en")
+
+        assert result.text == "ok"
+        assert result.wit_requests == 1
+
+    async def test_streaming_stops_at_max_seconds(self):
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "x"})
+        blocks = _blocks((120_000, LOUD))
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch("src.transcription.service.stream_pcm", return_value=blocks),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+        ):
+            result = await transcribe_audio(b"large ogg", "ogg", "en", max_seconds=30)
+
+        assert result.duration == result.speech_duration == 30
+        assert result.wit_requests == 2
+        assert blocks.ag_running is False
+        assert blocks.ag_frame is None  # generator closed, ffmpeg would be terminated
+
+    async def test_large_local_file_streamed_from_path(self, tmp_path):
+        source = tmp_path / "voice.oga"
+        source.write_bytes(b"\0" * 64)
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "x"})
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 32),
+            patch(
+                "src.transcription.service.stream_pcm", return_value=_blocks((5_000, LOUD))
+            ) as mock_stream,
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+        ):
+            await transcribe_audio(source, "ogg", "en")
+
+        mock_stream.assert_called_once_with(source)
+
+
+async def _fake_encode(chunks):
+    """encode_opus stand-in: consumes the speech like ffmpeg would, returns its length."""
+    samples = sum([len(chunk.samples) async for chunk in chunks])
+    return f"opus:{samples * 1000 // SAMPLE_RATE}ms".encode()
+
+
+class TestGroqStreamingTranscription:
+    async def test_large_input_streamed_and_encoded(self):
+        mock_groq = AsyncMock(return_value="streamed")
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch(
+                "src.transcription.service.stream_pcm",
+                return_value=_blocks((3_000, 0), (70_000, LOUD)),
+            ),
+            patch("src.transcription.service.encode_opus", _fake_encode),
+            patch("src.transcription.service.transcribe_with_groq", mock_groq),
+            patch("src.transcription.service.decode_audio") as mock_decode,
+        ):
+            result = await transcribe_audio(b"large ogg", "ogg", "en", const.PROVIDER_GROQ)
+
+        mock_decode.assert_not_called()
+        upload, language, audio_format = mock_groq.call_args[0]
+        assert (language, audio_format) == ("en", "ogg")
+        assert upload == f"opus:{70_200}ms".encode()  # leading silence trimmed to keep_ms / 2
+        assert (result.text, result.duration, result.speech_duration) == ("streamed", 73, 70)
+        assert result.wit_requests == 0
+
+    async def test_stops_at_max_seconds(self):
+        blocks = _blocks((120_000, LOUD))
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch("src.transcription.service.stream_pcm", return_value=blocks),
+            patch("src.transcription.service.encode_opus", _fake_encode),
+            patch("src.transcription.service.transcribe_with_groq", AsyncMock(return_value="x")),
+        ):
+            result = await transcribe_audio(
+                b"large ogg", "ogg", "en", const.PROVIDER_GROQ, max_seconds=30
+            )
+
+        assert result.duration == result.speech_duration == 30
+        assert blocks.ag_frame is None  # generator closed, ffmpeg would be terminated
+
+    async def test_upload_capped_at_groq_size_limit(self):
+        blocks = _blocks((60_000, LOUD))
+        mock_groq = AsyncMock(return_value="x")
+
+        with (
+            patch.object(settings, "streaming_decode_min_bytes", 1),
+            patch("src.transcription.service.GROQ_MAX_SPEECH_MS", 25_000),
+            patch("src.transcription.service.stream_pcm", return_value=blocks),
+            patch("src.transcription.service.encode_opus", _fake_encode),
+            patch("src.transcription.service.transcribe_with_groq", mock_groq),
+        ):
+            result = await transcribe_audio(b"large ogg", "ogg", "en", const.PROVIDER_GROQ)
+
+        assert mock_groq.call_args[0][0] == b"opus:25000ms"
+        assert result.speech_duration == 25  # billed for what was sent
+        assert blocks.ag_frame is None
@@ -1,7 +1,46 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from pydub import AudioSegment
+from pydub.generators import Sine
+
 from src import const
-from src.transcription.service import CHUNK_LENGTH_MS, transcribe_audio
+from src.config import settings
+from src.loop_local import LoopLocal
+from src.transcription.audio import SAMPLE_RATE, decode_audio
+from src.transcription.service import CHUNK_LENGTH_MS, _get_wit_semaphore, transcribe_audio
+from src.transcription.wit_client import WitError
+
+
+def _tone_segment(duration_ms: int, frame_rate: int = 22050) -> AudioSegment:
+    """Real in-memory segment (no ffmpeg) standing in for a decoded OGG with speech."""
+    return Sine(440, sample_rate=frame_rate).to_audio_segment(duration=duration_ms, volume=-10)
+
+
+class TestDecodeAudio:
+    """Test single-decode PCM buffer."""
+
+    def test_resamples_to_16k_mono(self):
+        """Decoded buffer is mono 16 kHz regardless of source format."""
+        stereo = _tone_segment(2000).set_channels(2)
+        with patch("src.transcription.audio.AudioSegment.from_file", return_value=stereo):
+            audio = decode_audio(b"audio_data", "ogg")
+
+        assert len(audio.samples) == 2 * SAMPLE_RATE
+        assert audio.duration_ms == 2000
+
+    def test_slice_and_wav_encoding(self):
+        """Slices come from the buffer and encode to WAV without ffmpeg."""
+        with patch(
+            "src.transcription.audio.AudioSegment.from_file", return_value=_tone_segment(3000)
+        ):
+            audio = decode_audio(b"audio_data", "ogg")
+
+        part = audio.slice_ms(1000, 5000)  # end clamped to buffer length
+        assert part.duration_ms == 2000
+        wav = part.to_wav()
+        assert wav[:4] == b"RIFF"
+        assert len(wav) == 44 + 2 * SAMPLE_RATE * 2
 
 
 class TestTranscribeAudio:
@@ -9,38 +48,29 @@ class TestTranscribeAudio:
 
     async def test_transcribes_short_audio(self):
         """Audio shorter than chunk length is transcribed in one call."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=5000)  # 5 seconds
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_audio_segment.export = MagicMock()
-
         mock_wit = MagicMock()
-        mock_wit.speech = MagicMock(return_value={"text": "Hello world"})
+        mock_wit.speech = AsyncMock(return_value={"text": "Hello world"})
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(5000),
             ),
             patch("src.transcription.service.voice_translators", {"en": mock_wit}),
         ):
-            text, duration, _ = await transcribe_audio(b"audio_data", "ogg", "en")
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
 
-            assert text == "Hello world"
-            assert duration == 5
+            assert result.text == "Hello world"
+            assert result.duration == 5
             mock_wit.speech.assert_called_once()
 
     async def test_transcribes_long_audio_in_chunks(self):
         """Audio longer than chunk length is split and transcribed."""
-        # Audio of 40 seconds = 2 chunks
+        # Audio of 40 seconds = 3 chunks (19.5 + 19.5 + 1)
         audio_length = CHUNK_LENGTH_MS * 2 + 1000
 
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=audio_length)
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_audio_segment.export = MagicMock()
-
         mock_wit = MagicMock()
-        mock_wit.speech = MagicMock(
+        mock_wit.speech = AsyncMock(
             side_effect=[
                 {"text": "Part one. "},
                 {"text": "Part two. "},
@@ -50,124 +80,380 @@ class TestTranscribeAudio:
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
-            ),
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(audio_length),
+            ) as mock_from_file,
             patch("src.transcription.service.voice_translators", {"en": mock_wit}),
         ):
-            text, duration, _ = await transcribe_audio(b"audio_data", "ogg", "en")
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
 
-            assert text == "Part one. Part two. Part three."
-            assert duration == 40
+            assert result.text == "Part one. Part two. Part three."
+            assert result.duration == 40
+            assert result.wit_requests == 3
             assert mock_wit.speech.call_count == 3
+            mock_from_file.assert_called_once()
 
     async def test_handles_missing_text_in_response(self):
         """Response without 'text' key returns empty string."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=5000)
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_audio_segment.export = MagicMock()
-
         mock_wit = MagicMock()
-        mock_wit.speech = MagicMock(return_value={})  # No 'text' key
+        mock_wit.speech = AsyncMock(return_value={})  # No 'text' key
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(5000),
             ),
             patch("src.transcription.service.voice_translators", {"en": mock_wit}),
         ):
-            text, _duration, _ = await transcribe_audio(b"audio_data", "ogg", "en")
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
 
-            assert text == ""
+            assert result.text == ""
 
     async def test_uses_correct_language_translator(self):
         """Correct language translator is used."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=5000)
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_audio_segment.export = MagicMock()
-
         mock_wit_ru = MagicMock()
-        mock_wit_ru.speech = MagicMock(return_value={"text": "Привет мир"})
+        mock_wit_ru.speech = AsyncMock(return_value={"text": "Привет мир"})
 
         mock_wit_en = MagicMock()
-        mock_wit_en.speech = MagicMock(return_value={"text": "Hello world"})
+        mock_wit_en.speech = AsyncMock(return_value={"text": "Hello world"})
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(5000),
             ),
             patch(
                 "src.transcription.service.voice_translators",
                 {"ru": mock_wit_ru, "en": mock_wit_en},
             ),
         ):
-            text, _duration, _ = await transcribe_audio(b"audio_data", "ogg", "ru")
+            result = await transcribe_audio(b"audio_data", "ogg", "ru")
 
-            assert text == "Привет мир"
+            assert result.text == "Привет мир"
             mock_wit_ru.speech.assert_called_once()
             mock_wit_en.speech.assert_not_called()
 
-    async def test_exports_to_mp3_format(self):
-        """Audio chunks are exported as MP3."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=5000)
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_export = MagicMock()
-        mock_audio_segment.export = mock_export
-
+    async def test_uploads_wav_without_reencoding(self):
+        """Audio chunks are sent as WAV built from the PCM buffer."""
         mock_wit = MagicMock()
-        mock_wit.speech = MagicMock(return_value={"text": "Test"})
+        mock_wit.speech = AsyncMock(return_value={"text": "Test"})
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(5000),
             ),
             patch("src.transcription.service.voice_translators", {"en": mock_wit}),
         ):
             await transcribe_audio(b"audio_data", "ogg", "en")
 
-            mock_export.assert_called_once()
-            call_kwargs = mock_export.call_args
-            assert call_kwargs[1]["format"] == "mp3"
+            audio, content_type = mock_wit.speech.call_args[0]
+            assert content_type == "audio/wav"
+            assert audio[:4] == b"RIFF"
 
     async def test_groq_transcription(self):
         """Groq path: raw audio bytes sent to Groq API with format hint."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=10000)
-
         mock_groq = AsyncMock(return_value="Groq result")
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(10000),
             ),
             patch("src.transcription.service.transcribe_with_groq", mock_groq),
         ):
-            text, duration, _ = await transcribe_audio(
+            result = await transcribe_audio(
                 b"audio_data", "ogg", "en", provider=const.PROVIDER_GROQ
             )
 
-            assert text == "Groq result"
-            assert duration == 10
+            assert result.text == "Groq result"
+            assert result.duration == 10
             mock_groq.assert_called_once_with(b"audio_data", "en", "ogg")
 
     async def test_returns_duration_in_seconds(self):
         """Duration is returned in seconds."""
-        mock_audio_segment = MagicMock()
-        mock_audio_segment.__len__ = MagicMock(return_value=15500)  # 15.5s -> 15s
-        mock_audio_segment.__getitem__ = MagicMock(return_value=mock_audio_segment)
-        mock_audio_segment.export = MagicMock()
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "Test"})
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(15500),  # 15.5s -> 15s
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+            assert result.duration == 15
+
+
+class TestParallelChunks:
+    """Concurrent Wit.ai chunk transcription with ordered reassembly."""
+
+    async def test_chunks_sent_concurrently_and_reassembled_in_order(self):
+        """Later chunks finishing first does not change text order."""
+        in_flight = 0
+        peak = 0
+        delays = iter([0.03, 0.01, 0.0])
+
+        async def _speech(audio, content_type):
+            nonlocal in_flight, peak
+            text = f"part{len(texts_started)} "
+            texts_started.append(text)
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(next(delays))
+            in_flight -= 1
+            return {"text": text}
+
+        texts_started: list[str] = []
+        mock_wit = MagicMock()
+        mock_wit.speech = _speech
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(CHUNK_LENGTH_MS * 2 + 1000),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.text == "part0 part1 part2 "
+        assert result.wit_requests == 3
+        assert peak == 3
+
+    async def test_concurrency_capped_per_language(self):
+        """No more than wit_max_concurrent_chunks requests in flight per language."""
+        in_flight = 0
+        peak = 0
+
+        async def _speech(audio, content_type):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"text": "x"}
+
+        mock_wit = MagicMock()
+        mock_wit.speech = _speech
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(CHUNK_LENGTH_MS * 5),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+            patch.object(settings, "wit_max_concurrent_chunks", 2),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.text == "xxxxx"
+        assert peak == 2
+
+    async def test_failed_chunk_retried_individually(self):
+        """Only the failed chunk is re-sent; its text lands in the right place."""
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(
+            side_effect=[
+                {"text": "one "},
+                WitError("503"),
+                {"text": "three"},
+                {"text": "two "},
+            ]
+        )
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(CHUNK_LENGTH_MS * 2 + 1000),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch("src.transcription.service._wit_semaphores", LoopLocal(dict)),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.text == "one two three"
+        assert result.wit_requests == 3
+        assert mock_wit.speech.await_count == 4
+
+    async def test_language_cap_not_shared_across_event_loops(self):
+        """The WhatsApp webhook loop gets its own semaphore, not the Telegram loop's."""
+        here = _get_wit_semaphore("en")
+
+        there = await asyncio.to_thread(asyncio.run, _semaphore_in_new_loop("en"))
+
+        assert there is not here
+        assert _get_wit_semaphore("en") is here
+
+
+async def _semaphore_in_new_loop(language: str) -> asyncio.Semaphore:
+    return _get_wit_semaphore(language)
+
+
+class TestSilenceTrimming:
+    """Silence trimming stage in transcribe_audio."""
+
+    def _padded_segment(self) -> AudioSegment:
+        silence = AudioSegment.silent(duration=5000, frame_rate=22050)
+        return silence + _tone_segment(5000) + silence
 
+    async def test_reports_raw_and_speech_durations(self):
         mock_wit = MagicMock()
-        mock_wit.speech = MagicMock(return_value={"text": "Test"})
+        mock_wit.speech = AsyncMock(return_value={"text": "Hi"})
 
         with (
             patch(
-                "src.transcription.service.AudioSegment.from_file", return_value=mock_audio_segment
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=self._padded_segment(),
             ),
             patch("src.transcription.service.voice_translators", {"en": mock_wit}),
         ):
-            _, duration, _ = await transcribe_audio(b"audio_data", "ogg", "en")
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.duration == 15
+        assert result.speech_duration == 5
+        assert result.removed_seconds == 10
+
+    async def test_disabled_keeps_full_audio(self):
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "Hi"})
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=self._padded_segment(),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+            patch.object(settings, "silence_trim_enabled", False),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.speech_duration == result.duration == 15
+
+    async def test_all_silence_skips_provider(self):
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "should not be called"})
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=AudioSegment.silent(duration=8000),
+            ),
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en")
+
+        assert result.text == ""
+        assert result.wit_requests == 0
+        mock_wit.speech.assert_not_called()
+
+    async def test_groq_receives_trimmed_opus(self):
+        mock_groq = AsyncMock(return_value="Groq result")
+        encoded = []
+
+        async def _encode(chunks):
+            encoded.extend([chunk async for chunk in chunks])
+            return b"OggS opus"
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=self._padded_segment(),
+            ),
+            patch("src.transcription.service.encode_opus", _encode),
+            patch("src.transcription.service.transcribe_with_groq", mock_groq),
+        ):
+            result = await transcribe_audio(
+                b"audio_data", "ogg", "en", provider=const.PROVIDER_GROQ
+            )
+
+        assert [chunk.duration_seconds for chunk in encoded] == [result.speech_duration]
+        mock_groq.assert_awaited_once_with(b"OggS opus", "en", "ogg")
+
+
+class TestTruncation:
+    """max_seconds from admission control: only the beginning is transcribed."""
+
+    async def test_in_memory_path_truncates(self):
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "part "})
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(50_000),
+            ) as mock_from_file,
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+        ):
+            result = await transcribe_audio(b"audio_data", "ogg", "en", max_seconds=30)
+
+        assert mock_from_file.call_args.kwargs["duration"] == 30  # ffmpeg stops decoding there
+        assert result.speech_duration == 30
+        assert result.wit_requests == 2
+
+    async def test_groq_never_gets_original_of_truncated_audio(self):
+        """Decoding stopped at max_seconds: the original holds more than may be transcribed."""
+        mock_groq = AsyncMock(return_value="Groq result")
+        mock_encode = AsyncMock(return_value=b"OggS opus")
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(30_000),
+            ),
+            patch("src.transcription.service.encode_opus", mock_encode),
+            patch("src.transcription.service.transcribe_with_groq", mock_groq),
+        ):
+            result = await transcribe_audio(
+                b"original", "ogg", "en", provider=const.PROVIDER_GROQ, max_seconds=30
+            )
+
+        assert result.speech_duration == 30
+        mock_groq.assert_awaited_once_with(b"OggS opus", "en", "ogg")
+
+
+class TestLocalFileSource:
+    """Local Bot API server mode: audio is read from disk, not passed as bytes."""
+
+    async def test_path_is_decoded_in_place(self, tmp_path):
+        source = tmp_path / "voice.oga"
+        source.write_bytes(b"ogg data")
+        mock_wit = MagicMock()
+        mock_wit.speech = AsyncMock(return_value={"text": "local"})
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(3000),
+            ) as mock_from_file,
+            patch("src.transcription.service.voice_translators", {"en": mock_wit}),
+        ):
+            result = await transcribe_audio(source, "ogg", "en")
+
+        assert result.text == "local"
+        assert mock_from_file.call_args[0][0] == str(source)
+
+    async def test_groq_uploads_from_memory_map(self, tmp_path):
+        source = tmp_path / "voice.oga"
+        source.write_bytes(b"ogg data")
+        uploaded = []
+
+        async def _groq(audio, language, audio_format):
+            uploaded.append(audio[:])
+            return "Groq result"
+
+        with (
+            patch(
+                "src.transcription.audio.AudioSegment.from_file",
+                return_value=_tone_segment(3000),
+            ),
+            patch("src.transcription.service.transcribe_with_groq", _groq),
+        ):
+            result = await transcribe_audio(source, "ogg", "en", provider=const.PROVIDER_GROQ)
 
-            assert duration == 15
+        assert result.text == "Groq result"
+        assert uploaded == [b"ogg data"]
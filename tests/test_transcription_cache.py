@@ -0,0 +1,160 @@
+"""Tests for the two-tier transcription result cache and single-flight."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from src.config import settings
+from src.dto import CachedTranscription
+from src.transcription.cache import (
+    TranscriptionCache,
+    content_id,
+    transcription_cache,
+    transcription_key,
+)
+from src.transcription.service import TranscriptionResult
+
+
+class TestKeys:
+    def test_key_separates_language_and_provider(self):
+        keys = {
+            transcription_key("AgAD1", "en", "wit"),
+            transcription_key("AgAD1", "ru", "wit"),
+            transcription_key("AgAD1", "en", "groq"),
+        }
+
+        assert len(keys) == 3
+
+    def test_content_id_is_stable(self):
+        assert content_id(b"audio") == content_id(bytes(bytearray(b"audio")))
+        assert content_id(b"audio") != content_id(b"other")
+
+
+class TestTranscriptionCache:
+    async def test_miss_then_memory_hit(self):
+        key = transcription_key("AgAD1", "en", "wit")
+
+        assert await transcription_cache.get(key) is None
+        await transcription_cache.put(key, TranscriptionResult("hello", 12, 9, 1))
+        hit = await transcription_cache.get(key)
+
+        assert hit == TranscriptionResult("hello", 12, 9, 0, cached=True)
+        stats = transcription_cache.stats()
+        assert (stats.memory_hits, stats.mongo_hits, stats.misses) == (1, 0, 1)
+        assert stats.hit_rate == 0.5
+
+    async def test_mongo_tier_shared_across_processes(self):
+        key = transcription_key("AgAD2", "en", "wit")
+        await transcription_cache.put(key, TranscriptionResult("shared", 30, 25, 2))
+
+        other_instance = TranscriptionCache()
+        hit = await other_instance.get(key)
+
+        assert hit is not None
+        assert hit.text == "shared"
+        assert hit.speech_duration == 25
+        assert other_instance.stats().mongo_hits == 1
+        # Promoted to the in-process tier
+        await other_instance.get(key)
+        assert other_instance.stats().memory_hits == 1
+
+    async def test_empty_text_not_cached(self):
+        key = transcription_key("AgAD3", "en", "wit")
+
+        await transcription_cache.put(key, TranscriptionResult("", 5, 0, 0))
+
+        assert await transcription_cache.get(key) is None
+        assert await CachedTranscription.find_one(CachedTranscription.key == key) is None
+
+    async def test_duplicate_put_is_ignored(self):
+        key = transcription_key("AgAD4", "en", "wit")
+        await transcription_cache.put(key, TranscriptionResult("first", 5, 5, 1))
+
+        await TranscriptionCache().put(key, TranscriptionResult("second", 5, 5, 1))
+
+        docs = await CachedTranscription.find(CachedTranscription.key == key).to_list()
+        assert [doc.text for doc in docs] == ["first"]
+
+    async def test_lru_evicts_oldest(self):
+        cache = TranscriptionCache()
+        with patch.object(settings, "transcription_cache_size", 2):
+            for audio_id in ("a", "b", "c"):
+                await cache.put(audio_id, TranscriptionResult(audio_id, 1, 1, 1))
+
+            assert cache.stats().size == 2
+            await cache.get("a")  # evicted from memory, still in Mongo
+
+        stats = cache.stats()
+        assert (stats.memory_hits, stats.mongo_hits) == (0, 1)
+
+    async def test_disabled_cache(self):
+        key = transcription_key("AgAD5", "en", "wit")
+        with patch.object(settings, "transcription_cache_size", 0):
+            await transcription_cache.put(key, TranscriptionResult("text", 5, 5, 1))
+
+            assert await transcription_cache.get(key) is None
+
+        assert await CachedTranscription.find_one(CachedTranscription.key == key) is None
+
+
+class TestSingleFlight:
+    async def test_concurrent_requests_share_one_job(self):
+        key = transcription_key("AgAD6", "en", "wit")
+        calls = 0
+
+        async def _transcribe():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return TranscriptionResult("once", 40, 35, 3)
+
+        results = await asyncio.gather(
+            *(transcription_cache.get_or_transcribe(key, _transcribe) for _ in range(5))
+        )
+
+        assert calls == 1
+        assert sorted(r.wit_requests for r in results) == [0, 0, 0, 0, 3]
+        assert [r.text for r in results] == ["once"] * 5
+        stats = transcription_cache.stats()
+        assert (stats.shared, stats.misses, stats.in_flight) == (4, 1, 0)
+
+    async def test_failure_propagates_then_next_call_retries(self):
+        key = transcription_key("AgAD7", "en", "wit")
+
+        async def _fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("wit down")
+
+        results = await asyncio.gather(
+            transcription_cache.get_or_transcribe(key, _fail),
+            transcription_cache.get_or_transcribe(key, _fail),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        retry = await transcription_cache.get_or_transcribe(
+            key, AsyncMock(return_value=TranscriptionResult("ok", 5, 5, 1))
+        )
+        assert retry.text == "ok"
+
+    async def test_follower_takes_over_when_leader_cancelled(self):
+        key = transcription_key("AgAD8", "en", "wit")
+        started = asyncio.Event()
+
+        async def _hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(transcription_cache.get_or_transcribe(key, _hang))
+        await started.wait()
+        follower = asyncio.create_task(
+            transcription_cache.get_or_transcribe(
+                key, AsyncMock(return_value=TranscriptionResult("mine", 5, 5, 1))
+            )
+        )
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        result = await follower
+        assert result.text == "mine"
+        assert result.wit_requests == 1
+        assert leader.cancelled()
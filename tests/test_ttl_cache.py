@@ -0,0 +1,138 @@
+"""Tests for the TTL+LRU cache and the cached settings and bot config reads."""
+
+from unittest.mock import patch
+
+from src.dto import BotConfig, UserSettings
+from src.mongo import (
+    bot_config_cache,
+    find_user_settings,
+    find_user_settings_many,
+    get_bot_config,
+    get_chat_language,
+    set_bot_config,
+    set_chat_language,
+    user_settings_cache,
+)
+from src.ttl_cache import MISSING, TtlCache
+
+
+class TestTtlCache:
+    def test_miss_is_distinct_from_cached_none(self):
+        cache = TtlCache("test", maxsize=4, ttl_seconds=60)
+        cache.put("absent", None)
+
+        assert cache.get("absent") is None
+        assert cache.get("unknown") is MISSING
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.hit_rate) == (1, 1, 0.5)
+
+    def test_evicts_least_recently_used(self):
+        cache = TtlCache("test", maxsize=2, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is MISSING
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    def test_entries_expire(self):
+        cache = TtlCache("test", maxsize=4, ttl_seconds=10)
+        with patch("src.ttl_cache.time.monotonic", return_value=100.0):
+            cache.put("a", 1)
+        with patch("src.ttl_cache.time.monotonic", return_value=109.0):
+            assert cache.get("a") == 1
+        with patch("src.ttl_cache.time.monotonic", return_value=111.0):
+            assert cache.get("a") is MISSING
+        assert cache.stats().size == 0
+
+    def test_zero_size_disables(self):
+        cache = TtlCache("test", maxsize=0, ttl_seconds=60)
+        cache.put("a", 1)
+
+        assert cache.get("a") is MISSING
+
+    def test_put_after_invalidate_skipped_for_older_read(self):
+        cache = TtlCache("test", maxsize=10, ttl_seconds=60)
+        generation = cache.generation("a")  # a read starts
+        cache.invalidate("a")  # a writer changes the value meanwhile
+
+        cache.put("a", "stale", generation)
+        assert cache.get("a") is MISSING
+
+        cache.put("a", "fresh", cache.generation("a"))
+        assert cache.get("a") == "fresh"
+
+    def test_generations_reset_with_new_epoch(self):
+        cache = TtlCache("test", maxsize=2, ttl_seconds=60)
+        generation = cache.generation("a")
+        for key in ("a", "b", "c"):  # "c" overflows the tracked keys
+            cache.invalidate(key)
+
+        cache.put("a", "stale", generation)
+
+        assert cache.get("a") is MISSING
+
+
+class TestCachedSettings:
+    async def test_repeated_reads_hit_cache(self):
+        await set_chat_language("u_cache_reads", "de")
+        await get_chat_language("u_cache_reads")
+
+        with patch.object(UserSettings, "find_one", side_effect=AssertionError("db read")):
+            assert await get_chat_language("u_cache_reads") == "de"
+        assert user_settings_cache.stats().hits >= 1
+
+    async def test_setter_invalidates(self):
+        await set_chat_language("u_cache_write", "de")
+        assert await get_chat_language("u_cache_write") == "de"
+
+        await set_chat_language("u_cache_write", "es")
+
+        assert await get_chat_language("u_cache_write") == "es"
+
+    async def test_unknown_chat_cached_until_created(self):
+        assert await find_user_settings("u_cache_new") is None
+        assert user_settings_cache.get("u_cache_new") is None
+
+        await set_chat_language("u_cache_new", "ru")
+
+        assert (await find_user_settings("u_cache_new")).language == "ru"
+
+    async def test_many_queries_only_misses(self):
+        await set_chat_language("u_cache_a", "de")
+        await find_user_settings("u_cache_a")
+
+        found = await find_user_settings_many(["u_cache_a", "u_cache_b", "u_cache_a"])
+
+        assert found["u_cache_a"].language == "de"
+        assert found["u_cache_b"] is None
+        assert user_settings_cache.get("u_cache_b") is None
+
+    async def test_read_racing_setter_does_not_cache_old_value(self):
+        await set_chat_language("u_cache_race", "de")
+        real_find_one = UserSettings.find_one
+
+        async def _find_one_then_setter_runs(*args, **kwargs):
+            doc = await real_find_one(*args, **kwargs)
+            await set_chat_language("u_cache_race", "es")  # lands before the read returns
+            return doc
+
+        with patch.object(UserSettings, "find_one", side_effect=_find_one_then_setter_runs):
+            assert (await find_user_settings("u_cache_race")).language == "de"
+
+        assert await get_chat_language("u_cache_race") == "es"
+
+
+class TestCachedBotConfig:
+    async def test_reads_cached_and_set_invalidates(self):
+        assert await get_bot_config("cache_key", "fallback") == "fallback"
+        await set_bot_config("cache_key", "v1")
+        assert await get_bot_config("cache_key") == "v1"
+
+        with patch.object(BotConfig, "find_one", side_effect=AssertionError("db read")):
+            assert await get_bot_config("cache_key") == "v1"
+
+        await set_bot_config("cache_key", "v2")
+        assert await get_bot_config("cache_key") == "v2"
+        assert bot_config_cache.stats().hits >= 1
@@ -0,0 +1,116 @@
+"""Tests for the per-update user context loader."""
+
+from unittest.mock import patch
+
+from src.account_linking import confirm_link, generate_link_code
+from src.config import settings
+from src.credits import add_credits, get_user_tier
+from src.dto import UserCredits, UserTier
+from src.mongo import (
+    add_user_role,
+    set_auto_categorize,
+    set_auto_cleanup,
+    set_chat_language,
+    set_github_settings,
+    set_gpt_command,
+    set_preferred_provider,
+    set_save_to_obsidian,
+)
+from src.user_context import load_user_context, personal_chat_id
+
+
+class TestLoadUserContext:
+    async def test_defaults_for_unknown_user(self):
+        user = await load_user_context("ctx_new", "u_ctx_new")
+
+        assert user.language == settings.default_language
+        assert user.gpt_command == settings.telegram_bot_command
+        assert user.preferred_provider is None
+        assert not (user.auto_cleanup or user.auto_categorize or user.save_to_obsidian)
+        assert user.github_settings == {}
+        assert user.tier == UserTier.FREE
+        assert not user.is_blocked
+        assert user.linked_whatsapp is None
+
+    async def test_private_chat_settings(self):
+        chat_id = "u_ctx_private"
+        await set_chat_language(chat_id, "de")
+        await set_gpt_command(chat_id, "jarvis")
+        await set_preferred_provider(chat_id, "groq")
+        await set_auto_cleanup(chat_id, True)
+        await set_github_settings(chat_id, "owner", "repo", "token")
+        await set_save_to_obsidian(chat_id, True)
+        await set_auto_categorize(chat_id, True)
+
+        user = await load_user_context("ctx_private", chat_id)
+
+        assert user.settings_chat_id == chat_id
+        assert (user.language, user.gpt_command, user.preferred_provider) == (
+            "de",
+            "jarvis",
+            "groq",
+        )
+        assert user.auto_cleanup and user.save_to_obsidian and user.auto_categorize
+        assert user.github_settings == {"owner": "owner", "repo": "repo", "token": "token"}
+
+    async def test_group_chat_uses_personal_settings_for_integrations(self):
+        await set_chat_language("g_ctx", "es")
+        await set_auto_cleanup("g_ctx", True)
+        await set_auto_cleanup("u_ctx_member", False)
+        await set_save_to_obsidian("u_ctx_member", True)
+
+        user = await load_user_context("ctx_member", "g_ctx")
+
+        assert user.settings_chat_id == "u_ctx_member"
+        assert user.language == "es"
+        assert not user.auto_cleanup
+        assert user.save_to_obsidian
+
+    async def test_incomplete_github_settings_ignored(self):
+        await set_github_settings("u_ctx_gh", "owner", "", "token")
+
+        user = await load_user_context("ctx_gh", "u_ctx_gh")
+
+        assert user.github_settings == {}
+
+    async def test_roles_and_tier_match_single_lookups(self):
+        await add_user_role("ctx_tester", "tester", "admin")
+        await add_user_role("ctx_blocked", "blocked", "admin")
+        await add_credits("ctx_paid", 100)
+        await UserCredits.find_one(UserCredits.user_id == "ctx_paid").set(
+            {UserCredits.tier: UserTier.PAID}
+        )
+
+        for user_id, tier in (
+            ("ctx_tester", UserTier.TESTER),
+            ("ctx_paid", UserTier.PAID),
+            ("ctx_blocked", UserTier.FREE),
+        ):
+            user = await load_user_context(user_id, f"u_{user_id}")
+            assert user.tier == tier == await get_user_tier(user_id)
+
+        blocked = await load_user_context("ctx_blocked", "u_ctx_blocked")
+        assert blocked.is_blocked
+        tester = await load_user_context("ctx_tester", "u_ctx_tester")
+        assert tester.has_unlimited_voice
+
+    async def test_env_vip(self):
+        with patch.object(settings, "vip_user_ids_raw", "ctx_env_vip"):
+            user = await load_user_context("ctx_env_vip", "u_ctx_env_vip")
+
+            assert user.tier == UserTier.VIP
+            assert user.has_unlimited_voice
+
+    async def test_linked_whatsapp(self):
+        code = await generate_link_code("ctx_linked")
+        await confirm_link(code, "15550001111")
+
+        user = await load_user_context("ctx_linked", "u_ctx_linked")
+
+        assert user.linked_whatsapp == "15550001111"
+
+
+class TestPersonalChatId:
+    def test_group_defers_to_private_chat(self):
+        assert personal_chat_id("42", "g_-100") == "u_42"
+        assert personal_chat_id("42", "u_42") == "u_42"
@@ -1,13 +1,24 @@
+import asyncio
+import pathlib
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from telegram.constants import ChatMemberStatus
+from telegram.error import BadRequest, TimedOut
 from telegram.ext import ConversationHandler
 
 from src.account_linking import confirm_link, generate_link_code
-from src.config import ENGLISH, GERMAN, RUSSIAN, SPANISH
-from src.credits import add_credits, current_month_key, deduct_credits
-from src.dto import MonthlyStats
+from src.config import ENGLISH, GERMAN, RUSSIAN, SPANISH, settings
+from src.credits import (
+    add_credits,
+    current_month_key,
+    get_credits,
+    get_monthly_stats,
+    reserve_credits,
+)
+from src.dto import QueuedJob, UserMonthlyUsage, UserTier
+from src.jobs import PermanentJobError
+from src.localization import translates
 from src.mongo import (
     add_user_role,
     get_auto_categorize,
@@ -15,6 +26,7 @@ from src.mongo import (
     get_chat_language,
     get_github_settings,
     get_gpt_command,
+    get_recent_transcriptions,
     get_save_to_obsidian,
     set_auto_categorize,
     set_auto_cleanup,
@@ -23,6 +35,7 @@ from src.mongo import (
     set_gpt_command,
     set_save_to_obsidian,
 )
+from src.telegram.chat_params import get_chat_id
 from src.telegram.handlers import (
     WAITING_FOR_COMMAND,
     account_hub,
@@ -41,7 +54,13 @@ from src.telegram.handlers import (
     toggle_cleanup,
     toggle_obsidian,
 )
-from src.telegram.voice import from_voice_to_text
+from src.telegram.voice import (
+    JOB_TELEGRAM_VOICE,
+    from_voice_to_text,
+    process_voice_message,
+    run_voice_job,
+)
+from src.transcription.service import TranscriptionResult
 
 
 class TestStartCommand:
@@ -229,7 +248,9 @@ class TestVoiceMessageFlow:
         await add_credits(user_id, 100)
         mock_private_update.message.voice = None
         mock_private_update.message.audio = mock_telegram_audio
-        voice_external_mocks["transcribe"].return_value = ("Audio text", 30, 1)
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult(
+            "Audio text", 30, 30, 1
+        )
 
         await from_voice_to_text(mock_private_update, mock_context)
 
@@ -266,7 +287,7 @@ class TestVoiceMessageFlow:
         mock_private_update.effective_chat.id = 12351
 
         await set_chat_language(chat_id, "en")
-        await deduct_credits(user_id, 100)
+        await reserve_credits(user_id, 100)
         mock_private_update.message.voice = mock_telegram_voice
 
         with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
@@ -275,6 +296,64 @@ class TestVoiceMessageFlow:
         call_kwargs = voice_external_mocks["send"].call_args.kwargs
         assert "token" in call_kwargs["response"].lower()
 
+    async def test_rejected_voice_not_downloaded(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Admission rejects from metadata: no get_file, no transcription."""
+        mock_private_update.effective_user.id = 12368
+        mock_private_update.effective_chat.id = 12368
+        await set_chat_language("u_12368", "en")
+        mock_telegram_voice.duration = 900
+        mock_private_update.message.voice = mock_telegram_voice
+
+        with (
+            patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)),
+            patch.object(settings, "voice_over_limit_action", "reject"),
+        ):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        mock_telegram_voice.get_file.assert_not_called()
+        voice_external_mocks["transcribe"].assert_not_called()
+        # 900 s costs 45 tokens, the free balance covers 10
+        assert "tokens" in voice_external_mocks["send"].call_args.kwargs["response"]
+
+    async def test_long_voice_truncated_to_balance(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Over-balance audio is transcribed up to what the user can afford, with a notice."""
+        mock_private_update.effective_user.id = 12369
+        mock_private_update.effective_chat.id = 12369
+        await set_chat_language("u_12369", "en")
+        mock_telegram_voice.duration = 900
+        mock_private_update.message.voice = mock_telegram_voice
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        assert voice_external_mocks["transcribe"].call_args.kwargs["max_seconds"] == 200
+        notice = voice_external_mocks["send"].call_args.kwargs["response"]
+        assert "first 200 seconds" in notice
+
+    async def test_local_bot_api_reads_file_in_place(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Local Bot API server mode: the file path is transcribed, nothing is downloaded."""
+        mock_private_update.effective_user.id = 12370
+        mock_private_update.effective_chat.id = 12370
+        await set_chat_language("u_12370", "en")
+        local_path = "/var/lib/telegram-bot-api/TOKEN/voice/file_1.oga"
+        mock_telegram_voice.get_file.return_value.file_path = local_path
+        mock_private_update.message.voice = mock_telegram_voice
+
+        with (
+            patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)),
+            patch.object(settings, "telegram_api_base_url", "http://bot-api:8081"),
+        ):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        assert voice_external_mocks["transcribe"].call_args[0][0] == pathlib.Path(local_path)
+        mock_telegram_voice.get_file.return_value.download_as_bytearray.assert_not_called()
+
     async def test_groq_provider_records_usage(
         self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
     ):
@@ -287,7 +366,7 @@ class TestVoiceMessageFlow:
         await set_chat_language(chat_id, "en")
         await add_credits(user_id, 100)
         mock_private_update.message.voice = mock_telegram_voice
-        voice_external_mocks["transcribe"].return_value = ("Hello", 10, 1)
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult("Hello", 10, 10, 1)
 
         with (
             patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=False)),
@@ -296,10 +375,200 @@ class TestVoiceMessageFlow:
             await from_voice_to_text(mock_private_update, mock_context)
 
         month_key = current_month_key()
-        stats = await MonthlyStats.find_one(MonthlyStats.month_key == month_key)
+        stats = await get_monthly_stats(month_key)
         assert stats is not None
         assert stats.groq_audio_seconds >= 10
 
+    async def test_billing_uses_speech_duration(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Trimmed silence is not billed: 70 s raw, 30 s speech -> 2 tokens, not 4."""
+        user_id = "12362"
+        chat_id = "u_12362"
+        mock_private_update.effective_user.id = 12362
+        mock_private_update.effective_chat.id = 12362
+
+        await set_chat_language(chat_id, "en")
+        await add_credits(user_id, 100)
+        mock_private_update.message.voice = mock_telegram_voice
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult("Hi", 70, 30, 2)
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        free, purchased = await get_credits(user_id)
+        assert free + purchased == settings.free_monthly_tokens + 100 - 2
+
+    async def test_retried_voice_job_billed_once(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """The reply fails after billing: the job's retry replies without charging again."""
+        await set_chat_language("u_12368", "en")
+        await add_credits("12368", 100)
+        mock_private_update.effective_user.id = 12368
+        mock_private_update.effective_chat.id = 12368
+        mock_private_update.message.voice = mock_telegram_voice
+        voice_external_mocks["send"].side_effect = [BadRequest("Message to reply not found"), None]
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            with pytest.raises(BadRequest):
+                await process_voice_message(mock_private_update, mock_context)
+            await process_voice_message(mock_private_update, mock_context)  # the retry
+
+        assert voice_external_mocks["send"].call_args.kwargs["response"] == "Hello world"
+        free, purchased = await get_credits("12368")
+        assert free + purchased == settings.free_monthly_tokens + 100 - 1
+        usage = await UserMonthlyUsage.find_one({"user_id": "12368"})
+        assert usage.transcriptions == 1
+
+    async def test_forwarded_voice_served_from_cache(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Same file_unique_id in another chat: no download, no Wit usage, still billed."""
+        await set_chat_language("u_12363", "en")
+        await set_chat_language("u_12364", "en")
+        await add_credits("12364", 100)
+        mock_private_update.message.voice = mock_telegram_voice
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            for user in (12363, 12364):
+                mock_private_update.effective_user.id = user
+                mock_private_update.effective_chat.id = user
+                await from_voice_to_text(mock_private_update, mock_context)
+
+        voice_external_mocks["transcribe"].assert_awaited_once()
+        mock_telegram_voice.get_file.assert_awaited_once()
+        voice_external_mocks["alerts"].assert_awaited_once()
+        assert voice_external_mocks["send"].call_args.kwargs["response"] == "Hello world"
+        free, purchased = await get_credits("12364")
+        assert free + purchased == settings.free_monthly_tokens + 100 - 1
+
+    async def test_simultaneous_forwards_transcribed_once(
+        self, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """The same voice arriving in several chats at once makes one provider call."""
+
+        async def _slow_transcribe(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return TranscriptionResult("Hello world", 5, 5, 1)
+
+        voice_external_mocks["transcribe"].side_effect = _slow_transcribe
+        updates = []
+        for user in (12365, 12366, 12367):
+            await set_chat_language(f"u_{user}", "en")
+            update = MagicMock()
+            update.effective_user.id = user
+            update.effective_chat.id = user
+            update.effective_chat.type = "private"
+            update.message.voice = mock_telegram_voice
+            update.message.message_id = 1
+            updates.append(update)
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            await asyncio.gather(*(from_voice_to_text(u, mock_context) for u in updates))
+
+        voice_external_mocks["transcribe"].assert_awaited_once()
+        mock_telegram_voice.get_file.assert_awaited_once()
+        assert voice_external_mocks["send"].await_count == 3
+
+    async def test_burst_from_one_user_does_not_overdraft(
+        self, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Messages of one user are admitted and billed in turn against the real balance."""
+        await set_chat_language("u_12370", "en")
+        await reserve_credits("12370", settings.free_monthly_tokens - 1)  # one token left
+        updates = []
+        for message_id in range(3):
+            update = MagicMock()
+            update.effective_user.id = 12370
+            update.effective_chat.id = 12370
+            update.effective_chat.type = "private"
+            update.message.voice = mock_telegram_voice
+            update.message.message_id = message_id
+            updates.append(update)
+
+        with patch("src.telegram.voice.is_wit_available", AsyncMock(return_value=True)):
+            await asyncio.gather(*(from_voice_to_text(u, mock_context) for u in updates))
+
+        responses = [c.kwargs["response"] for c in voice_external_mocks["send"].call_args_list]
+        assert responses.count("Hello world") == 1
+        assert translates["credits_exhausted_warning"]["en"] not in responses
+        assert await get_credits("12370") == (0, 0)
+
+    async def test_free_voice_shed_when_overloaded(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """Saturated bot: free users get a localized busy reply, nothing is queued."""
+        await set_chat_language("u_12369", "de")
+        mock_private_update.effective_user.id = 12369
+        mock_private_update.effective_chat.id = 12369
+        mock_private_update.message.voice = mock_telegram_voice
+
+        with patch("src.governor.expected_wait_seconds", AsyncMock(return_value=900.0)):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        response = voice_external_mocks["send"].call_args.kwargs["response"]
+        assert response == translates["server_busy"]["de"]
+        mock_telegram_voice.get_file.assert_not_awaited()
+        assert await QueuedJob.count() == 0
+
+    async def test_voice_queued_when_worker_pool_running(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """With the worker pool up, the handler only persists the update."""
+        mock_private_update.message.voice = mock_telegram_voice
+        mock_private_update.to_dict.return_value = {"update_id": 7}
+
+        with patch("src.telegram.voice.job_pool", MagicMock(running=True)):
+            await from_voice_to_text(mock_private_update, mock_context)
+
+        job = await QueuedJob.find_one()
+        assert (job.kind, job.payload) == (JOB_TELEGRAM_VOICE, {"update": {"update_id": 7}})
+        assert (job.chat_id, job.tier) == (get_chat_id(mock_private_update), UserTier.FREE)
+        voice_external_mocks["transcribe"].assert_not_awaited()
+        mock_telegram_voice.get_file.assert_not_awaited()
+
+    async def test_voice_job_rebuilds_update(self, mock_bot):
+        """The queued payload is turned back into a real Update for the pipeline."""
+        payload = {
+            "update": {
+                "update_id": 7,
+                "message": {
+                    "message_id": 3,
+                    "date": 0,
+                    "chat": {"id": 12368, "type": "private"},
+                    "from": {"id": 12368, "is_bot": False, "first_name": "A"},
+                    "voice": {
+                        "file_id": "f",
+                        "file_unique_id": "AgADqueued",
+                        "duration": 4,
+                    },
+                },
+            }
+        }
+        application = MagicMock(bot=mock_bot)
+
+        with patch("src.telegram.voice.process_voice_message", AsyncMock()) as process:
+            await run_voice_job(application, payload)
+
+        update, _context = process.await_args.args
+        assert update.message.voice.file_unique_id == "AgADqueued"
+        assert update.effective_user.id == 12368
+
+    async def test_voice_job_rejected_by_telegram_not_retried(self, mock_bot):
+        """BadRequest (deleted reply target, bad markup) would recur on every retry."""
+        payload = {"update": {"update_id": 8}}
+        application = MagicMock(bot=mock_bot)
+
+        with (
+            patch(
+                "src.telegram.voice.process_voice_message",
+                AsyncMock(side_effect=BadRequest("Message to reply not found")),
+            ),
+            pytest.raises(PermanentJobError),
+        ):
+            await run_voice_job(application, payload)
+
     async def test_voice_message_with_auto_categorize(
         self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
     ):
@@ -313,10 +582,13 @@ class TestVoiceMessageFlow:
         await set_gpt_command(chat_id, "евлампий")
         await add_credits(user_id, 100)
         await set_github_settings(chat_id, "owner", "repo", "token")
+        await set_save_to_obsidian(chat_id, True)
         await set_auto_categorize(chat_id, True)
 
         mock_private_update.message.voice = mock_telegram_voice
-        voice_external_mocks["transcribe"].return_value = ("Note content", 5, 1)
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult(
+            "Note content", 5, 5, 1
+        )
         voice_external_mocks["obsidian"].return_value = (True, "note.md")
 
         await from_voice_to_text(mock_private_update, mock_context)
@@ -355,7 +627,9 @@ class TestVoiceMessageFlow:
         await add_credits(user_id, 100)
 
         mock_private_update.message.voice = mock_telegram_voice
-        voice_external_mocks["transcribe"].return_value = ("евлампий расскажи анекдот", 10, 1)
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult(
+            "евлампий расскажи анекдот", 10, 10, 1
+        )
 
         await from_voice_to_text(mock_private_update, mock_context)
 
@@ -375,7 +649,7 @@ class TestVoiceMessageFlow:
         await add_credits(user_id, 100)
 
         mock_private_update.message.voice = mock_telegram_voice
-        voice_external_mocks["transcribe"].return_value = ("", 0, 0)
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult("", 0, 0, 0)
 
         await from_voice_to_text(mock_private_update, mock_context)
 
@@ -400,10 +674,8 @@ class TestVoiceMessageWithCleanup:
         await set_auto_cleanup(chat_id, True)
 
         mock_private_update.message.voice = mock_telegram_voice
-        voice_external_mocks["transcribe"].return_value = (
-            "ну вот значит я хотел сказать что проект классный",
-            5,
-            1,
+        voice_external_mocks["transcribe"].return_value = TranscriptionResult(
+            "ну вот значит я хотел сказать что проект классный", 5, 5, 1
         )
         voice_external_mocks["cleanup"].side_effect = None
         voice_external_mocks["cleanup"].return_value = "Я хотел сказать, что проект классный."
@@ -412,6 +684,32 @@ class TestVoiceMessageWithCleanup:
 
         voice_external_mocks["cleanup"].assert_called_once()
 
+    async def test_retried_job_does_not_repeat_side_effects(
+        self, mock_private_update, mock_context, mock_telegram_voice, voice_external_mocks
+    ):
+        """The reply fails once: the retry reuses the cleanup, note and recent entry."""
+        chat_id = "u_12361"
+        mock_private_update.effective_user.id = 12361
+        mock_private_update.effective_chat.id = 12361
+        await set_chat_language(chat_id, "en")
+        await add_credits("12361", 100)
+        await set_auto_cleanup(chat_id, True)
+        await set_github_settings(chat_id, "owner", "repo", "token")
+        await set_save_to_obsidian(chat_id, True)
+        mock_private_update.message.voice = mock_telegram_voice
+        voice_external_mocks["cleanup"].side_effect = ["Cleaned.", "Cleaned again."]
+        voice_external_mocks["obsidian"].return_value = (True, "note.md")
+        voice_external_mocks["send"].side_effect = [TimedOut(), None]
+
+        with pytest.raises(TimedOut):
+            await process_voice_message(mock_private_update, mock_context)
+        await process_voice_message(mock_private_update, mock_context)  # the retry
+
+        voice_external_mocks["cleanup"].assert_awaited_once()
+        voice_external_mocks["obsidian"].assert_awaited_once()
+        assert voice_external_mocks["send"].call_args.kwargs["response"] == "Cleaned."
+        assert await get_recent_transcriptions(chat_id) == ["Cleaned."]
+
 
 class TestToggleCleanup:
     """Test /toggle_cleanup command with real DB."""
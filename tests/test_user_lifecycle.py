@@ -3,16 +3,21 @@
 from unittest.mock import patch
 
 from src.credits import (
+    DeductResult,
     add_credits,
-    can_perform_operation,
-    deduct_credits,
     get_credits,
     get_total_credits,
     get_user_tier,
+    reserve_credits,
+    settle_credits,
 )
 from src.dto import UserCredits, UserTier
 
 
+async def _bill(user_id: str, cost: int) -> DeductResult:
+    return await settle_credits(await reserve_credits(user_id, cost), cost)
+
+
 class TestUserLifecycle:
     """Full user lifecycle integration test with token-based billing."""
 
@@ -27,13 +32,8 @@ class TestUserLifecycle:
         assert await get_total_credits(user_id) == 10
         assert await get_user_tier(user_id) == UserTier.FREE
 
-        # 2. Can perform operations with free tokens
-        ok, msg = await can_perform_operation(user_id, 5)
-        assert ok is True
-        assert msg == ""
-
-        # 3. Deduct uses free tokens first
-        result = await deduct_credits(user_id, 3)
+        # 2. Billing uses free tokens first
+        result = await _bill(user_id, 3)
         assert result.free_used == 3
         assert result.purchased_used == 0
         assert result.overdraft is False
@@ -42,13 +42,13 @@ class TestUserLifecycle:
         assert free == 7
         assert purchased == 0
 
-        # 4. Purchase changes tier to PAID
+        # 3. Purchase changes tier to PAID
         await add_credits(user_id, 20)
         assert await get_user_tier(user_id) == UserTier.PAID
         assert await get_total_credits(user_id) == 27  # 7 free + 20 purchased
 
-        # 5. Deduct spills from free to purchased
-        result = await deduct_credits(user_id, 10)
+        # 4. Billing spills from free to purchased
+        result = await _bill(user_id, 10)
         assert result.free_used == 7
         assert result.purchased_used == 3
         assert result.overdraft is False
@@ -57,35 +57,26 @@ class TestUserLifecycle:
         assert free == 0
         assert purchased == 17
 
-        # 6. Overdraft: deducts what's available
-        result = await deduct_credits(user_id, 100)
+        # 5. Overdraft: takes what's available
+        result = await _bill(user_id, 100)
         assert result.free_used == 0
         assert result.purchased_used == 17
         assert result.overdraft is True
 
         assert await get_total_credits(user_id) == 0
 
-        # 7. Cannot perform when empty
-        ok, msg = await can_perform_operation(user_id, 1)
-        assert ok is False
-        assert msg == "insufficient_credits"
-
-        # 8. Month rollover resets free tokens
+        # 6. Month rollover resets free tokens
         with patch("src.credits.current_month_key", return_value="2099-12"):
             free, purchased = await get_credits(user_id)
             assert free == 10  # reset
             assert purchased == 0  # still 0
 
-            # Can perform again with fresh free tokens
-            ok, _ = await can_perform_operation(user_id, 5)
-            assert ok is True
-
     async def test_delete_and_rejoin(self):
         """After account deletion, user gets fresh free tokens (no UsedTrial needed)."""
         user_id = "888888"
 
         # Use some tokens
-        await deduct_credits(user_id, 5)
+        await _bill(user_id, 5)
         assert await get_total_credits(user_id) == 5
 
         # Delete user record
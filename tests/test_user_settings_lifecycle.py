@@ -1,9 +1,26 @@
 """Integration test for complete user settings lifecycle."""
 
+import asyncio
+import datetime
+
+import pytest
+from beanie import init_beanie
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import DuplicateKeyError
+
 from src.config import settings
-from src.dto import UserSettings
+from src.dto import (
+    AccountLink,
+    LinkAttempt,
+    LinkCode,
+    UserCredits,
+    UserMonthlyUsage,
+    UserRole,
+    UserSettings,
+)
 from src.mongo import (
     clear_github_settings,
+    find_user_settings,
     get_auto_categorize,
     get_auto_cleanup,
     get_chat_language,
@@ -11,6 +28,8 @@ from src.mongo import (
     get_gpt_command,
     get_preferred_provider,
     get_save_to_obsidian,
+    migrate_to_unique_indexes,
+    migrate_user_settings_to_unique,
     set_auto_categorize,
     set_auto_cleanup,
     set_chat_language,
@@ -160,3 +179,224 @@ class TestUserSettingsLifecycle:
         # Reset to auto (None)
         await set_preferred_provider(chat_id, None)
         assert await get_preferred_provider(chat_id) is None
+
+
+class TestUpsertSetters:
+    """Setters are single upserts on a unique chat_id."""
+
+    async def test_first_write_creates_document_with_defaults(self):
+        await set_auto_cleanup("u_upsert_new", True)
+
+        raw = await UserSettings.get_motor_collection().find_one({"chat_id": "u_upsert_new"})
+        assert raw["auto_cleanup"] is True
+        assert (raw["language"], raw["save_to_obsidian"]) == (None, False)
+
+    async def test_concurrent_first_writes_share_one_document(self):
+        chat_id = "u_upsert_race"
+        await asyncio.gather(
+            set_chat_language(chat_id, "de"),
+            set_gpt_command(chat_id, "bot"),
+            set_auto_categorize(chat_id, True),
+            set_preferred_provider(chat_id, "groq"),
+        )
+
+        assert await UserSettings.find(UserSettings.chat_id == chat_id).count() == 1
+        user = await find_user_settings(chat_id)
+        assert (user.language, user.command, user.auto_categorize) == ("de", "bot", True)
+        assert user.preferred_provider == "groq"
+
+    async def test_setter_leaves_other_fields(self):
+        chat_id = "u_upsert_partial"
+        await set_github_settings(chat_id, "owner", "repo", "token")
+        await set_save_to_obsidian(chat_id, True)
+
+        await set_chat_language(chat_id, "es")
+
+        assert await get_github_settings(chat_id) == {
+            "owner": "owner",
+            "repo": "repo",
+            "token": "token",
+        }
+        assert await get_save_to_obsidian(chat_id) is True
+
+    async def test_duplicate_chat_id_rejected(self):
+        await set_chat_language("u_upsert_dup", "en")
+
+        with pytest.raises(DuplicateKeyError):
+            await UserSettings(chat_id="u_upsert_dup").insert()
+
+
+class TestUniqueChatIdMigration:
+    """Duplicates from the old find-then-insert setters are merged before the index."""
+
+    @pytest.fixture
+    def database(self):
+        return AsyncMongoMockClient()["migration_db"]
+
+    async def test_merges_duplicates_and_drops_plain_index(self, database):
+        users = database[UserSettings.Settings.name]
+        await users.create_index("chat_id")
+        await users.insert_many(
+            [
+                {"chat_id": "u_1", "language": "ru", "github_settings": None},
+                {"chat_id": "u_1", "language": "en", "command": "bot"},
+                {"chat_id": "u_2", "language": "de"},
+                {"chat_id": "u_1", "github_settings": {"owner": "o"}},
+            ]
+        )
+
+        await migrate_user_settings_to_unique(database)
+
+        merged = await users.find_one({"chat_id": "u_1"})
+        assert await users.count_documents({"chat_id": "u_1"}) == 1
+        assert (merged["language"], merged["command"]) == ("ru", "bot")
+        assert merged["github_settings"] == {"owner": "o"}
+        assert await users.count_documents({}) == 2
+        assert "chat_id_1" not in await users.index_information()
+
+    async def test_noop_once_index_is_unique(self, database):
+        users = database[UserSettings.Settings.name]
+        await users.create_index("chat_id", unique=True)
+        await users.insert_one({"chat_id": "u_1"})
+
+        await migrate_user_settings_to_unique(database)
+
+        assert (await users.index_information())["chat_id_1"]["unique"] is True
+
+
+class TestUniqueIndexMigrations:
+    """Collections that gained unique indexes are deduplicated before init_beanie."""
+
+    @pytest.fixture
+    def database(self):
+        return AsyncMongoMockClient()["migration_db"]
+
+    async def test_duplicate_roles_collapsed(self, database):
+        roles = database[UserRole.Settings.name]
+        await roles.create_index([("user_id", 1), ("role", 1)])
+        await roles.insert_many(
+            [
+                {"user_id": "1", "role": "vip", "added_by": "first"},
+                {"user_id": "1", "role": "vip", "added_by": "second"},
+                {"user_id": "1", "role": "tester", "added_by": "first"},
+            ]
+        )
+
+        await migrate_to_unique_indexes(database)
+
+        assert await roles.count_documents({}) == 2
+        assert (await roles.find_one({"role": "vip"}))["added_by"] == "first"
+        assert "user_id_1_role_1" not in await roles.index_information()
+
+    async def test_account_links_keep_latest_on_both_sides(self, database):
+        links = database[AccountLink.Settings.name]
+        await links.create_index("telegram_user_id")
+        await links.create_index("whatsapp_phone")
+        await links.insert_many(
+            [
+                {"telegram_user_id": "a", "whatsapp_phone": "1"},
+                {"telegram_user_id": "a", "whatsapp_phone": "2"},
+                {"telegram_user_id": "b", "whatsapp_phone": "2"},
+            ]
+        )
+
+        await migrate_to_unique_indexes(database)
+
+        remaining = await links.find({}, {"_id": False}).to_list(None)
+        assert remaining == [{"telegram_user_id": "b", "whatsapp_phone": "2"}]
+
+    async def test_link_codes_and_attempts_deduplicated(self, database):
+        codes = database[LinkCode.Settings.name]
+        attempts = database[LinkAttempt.Settings.name]
+        await codes.create_index("code")
+        await attempts.create_index("whatsapp_phone")
+        locked = datetime.datetime(2026, 1, 1, 12, 0)
+        await codes.insert_many(
+            [
+                {"code": "123456", "telegram_user_id": "a"},
+                {"code": "123456", "telegram_user_id": "b"},
+            ]
+        )
+        await attempts.insert_many(
+            [
+                {"whatsapp_phone": "1", "attempt_count": 2, "locked_until": None},
+                {"whatsapp_phone": "1", "attempt_count": 3, "locked_until": locked},
+            ]
+        )
+
+        await migrate_to_unique_indexes(database)
+
+        assert await codes.count_documents({}) == 1
+        assert (await codes.find_one({"code": "123456"}))["telegram_user_id"] == "a"
+        merged = await attempts.find_one({"whatsapp_phone": "1"})
+        assert await attempts.count_documents({}) == 1
+        assert (merged["attempt_count"], merged["locked_until"]) == (5, locked)
+
+    async def test_monthly_usage_counters_summed(self, database):
+        usage = database[UserMonthlyUsage.Settings.name]
+        await usage.create_index([("user_id", 1), ("month_key", 1)])
+        await usage.insert_many(
+            [
+                {"user_id": "1", "month_key": "2026-01", "transcriptions": 2, "tokens_used": 5},
+                {"user_id": "1", "month_key": "2026-01", "transcriptions": 1, "audio_seconds": 30},
+                {"user_id": "1", "month_key": "2026-02", "transcriptions": 4},
+            ]
+        )
+
+        await migrate_to_unique_indexes(database)
+
+        merged = await usage.find_one({"month_key": "2026-01"})
+        assert await usage.count_documents({}) == 2
+        assert (merged["transcriptions"], merged["tokens_used"], merged["audio_seconds"]) == (
+            3,
+            5,
+            30,
+        )
+
+    async def test_credits_merged_into_one_ledger(self, database):
+        credits = database[UserCredits.Settings.name]
+        await credits.create_index("user_id")
+        month = datetime.datetime.now(datetime.UTC).strftime("%Y-%m")
+        await credits.insert_many(
+            [
+                {
+                    "user_id": "1",
+                    "free_credits": 2,
+                    "free_credits_month": "2000-01",
+                    "purchased_credits": 5,
+                    "tier": "paid",
+                    "total_tokens_used": 8,
+                },
+                {"user_id": "1", "free_credits": 7, "free_credits_month": month, "tier": "free"},
+                {
+                    "user_id": "1",
+                    "free_credits": 4,
+                    "free_credits_month": month,
+                    "purchased_credits": 3,
+                    "total_tokens_used": 6,
+                },
+            ]
+        )
+
+        await migrate_to_unique_indexes(database)
+
+        merged = await credits.find_one({"user_id": "1"})
+        assert await credits.count_documents({}) == 1
+        assert (merged["purchased_credits"], merged["total_tokens_used"]) == (8, 14)
+        assert (merged["free_credits"], merged["free_credits_month"]) == (4, month)
+        assert merged["tier"] == "paid"
+        assert "user_id_1" not in await credits.index_information()
+
+    async def test_unique_indexes_created_after_migration(self, database):
+        await database[UserRole.Settings.name].insert_many(
+            [{"user_id": "1", "role": "vip", "added_by": "a"} for _ in range(2)]
+        )
+        await database[UserMonthlyUsage.Settings.name].insert_many(
+            [{"user_id": "1", "month_key": "2026-01"} for _ in range(2)]
+        )
+
+        await migrate_to_unique_indexes(database)
+        await init_beanie(database=database, document_models=[UserRole, UserMonthlyUsage])
+
+        with pytest.raises(DuplicateKeyError):
+            await UserMonthlyUsage(user_id="1", month_key="2026-01").insert()
@@ -88,16 +88,16 @@ class TestWitUsagePipeline:
             assert await is_wit_available("ru") is False
             assert await is_wit_available("en") is True
 
-    async def test_increment_returns_running_total(self):
-        """increment_wit_usage returns the updated running total each time."""
+    async def test_increment_accumulates_running_total(self):
+        """Increments add up in the stored monthly total."""
         # 1. First call creates a new record
-        total = await increment_wit_usage(2, "ru")
-        assert total == 2
+        await increment_wit_usage(2, "ru")
+        assert await get_wit_usage_this_month("ru") == 2
 
         # 2. Subsequent calls add to existing record
-        total = await increment_wit_usage(3, "ru")
-        assert total == 5
+        await increment_wit_usage(3, "ru")
+        assert await get_wit_usage_this_month("ru") == 5
 
         # 3. Single-unit increment (default language)
-        total = await increment_wit_usage()
-        assert total == 6
+        await increment_wit_usage()
+        assert await get_wit_usage_this_month("ru") == 6
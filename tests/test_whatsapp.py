@@ -1,13 +1,21 @@
+import threading
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from fastapi.testclient import TestClient
 
 import src.whatsapp.client
-from src.dto import UserTier
+from src.dto import QueuedJob, UserTier
 from src.mongo import set_auto_categorize, set_chat_language, set_github_settings
+from src.transcription.service import TranscriptionResult
 from src.whatsapp.app import create_fastapi_app
 from src.whatsapp.client import WHATSAPP_CHAT_PREFIX, get_whatsapp_client
-from src.whatsapp.handlers import handle_link_command, handle_voice_message, register_handlers
+from src.whatsapp.handlers import (
+    JOB_WHATSAPP_VOICE,
+    handle_link_command,
+    handle_voice_message,
+    register_handlers,
+    run_voice_job,
+)
 
 
 class TestWhatsAppClient:
@@ -71,7 +79,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("Hello world", 5, 1)
+        mocks["transcribe"].return_value = TranscriptionResult("Hello world", 5, 5, 1)
 
         await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
 
@@ -89,7 +97,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("", 0, 0)
+        mocks["transcribe"].return_value = TranscriptionResult("", 0, 0, 0)
 
         await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
 
@@ -105,7 +113,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("Test", 3, 1)
+        mocks["transcribe"].return_value = TranscriptionResult("Test", 3, 3, 1)
 
         await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
 
@@ -113,6 +121,21 @@ class TestHandleVoiceMessage:
         call_kwargs = mocks["transcribe"].call_args.kwargs
         assert call_kwargs["language"] == "de"
 
+    async def test_repeated_audio_served_from_cache(
+        self, mock_whatsapp_client, mock_whatsapp_message, whatsapp_voice_external_mocks
+    ):
+        """Identical audio bytes are transcribed once, keyed by content hash."""
+        phone_number = "5234567890"
+        await set_chat_language(f"{WHATSAPP_CHAT_PREFIX}{phone_number}", "en")
+        mock_whatsapp_message.from_user.wa_id = phone_number
+
+        mocks = whatsapp_voice_external_mocks
+        await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
+        await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
+
+        mocks["transcribe"].assert_awaited_once()
+        assert mock_whatsapp_client.send_message.call_count == 2
+
     async def test_handles_download_error(
         self, mock_whatsapp_client, mock_whatsapp_message, whatsapp_voice_external_mocks
     ):
@@ -143,6 +166,48 @@ class TestHandleVoiceMessage:
 
         mock_whatsapp_client.send_message.assert_not_called()
 
+    async def test_voice_queued_when_worker_pool_running(
+        self, mock_whatsapp_client, mock_whatsapp_message, whatsapp_voice_external_mocks
+    ):
+        """With the worker pool up, the webhook only persists the media id."""
+        with patch("src.whatsapp.handlers.job_pool", MagicMock(running=True)):
+            await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
+
+        job = await QueuedJob.find_one()
+        assert job.kind == JOB_WHATSAPP_VOICE
+        assert job.payload == {"phone_number": "1234567890", "media_id": "media_123"}
+        mock_whatsapp_client.get_media_url.assert_not_called()
+
+    async def test_voice_job_runs_pipeline(
+        self, mock_whatsapp_client, whatsapp_voice_external_mocks
+    ):
+        """A queued WhatsApp job downloads, transcribes and replies."""
+        await set_chat_language(f"{WHATSAPP_CHAT_PREFIX}5234567890", "en")
+
+        with patch("src.whatsapp.handlers.get_whatsapp_client", return_value=mock_whatsapp_client):
+            await run_voice_job({"phone_number": "5234567890", "media_id": "media_9"})
+
+        mock_whatsapp_client.get_media_url.assert_called_once_with("media_9")
+        mock_whatsapp_client.send_message.assert_called_once_with(
+            to="5234567890", text="Hello world"
+        )
+
+    async def test_media_url_lookup_does_not_block_the_loop(
+        self, mock_whatsapp_client, whatsapp_voice_external_mocks
+    ):
+        """The blocking SDK call runs in a thread: job workers share the Telegram loop."""
+        loop_thread = threading.get_ident()
+        threads = []
+        mock_whatsapp_client.get_media_url.side_effect = lambda media_id: (
+            threads.append(threading.get_ident()) or "https://example.com/media"
+        )
+
+        with patch("src.whatsapp.handlers.get_whatsapp_client", return_value=mock_whatsapp_client):
+            await run_voice_job({"phone_number": "5234567891", "media_id": "media_10"})
+
+        assert threads
+        assert loop_thread not in threads
+
     async def test_auto_categorize_flow(
         self, mock_whatsapp_client, mock_whatsapp_message, whatsapp_voice_external_mocks
     ):
@@ -155,7 +220,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("Note text", 5, 1)
+        mocks["transcribe"].return_value = TranscriptionResult("Note text", 5, 5, 1)
 
         await handle_voice_message(mock_whatsapp_client, mock_whatsapp_message)
 
@@ -170,7 +235,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("raw text", 5, 1)
+        mocks["transcribe"].return_value = TranscriptionResult("raw text", 5, 5, 1)
         mocks["cleanup"].side_effect = lambda t, **kwargs: f"clean {t}"
 
         with (
@@ -193,7 +258,7 @@ class TestHandleVoiceMessage:
         mock_whatsapp_message.from_user.wa_id = phone_number
 
         mocks = whatsapp_voice_external_mocks
-        mocks["transcribe"].return_value = ("raw text", 5, 1)
+        mocks["transcribe"].return_value = TranscriptionResult("raw text", 5, 5, 1)
 
         with (
             patch("src.whatsapp.handlers.get_linked_telegram_id", AsyncMock(return_value="99998")),
@@ -0,0 +1,135 @@
+"""Integration tests for the async Wit.ai speech client."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from src.transcription.wit_client import WitClient, WitError
+
+
+def _client_with(handler) -> WitClient:
+    """WitClient whose pool is backed by an in-process mock transport."""
+    return WitClient("test-token", transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def no_sleep():
+    with patch("src.transcription.wit_client.asyncio.sleep", new_callable=AsyncMock) as sleep:
+        yield sleep
+
+
+class TestWitClient:
+    async def test_returns_speech_response(self):
+        """Successful /speech call returns parsed JSON with the posted body and content type."""
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen["content_type"] = request.headers["content-type"]
+            seen["body"] = request.content
+            return httpx.Response(200, json={"text": "Hello world"})
+
+        client = _client_with(handler)
+        result = await client.speech(b"RIFFdata", "audio/wav")
+
+        assert result == {"text": "Hello world"}
+        assert seen == {"content_type": "audio/wav", "body": b"RIFFdata"}
+
+    async def test_pool_sends_auth_and_version_headers(self):
+        """Lazily created pool carries the app token and pinned API version."""
+        client = WitClient("secret")
+        pool = client._get_client()
+
+        assert pool.headers["authorization"] == "Bearer secret"
+        assert "vnd.wit." in pool.headers["accept"]
+        assert client._get_client() is pool  # reused, keep-alive
+
+    async def test_retries_on_429_then_succeeds(self, no_sleep):
+        """429 is retried, honouring Retry-After."""
+        responses = iter(
+            [
+                httpx.Response(429, headers={"retry-after": "3"}),
+                httpx.Response(200, json={"text": "ok"}),
+            ]
+        )
+        client = _client_with(lambda _request: next(responses))
+
+        result = await client.speech(b"data", "audio/wav")
+
+        assert result == {"text": "ok"}
+        no_sleep.assert_awaited_once_with(3.0)
+
+    async def test_retries_on_5xx_and_transport_errors(self, no_sleep):
+        """Server errors and dropped connections are retried with backoff."""
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            if len(calls) == 1:
+                raise httpx.ConnectError("reset", request=request)
+            if len(calls) == 2:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"text": "ok"})
+
+        client = _client_with(handler)
+        result = await client.speech(b"data", "audio/wav")
+
+        assert result == {"text": "ok"}
+        assert len(calls) == 3
+        assert no_sleep.await_count == 2
+
+    async def test_raises_after_retries_exhausted(self, no_sleep):
+        """Persistent 5xx raises WitError after the last attempt."""
+        client = _client_with(lambda _request: httpx.Response(500))
+
+        with pytest.raises(WitError):
+            await client.speech(b"data", "audio/wav")
+
+    async def test_client_error_not_retried(self, no_sleep):
+        """4xx other than 429 fails immediately."""
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(400, text="bad audio")
+
+        client = _client_with(handler)
+        with pytest.raises(WitError, match="400"):
+            await client.speech(b"data", "audio/wav")
+
+        assert len(calls) == 1
+        no_sleep.assert_not_awaited()
+
+    async def test_error_payload_raises(self):
+        """Wit reports some failures as 200 with an 'error' field."""
+        client = _client_with(lambda _request: httpx.Response(200, json={"error": "boom"}))
+
+        with pytest.raises(WitError, match="boom"):
+            await client.speech(b"data", "audio/wav")
+
+    async def test_aclose_releases_pool(self):
+        client = _client_with(lambda _request: httpx.Response(200, json={}))
+        pool = client._get_client()
+
+        await client.aclose()
+
+        assert pool.is_closed
+        assert client._get_client() is not pool
+
+    async def test_each_event_loop_gets_its_own_pool(self):
+        """The WhatsApp webhook loop must not reuse a pool bound to the Telegram loop."""
+        client = WitClient("test-token")
+        pool = client._get_client()
+
+        async def _other_loop_pool() -> httpx.AsyncClient:
+            other = client._get_client()
+            await client.aclose()
+            return other
+
+        other = await asyncio.to_thread(asyncio.run, _other_loop_pool())
+
+        assert other is not pool
+        assert other.is_closed
+        assert not pool.is_closed
+        assert client._get_client() is pool